@@ -0,0 +1,334 @@
+""" Performance analytics of the BackTest strategy trades
+    A backtest reports the summed profit, winners and losers of its trades. From the trades and the Close data the
+    short positions are marked to market on every bar: while a position is open, from the bar after the entry to
+    the exit bar, each bar earns the fall of the close from the bar before, in dollars as BackTest counts them, and
+    the equity curve is the running sum of these bar profits from 0. The profits of the bars of a trade add up to
+    the profit of the trade, so the equity curve ends at the profit of the backtest. From it come:
+        max_drawdown            largest fall of the equity from its running peak, which starts at 0
+        sharpe, sortino         mean bar profit over its standard deviation, or over its downside deviation (of the
+                                losses alone), annualized with the number of bars in a year when it is known
+        exposure                share of the bars with a position open
+        average_holding_bars    mean number of bars from the entry to the exit of a trade, and
+        average_holding_time    the mean time between them when the dates are known
+    and a breakdown of the profit, trades and exposure of each day.
+
+    Many results, e.g. one per parameter set of a sweep, are analyzed together: the trades carry the number of
+    their result, and the bars of every result are 2-D arrays of one row per result, built and reduced with whole
+    array operations, in chunks of results which fit in the given memory. Nothing loops over the bars in Python, so
+    runs of millions of bars and thousands of results take seconds and a bounded amount of memory.
+
+    Usage: python Analytics.py [FILE_OR_DIRECTORY ...] [--strategy 1|2] [--grid NAME=V1,V2,...] [--daily]
+                               [--memory MiB] [--output FILE]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from BackTest import BackTest
+from ParameterSweep import STRATEGY_PARAMETERS, parameter_grid
+from StockArrays import StockArrays
+
+ANALYTICS_COLUMNS = ["profit", "trades", "winners", "losers", "max_drawdown", "sharpe", "sortino", "exposure",
+                     "average_holding_bars", "average_holding_time"]
+DAILY_COLUMNS = ["day", "bars", "profit", "trades", "winners", "losers", "exposure"]
+DEFAULT_ANALYTICS_DIRECTORY = "./StockMarketData/Intraday/eachDay"
+DEFAULT_MEMORY_LIMIT_BYTES = 256 * 2 ** 20
+# bytes used per bar of each result in a chunk: the position changes and positions, the bar profits, the equity
+# curve and its running peak
+BYTES_PER_ELEMENT = 26
+TRADING_DAYS_PER_YEAR = 252
+
+
+def bar_changes(close_data):
+    """ profit in dollars of a short position held over each bar: the fall of the close from the bar before, and 0
+        for the first bar """
+    convert_to_dollars = 100
+    close_data = np.asarray(close_data, dtype=float)
+    return -np.diff(close_data, prepend=close_data[:1]) * convert_to_dollars
+
+
+def positions(number_of_bars, entry, exit, result=None, number_of_results=1):
+    """ Bars with a short position open, for each result
+
+        :param number_of_bars: int number of bars of the data
+        :param entry, exit: int arrays of the entry and exit bar of each trade; the trades of a result do not
+            overlap, as BackTest opens no position before the last one is closed
+        :param result: int array of the row of the result of each trade; all trades are of one result when None
+        :param number_of_results: int number of rows
+        :return: 2-D boolean array with a row per result, True from the bar after the entry to the exit bar
+    """
+    if result is None:
+        result = np.zeros(len(entry), dtype=np.int64)
+    # a trade can open on the bar the last one of its result closed on, so the changes of a bar are added up
+    changes = np.zeros((number_of_results, number_of_bars + 1), dtype=np.int8)
+    np.add.at(changes, (result, np.asarray(entry, dtype=np.int64) + 1), 1)
+    np.add.at(changes, (result, np.asarray(exit, dtype=np.int64) + 1), -1)
+    return np.cumsum(changes[:, :-1], axis=1, dtype=np.int8) > 0
+
+
+def bar_profits(close_data, entry, exit, result=None, number_of_results=1):
+    """ Mark to market profit in dollars of each bar of the short positions of the trades, a 2-D array with a row
+        per result: the fall of the close from the bar before while a position is open, and 0 without one, so the
+        profits of the bars of a trade add up to the profit of the trade; the arguments are as for positions()
+
+        :return: tuple of the bar profits and the positions, True for the bars in a position, whose profit is 0
+            when the close did not change
+    """
+    in_position = positions(len(close_data), entry, exit, result, number_of_results)
+    return np.where(in_position, bar_changes(close_data), 0.0), in_position
+
+
+def equity_curves(close_data, entry, exit, result=None, number_of_results=1):
+    """ mark to market equity of the short positions of the trades after each bar, a 2-D array with a row per
+        result; the arguments are as for positions() """
+    return np.cumsum(bar_profits(close_data, entry, exit, result, number_of_results)[0], axis=1)
+
+
+def curve_statistics(bar_profits, in_position, periods_per_year=None):
+    """ Statistics of the mark to market bar profits of each result
+
+        :param bar_profits: 2-D float array of the profit of each bar, a row per result; it is overwritten
+        :param in_position: 2-D boolean array of the bars with a position open, as positions() returns
+        :param periods_per_year: number of bars in a year, to annualize the Sharpe and Sortino ratios; per bar when
+            None
+        :return: dictionary of profit, max_drawdown, sharpe, sortino and exposure to arrays with a value per result
+    """
+    number_of_bars = bar_profits.shape[1]
+    mean = bar_profits.sum(axis=1) / max(number_of_bars, 1)
+    mean_square = np.einsum("ij,ij->i", bar_profits, bar_profits) / max(number_of_bars, 1)
+    equity = np.cumsum(bar_profits, axis=1)
+    # the losses alone, for the downside deviation
+    np.minimum(bar_profits, 0.0, out=bar_profits)
+    downside_square = np.einsum("ij,ij->i", bar_profits, bar_profits) / max(number_of_bars, 1)
+
+    # the running peak of the equity, starting from 0, in the memory of the bar profits
+    peak = bar_profits
+    np.maximum.accumulate(equity, axis=1, out=peak)
+    np.maximum(peak, 0.0, out=peak)
+    np.subtract(peak, equity, out=peak)
+    max_drawdown = peak.max(axis=1, initial=0.0)
+
+    annualize = np.sqrt(periods_per_year) if periods_per_year else 1.0
+    standard_deviation = np.sqrt(np.maximum(mean_square - mean * mean, 0.0))
+    downside_deviation = np.sqrt(downside_square)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sharpe = np.where(standard_deviation > 0, mean / standard_deviation * annualize, np.nan)
+        sortino = np.where(downside_deviation > 0, mean / downside_deviation * annualize, np.nan)
+    return {"profit": equity[:, -1] if number_of_bars else np.zeros(len(equity)), "max_drawdown": max_drawdown,
+            "sharpe": sharpe, "sortino": sortino,
+            "exposure": np.count_nonzero(in_position, axis=1) / max(number_of_bars, 1)}
+
+
+def trade_statistics(close_data, trades, number_of_results, dates=None):
+    """ Number of trades, winners, losers and average holding period of each result
+
+        :param trades: dataframe with the entry and exit bar of each trade, and its result when there are several
+        :return: dictionary of trades, winners, losers, average_holding_bars and average_holding_time to arrays with
+            a value per result; the holding time is NaT without dates
+    """
+    close_data = np.asarray(close_data, dtype=float)
+    entry = trades["entry"].to_numpy(dtype=np.int64)
+    exit = trades["exit"].to_numpy(dtype=np.int64)
+    result = trades["result"].to_numpy(dtype=np.int64) if "result" in trades else np.zeros(len(trades), np.int64)
+    number_of_trades = np.bincount(result, minlength=number_of_results)
+    winners = np.bincount(result, weights=close_data[entry] - close_data[exit] > 0, minlength=number_of_results)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average_holding_bars = np.bincount(result, weights=exit - entry, minlength=number_of_results) / \
+            number_of_trades
+        average_holding_time = np.full(number_of_results, np.timedelta64("NaT", "ns"))
+        if dates is not None:
+            dates = datetimes(dates)
+            holding_nanoseconds = (dates[exit] - dates[entry]).astype(np.int64)
+            average_nanoseconds = np.bincount(result, weights=holding_nanoseconds, minlength=number_of_results) / \
+                number_of_trades
+            has_trades = number_of_trades > 0
+            average_holding_time[has_trades] = average_nanoseconds[has_trades].round().astype("timedelta64[ns]")
+    return {"trades": number_of_trades, "winners": winners.astype(np.int64),
+            "losers": number_of_trades - winners.astype(np.int64), "average_holding_bars": average_holding_bars,
+            "average_holding_time": average_holding_time}
+
+
+def chunks_of_results(number_of_results, number_of_bars, memory_limit_bytes):
+    """ ranges of results whose bars fit in about memory_limit_bytes together """
+    chunk_size = max(1, memory_limit_bytes // (max(number_of_bars, 1) * BYTES_PER_ELEMENT))
+    return [(start, min(start + chunk_size, number_of_results)) for start in range(0, number_of_results, chunk_size)]
+
+
+def trades_of_chunk(trades, start, stop):
+    """ entry, exit and result, counted from start, of the trades of the results from start to stop """
+    if "result" not in trades:
+        return trades["entry"].to_numpy(np.int64), trades["exit"].to_numpy(np.int64), None
+    result = trades["result"].to_numpy(np.int64)
+    in_chunk = (result >= start) & (result < stop)
+    return trades["entry"].to_numpy(np.int64)[in_chunk], trades["exit"].to_numpy(np.int64)[in_chunk], \
+        result[in_chunk] - start
+
+
+def number_of_results_of(trades, number_of_results):
+    if number_of_results is not None:
+        return number_of_results
+    return int(trades["result"].max()) + 1 if "result" in trades and len(trades) else 1
+
+
+def datetimes(dates):
+    """ the dates as a datetime64[ns] array, parsed when they are strings such as the 9/11/2019 of the daily data """
+    return pd.to_datetime(np.asarray(dates)).to_numpy("datetime64[ns]")
+
+
+def bars_per_year(dates):
+    """ number of bars in a year of trading days, from the number of bars per day of the dates """
+    days = datetimes(dates).astype("datetime64[D]")
+    number_of_days = len(np.unique(days))
+    return len(days) / number_of_days * TRADING_DAYS_PER_YEAR if number_of_days else None
+
+
+def analyze(close_data, trades, dates=None, periods_per_year=None, number_of_results=None,
+            memory_limit_bytes=DEFAULT_MEMORY_LIMIT_BYTES):
+    """ Analytics of the trades of one or more results over the same bars
+
+        :param close_data: array of the Close data; with several data sets, their Close data one after another
+        :param trades: dataframe with the entry and exit bar of each closed trade, counted in close_data, such as
+            BackTest.trade_list() returns, and a result column with the number of its result when there are several
+        :param dates: optional array of the date of each bar, for the holding time and the bars in a year
+        :param periods_per_year: number of bars in a year for the Sharpe and Sortino ratios; from the dates when
+            None, and per bar without them
+        :param number_of_results: int number of results; one more than the largest result of the trades when None
+        :param memory_limit_bytes: int the results are analyzed in chunks which need about this much memory
+        :return: dataframe with the ANALYTICS_COLUMNS and one row per result
+    """
+    close_data = np.asarray(close_data, dtype=float)
+    number_of_results = number_of_results_of(trades, number_of_results)
+    if periods_per_year is None and dates is not None:
+        periods_per_year = bars_per_year(dates)
+
+    columns = {column: [] for column in ["profit", "max_drawdown", "sharpe", "sortino", "exposure"]}
+    for start, stop in chunks_of_results(number_of_results, len(close_data), memory_limit_bytes):
+        entry, exit, result = trades_of_chunk(trades, start, stop)
+        profits_of_bars, in_position = bar_profits(close_data, entry, exit, result, stop - start)
+        statistics = curve_statistics(profits_of_bars, in_position, periods_per_year)
+        for column in columns:
+            columns[column].append(statistics[column])
+
+    analytics = {column: np.concatenate(parts) for column, parts in columns.items()}
+    analytics.update(trade_statistics(close_data, trades, number_of_results, dates))
+    return pd.DataFrame({column: analytics[column] for column in ANALYTICS_COLUMNS})
+
+
+def daily_breakdown(close_data, dates, trades, number_of_results=None,
+                    memory_limit_bytes=DEFAULT_MEMORY_LIMIT_BYTES):
+    """ Profit, trades and exposure of each day, for each result
+
+        :param close_data, trades, number_of_results, memory_limit_bytes: as for analyze()
+        :param dates: array of the date of each bar, in order
+        :return: dataframe with the DAILY_COLUMNS and one row per day, or per result and day, with a result column
+            first, when there are several results; the trades are counted on the day they are closed
+    """
+    close_data = np.asarray(close_data, dtype=float)
+    days = datetimes(dates).astype("datetime64[D]")
+    number_of_results = number_of_results_of(trades, number_of_results)
+    day_starts = np.flatnonzero(np.diff(days.astype(np.int64), prepend=days[:1].astype(np.int64) - 1))
+    bars_of_day = np.diff(np.append(day_starts, len(days)))
+    number_of_days = len(day_starts)
+
+    profit = []
+    exposure = []
+    for start, stop in chunks_of_results(number_of_results, len(close_data), memory_limit_bytes):
+        entry, exit, result = trades_of_chunk(trades, start, stop)
+        profits_of_bars, in_position = bar_profits(close_data, entry, exit, result, stop - start)
+        if number_of_days:
+            profit.append(np.add.reduceat(profits_of_bars, day_starts, axis=1))
+            exposure.append(np.add.reduceat(in_position, day_starts, axis=1, dtype=np.int64) / bars_of_day)
+        else:
+            profit.append(np.zeros((stop - start, 0)))
+            exposure.append(np.zeros((stop - start, 0)))
+
+    # the day of each trade is the day of its exit bar
+    entry = trades["entry"].to_numpy(dtype=np.int64)
+    exit = trades["exit"].to_numpy(dtype=np.int64)
+    result = trades["result"].to_numpy(dtype=np.int64) if "result" in trades else np.zeros(len(trades), np.int64)
+    day_of_trade = result * number_of_days + np.searchsorted(day_starts, exit, side="right") - 1
+    number_of_cells = number_of_results * number_of_days
+    trades_of_day = np.bincount(day_of_trade, minlength=number_of_cells)
+    winners_of_day = np.bincount(day_of_trade, weights=close_data[entry] - close_data[exit] > 0,
+                                 minlength=number_of_cells).astype(np.int64)
+
+    breakdown = pd.DataFrame({"day": np.tile(days[day_starts], number_of_results),
+                              "bars": np.tile(bars_of_day, number_of_results),
+                              "profit": np.concatenate(profit).ravel(), "trades": trades_of_day,
+                              "winners": winners_of_day, "losers": trades_of_day - winners_of_day,
+                              "exposure": np.concatenate(exposure).ravel()}, columns=DAILY_COLUMNS)
+    if "result" in trades:
+        breakdown.insert(0, "result", np.repeat(np.arange(number_of_results), number_of_days))
+    return breakdown
+
+
+def strategy_trades(stock_data, strategy=1, parameter_sets=None):
+    """ Backtest a strategy on each data set, once for each parameter set, and collect the closed trades
+
+        :param stock_data: StockData with the indicators calculated, e.g. StockData(dfs, run_strategies=False)
+        :param parameter_sets: list of dictionaries of parameter name to value, e.g. from parameter_grid; one
+            result with the defaults when None
+        :return: tuple of the StockArrays of the data sets one after another and a dataframe of the trades as
+            BackTest.trade_list() returns them, with their result, the number of their parameter set, and their data
+            set first, and the entry and exit bars counted in that StockArrays
+    """
+    list_stock_arrays = stock_data.get_stock_arrays()
+    back_tests = [BackTest(stock_arrays) for stock_arrays in list_stock_arrays]
+    offsets = np.cumsum([0] + [len(stock_arrays) for stock_arrays in list_stock_arrays])
+    trades = []
+    for result, parameters in enumerate(parameter_sets or [{}]):
+        for data_set, (offset, back_test) in enumerate(zip(offsets, back_tests)):
+            back_test.run_strategy(strategy, **parameters)
+            trade_list = back_test.trade_list(strategy)
+            trade_list["entry"] += offset
+            trade_list["exit"] += offset
+            trade_list.insert(0, "data_set", data_set)
+            trade_list.insert(0, "result", result)
+            trades.append(trade_list)
+    return StockArrays.concatenate(list_stock_arrays), pd.concat(trades, ignore_index=True)
+
+
+def main(argv=None):
+    from BarReplay import find_csv_files
+    from StockData import StockData
+    from WalkForward import parse_grid
+
+    parser = argparse.ArgumentParser(description="Performance analytics of the BackTest strategy trades")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_ANALYTICS_DIRECTORY],
+                        help=".csv files or directories to backtest")
+    parser.add_argument("--strategy", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=V1,V2,...",
+                        help="analyze every combination of these threshold values; the defaults when not given")
+    parser.add_argument("--daily", action="store_true", help="print the breakdown of each day too")
+    parser.add_argument("--memory", type=int, default=DEFAULT_MEMORY_LIMIT_BYTES // 2 ** 20,
+                        help="MiB of memory for each chunk of results")
+    parser.add_argument("--output", help=".csv file to write the analytics of each result to")
+    args = parser.parse_args(argv)
+
+    stock_data = StockData(find_csv_files(args.paths), run_strategies=False)
+    parameter_sets = parameter_grid(parse_grid(args.grid)) if args.grid else [{}]
+    unknown = set().union(*parameter_sets) - set(STRATEGY_PARAMETERS[args.strategy])
+    if unknown:
+        parser.error("unknown parameters for strategy " + str(args.strategy) + ": " + ", ".join(sorted(unknown)))
+    stock_arrays, trades = strategy_trades(stock_data, args.strategy, parameter_sets)
+
+    started = time.perf_counter()
+    analytics = analyze(stock_arrays.close, trades, stock_arrays.dates, number_of_results=len(parameter_sets),
+                        memory_limit_bytes=args.memory * 2 ** 20)
+    analytics = pd.concat([pd.DataFrame(parameter_sets, index=analytics.index), analytics], axis=1)
+    elapsed = time.perf_counter() - started
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(analytics.to_string())
+        if args.daily:
+            print(daily_breakdown(stock_arrays.close, stock_arrays.dates, trades, len(parameter_sets),
+                                  args.memory * 2 ** 20).to_string(index=False))
+    print(str(len(parameter_sets)) + " results of " + str(len(stock_arrays)) + " bars analyzed in " +
+          "%.2f" % elapsed + " s")
+    if args.output:
+        analytics.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
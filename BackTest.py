@@ -1,41 +1,85 @@
 from Common import *
-from scipy import stats
+from indicators import rolling_slopes
+from Instrumentation import staged
+from StockArrays import StockArrays
+from TradeLog import OFF, log_level, log_trades, log_summary
 import math
+import numpy as np
+import pandas as pd
+
+
+def text_line(*values):
+    """ the line print(*values) writes """
+    return " ".join(str(value) for value in values)
+
 
 class BackTest:
-    def __init__(self, df):
+    # first data point at which each strategy can open a position: the span of the macd and the data points of the
+    # slopes of line of the macd, so the signals of the strategy are calculated from there on
+    FIRST_DATA_POINT = {1: 26 + 5 + 1 + 5, 2: 26 + 9 + 9}
+
+    def __init__(self, df, slopes_of_line=None):
         """ For the set of candlestick data which has indicators already calculated,
             prepare data points to run Backtest scenarios as requested
 
-            :param self.candlestick:_dataframe of data to run backtest on
-            :param self.data_points: dictionary of items which are available for backtest analylsis
-            :param self.days_to_skip: int the number of days to skip - longest set of minimum days across the indicators
+            :param self.candlestick:_dataframe of data to run backtest on; the candlestick stock data of one file
+                as StockData calculates it, or a StockArrays container of it
+            :param slopes_of_line: optional dictionary of precalculated slopes of line for the data, as
+                self.slopes_of_line holds them, to use instead of calculating them
+            :param self.stock_arrays: StockArrays container of the data
+            :param self.data_points: dictionary of items which are available for backtest analylsis; views of the
+                columns of self.stock_arrays, except for the date index
+            :param self.data_arrays: dictionary of the same items as numpy float arrays, for vectorized signals
+            :param self.slopes_of_line: dictionary of precalculated slopes of line for data points
+            :param self.strategy_results: dictionary of strategy number to the profit, winners, losers and trades
+                of its last backtest
+            :param self.days_to_skip: int the number of days to skip - longest set of minimum days across the
+                indicators
 
          """
         self.candlestick_data = df
+        self.stock_arrays = df if isinstance(df, StockArrays) else StockArrays.from_candlestick_data(df)
         self.data_points = {}
+        self.data_arrays = {}
+        self.slopes_of_line = {}
+        self.strategy_results = {}
         self.days_to_skip = 89  # 89d MA
-        number_of_data_points = 0
 
         self.get_data_points()
+        if slopes_of_line is not None:
+            self.slopes_of_line = dict(slopes_of_line)
+        else:
+            # slope windows used by the strategies, per data point: macd over 5 and 9 bars, macd signal over 8 and 9
+            self.calculate_slopes_of_line({"macd": [5, 9], "macd_signal": [8, 9]})
+
+    def window(self, start, stop):
+        """ BackTest of the data points from start to stop, which shares the data and the precalculated slopes of
+            line of this one as views instead of calculating them again; the indicators and slopes at the start of
+            the window are the ones of the whole data, so they have the data points before the window behind them
+        """
+        return BackTest(self.stock_arrays.slice(start, stop),
+                        slopes_of_line={key: slopes[start:stop] for key, slopes in self.slopes_of_line.items()})
 
-    def backtest_strategy_1(self):
-        """ backtest strategy 2
-                :param own_short: boolean:
+    @staged("backtest_strategy_1")
+    def backtest_strategy_1(self, williams_entry_point=-75, momentum_entry_point=0.05, stochastics_d_entry_point=60,
+                            slope_macd_entry_point=0.0025, slope_macd_exit_point=0.0011, trailing_stop_init=0.55,
+                            verbose=True):
+        """ backtest strategy 1; the entry and exit points and the trailing stop can be given to study other
+            thresholds, and the summary is kept in self.strategy_results[1]
+                :param verbose: boolean print each trade and the total profit
                 :param trailing_stop_init: int initial value of trailing stop
-                :param trailing_stop: int:
-                :param sell_position: boolean
-                :param purchase_price: int
-                :param slope_macd: int
                 :param min_data_points_for_macd: int
                 :param winners: int total number of winning trades
                 :param losers: int: total number losing trades
-                :param pd_close_data: series self.candlestick_data[CommonDefs.INDEX_OF_OHLC_DATA]["Close"]
+                :param close_data: numpy array of Close data
                 :param profit: int
                 :param williams_entry_point: int
                 :param momentum_entry_point: int
-                :param slope_momentum_entry_point: int
                 :param stochastics_d_entry_point: int
+                :param slope_macd_entry_point: int
+                :param slope_macd_exit_point: int
+                :param entry_signals: numpy boolean array, True where all entry conditions hold
+                :param exit_signals: numpy boolean array, True where the slope of MACD signals an exit
         """
 
         # short strategy:
@@ -44,221 +88,324 @@ class BackTest:
         # and stochastics signal is below 60
         # and macd < macd_signal
         # and slope < 0.0025
-        print(" \n\n************************************** BackTest Strategy 1 **************************************")
-        own_short = False
-        lowest_price_after_purchase = 0
-        trailing_stop_init = 0.55
-        trailing_stop = 0
-        sell_position = False
-        purchase_price = 0
-        slope_macd = 0
-        min_data_points_for_calculations = 26 + 5 + 1# 18 for macd min span
         min_data_points_for_macd = 5
-        williams_entry_point = -75
-        momentum_entry_point = 0.05
-        stochastics_d_entry_point = 60
-        slope_macd_entry_point = 0.0025
-        slope_macd_exit_point = 0.0011
-        convert_to_dollars = 100
-        winners = 0
-        losers = 0
-        pd_close_data = self.data_points['Close_Data']
-        number_of_data_points = len(self.data_points["momentum_data"])
-        profit = 0
-        for i in range(min_data_points_for_calculations + min_data_points_for_macd, number_of_data_points):
-            slope_macd = self.calculate_slope_of_line(self.data_points["macd"], i - min_data_points_for_macd , i)
-
-            if own_short is False and i > min_data_points_for_macd:
-                if self.data_points["williams_data"][i] <= williams_entry_point and \
-                    self.data_points["momentum_data"][i] <= momentum_entry_point and \
-                    self.data_points["stochastics_data_d"][i] <= stochastics_d_entry_point and \
-                    self.data_points["macd"][i]  < self.data_points["macd_signal"][i] and \
-                    slope_macd < slope_macd_entry_point:
-                        own_short = True
-                        purchase_price = pd_close_data[i]
-                        print("date: " + str(self.data_points["date_index"][i]) + " purchase at " +
-                              str(purchase_price))
-                        trailing_stop = purchase_price + trailing_stop_init
-                        lowest_price_after_purchase = purchase_price
-            else:
-                if own_short is True:
-                    slope_macd = self.calculate_slope_of_line(self.data_points["macd"], i - min_data_points_for_macd, i)
-
-                    if slope_macd > slope_macd_exit_point:
-                        # get slope of MACD signal; when it changes polarity, tighten the trailing stop position
-                        sell_position = True
-
-                    # reset trailing stop
-                    if pd_close_data[i] < lowest_price_after_purchase:
-                        lowest_price_after_purchase = pd_close_data[i-1]
-                        trailing_stop = lowest_price_after_purchase + trailing_stop_init
-
-                    if pd_close_data[i] > trailing_stop:
-                        sell_position = True
-
-                    if sell_position:
-                        print("   sell position: ", self.data_points["date_index"][i], " i = ", i,
-                              "price above trailing stop: ", pd_close_data[i], " > ", trailing_stop)
-                        own_short = False
-                        profit = profit + (purchase_price - pd_close_data[i]) * convert_to_dollars
-                        if (purchase_price - pd_close_data[i]) > 0:
-                            winners = winners + 1
-                        else:
-                            losers = losers + 1
-
-                        trailing_stop = 0
-                        sell_position = False
-                        lowest_price_after_purchase = 0
-
-                        print("   date: " + str(self.data_points["date_index"][i]) + "  sell at " +
-                              str(pd_close_data[i]) + " profit = " + str((purchase_price - pd_close_data[i]) *
-                                                                         convert_to_dollars))
-        print(" total profit = " + str(profit) + " winners: " + str(winners) + "  losers: " + str(losers))
+        close_data = self.get_data_array('Close_Data')
+        slopes_macd = self.get_slope_of_line("macd", min_data_points_for_macd)
+
+        entry_signals = (self.get_data_array("williams_data") <= williams_entry_point) & \
+                        (self.get_data_array("momentum_data") <= momentum_entry_point) & \
+                        (self.get_data_array("stochastics_data_d") <= stochastics_d_entry_point) & \
+                        (self.get_data_array("macd") < self.get_data_array("macd_signal")) & \
+                        (slopes_macd < slope_macd_entry_point)
+        # get slope of MACD signal; when it changes polarity, sell the position
+        exit_signals = slopes_macd > slope_macd_exit_point
+
+        trades = self.run_short_positions(self.FIRST_DATA_POINT[1], entry_signals, exit_signals, trailing_stop_init,
+                                          trailing_stop_from_prior_close=True, check_trailing_stop_first=False)
+
+        profit, winners, losers = self.trade_totals(trades)
+        if verbose:
+            print(self.report_strategy_1(trades, profit, winners, losers))
+        if log_level() != OFF:
+            log_trades(1, self.stock_arrays.dates, close_data, trades,
+                       {"williams": self.get_data_array("williams_data"),
+                        "momentum": self.get_data_array("momentum_data"),
+                        "stochastics_d": self.get_data_array("stochastics_data_d"),
+                        "macd": self.get_data_array("macd"), "macd_signal": self.get_data_array("macd_signal"),
+                        "slope_macd": slopes_macd, "exit_signal": exit_signals})
+            log_summary(1, profit, winners, losers)
 
+        self.strategy_results[1] = {"profit": profit, "winners": winners, "losers": losers, "trades": trades}
         return profit
 
-    def backtest_strategy_2(self):
-        """ backtest strategy 2
-                :param own_short boolean: boolean
+    @staged("backtest_strategy_2")
+    def backtest_strategy_2(self, williams_entry_point=-75, momentum_entry_point=0.05, stochastics_d_entry_point=60,
+                            slope_macd_entry_point=-0.005, slope_macd_exit_point=0.0015,
+                            slope_momentum_entry_point=0.0, trailing_stop_init=0.45, verbose=True):
+        """ backtest strategy 2; the entry and exit points and the trailing stop can be given to study other
+            thresholds, and the summary is kept in self.strategy_results[2]
+                :param verbose: boolean print each trade and the total profit
                 :param trailing_stop_init: int initial value of trailing stop
-                :param trailing_stop: int
-                :param sell_position: boolean
-                :param purchase_price: int
-                :param slope_macd: int
                 :param min_data_points_for_line: int
                 :param winners: int total number of winning trades
                 :param losers: int total number losing trades
-                :param pd_close_data: series self.candlestick_data[CommonDefs.INDEX_OF_OHLC_DATA]["Close"]
+                :param close_data: numpy array of Close data
                 :param profit: int
                 :param williams_entry_point: int
                 :param momentum_entry_point: int
                 :param slope_momentum_entry_point: int
                 :param stochastics_d_entry_point: int
+                :param slope_macd_entry_point: int
+                :param slope_macd_exit_point: int
+                :param entry_signals: numpy boolean array, True where all entry conditions hold
+                :param ma_exit_signals: numpy boolean array, True where the 21d MA signals an exit
+                :param slope_exit_signals: numpy boolean array, True where the slope of MACD signal signals an exit
         """
-        print("\n************************************** BackTest Strategy 2 ************************************")
         # short strategy:
         # when Williams %R below -75
         # and momentum is crossing, or has crossed below 0.05
         # and stochastics signal is <= 60
         # and macd < macd_signal
-        own_short = False
-        purchase_price = 0
-        trailing_stop_init = 0.45
-        lowest_price_after_purchase = 0
-        trailing_stop = 0
-        sell_position = False
         min_data_points_for_line = 9
-        min_data_points_for_calculations = 26 + min_data_points_for_line #  26 for macd min span + min points for line
-        williams_entry_point = -75
-        momentum_entry_point = 0.05
-        stochastics_d_entry_point = 60
-        slope_macd_entry_point = -0.005
-        slope_macd_exit_point = 0.0015
-        slope_momentum_entry_point = 0.0
-        convert_to_dollars = 100
-        winners = 0
-        losers = 0
-        pd_close_data = self.data_points['Close_Data']
-        number_of_data_points = len(self.data_points["momentum_data"])
-        profit = 0
-        for i in range(min_data_points_for_calculations + min_data_points_for_line, number_of_data_points):
-            slope_macd = self.calculate_slope_of_line(self.data_points["macd"], i - min_data_points_for_line , i)
-            slope_macd_signal = self.calculate_slope_of_line(self.data_points["macd_signal"],
-                                                             i - min_data_points_for_line, i)
-            slope_momentum = self.calculate_slope_of_line(self.data_points["macd_signal"],
-                                                          i - min_data_points_for_line + 1, i)
-
-            if own_short is False and i > min_data_points_for_calculations and \
-                    not math.isnan(self.data_points["ma_data_55d"][i]):
-                if self.data_points["williams_data"][i] <= williams_entry_point and \
-                        self.data_points["momentum_data"][i] <= momentum_entry_point and \
-                        self.data_points["stochastics_data_d"][i] <= stochastics_d_entry_point and \
-                        self.data_points["macd"][i] < self.data_points["macd_signal"][i] and \
-                        slope_macd < slope_macd_entry_point and \
-                        slope_momentum < slope_momentum_entry_point:
-
-                    own_short = True
-                    purchase_price = pd_close_data[i]
-                    print("**date: " + str(self.data_points["date_index"][i]) + " purchase at " +
-                          str(purchase_price))
-                    print("     open position slope_MACD_signal = ", slope_macd_signal, "slope_MACD = ",
-                          slope_macd, " close price = ", pd_close_data[i])
-                    lowest_price_after_purchase = purchase_price
-                    trailing_stop = purchase_price + trailing_stop_init
-            else:
-                if own_short is True:  #check for exit
-                    ma_data_21d = self.data_points["ma_data_21d"]
-                    ma_data_55d = self.data_points["ma_data_55d"]
-
-                    if not math.isnan(ma_data_21d[i]) and not math.isnan(ma_data_55d[i]):
-                        if ma_data_21d[i] >= ma_data_55d[i] or pd_close_data[i] > self.data_points["ma_data_21d"][i]:
-                            print(" close position 21dMA = ", ma_data_21d[i], "55dMA = ", ma_data_55d[i],
-                                  "  close price = ", pd_close_data[i])
-                            sell_position = True
-                        if slope_macd_signal > slope_macd_exit_point:
-                            print (" close position slope_MACD_signal = ", slope_macd_signal, "slope_MACD = ",
-                                  slope_macd, " close price = ", pd_close_data[i])
-                            sell_position = True
-
-                    if pd_close_data[i] > trailing_stop:
-                        print(" close position on trailing stop: close ", pd_close_data[i], " > ", trailing_stop)
-                        print(    "slope_MACD_signal = ", slope_macd_signal, " slope_MACD = ", slope_macd)
-                        sell_position = True
-
-                    # reset trailing stop
-                    if pd_close_data[i] < lowest_price_after_purchase:
-                        lowest_price_after_purchase = pd_close_data[i]
-                        trailing_stop = lowest_price_after_purchase + trailing_stop_init
-
-                    if sell_position:
-                        print("   sell position: ", self.data_points["date_index"][i], " i =", i,
-                              " price: ", pd_close_data[i], " trailing stop: ", trailing_stop)
-                        own_short = False
-                        profit = profit + (purchase_price - pd_close_data[i]) * convert_to_dollars
-                        if (purchase_price - pd_close_data[i]) > 0:
-                            winners = winners + 1
-                        else:
-                            losers = losers + 1
-
-                        lowest_price_after_purchase = 0
-                        trailing_stop = 0
-                        sell_position = False
-
-                        print("   date: " + str(
-                            self.data_points["date_index"][i]) + "  sell at " + str(
-                            pd_close_data[i]) + " profit = " + str((purchase_price - pd_close_data[i]) *
-                                                                   convert_to_dollars))
-
-        print(" total profit = " + str(profit) + " winners: " + str(winners) + "  losers: " + str(losers))
+        close_data = self.get_data_array('Close_Data')
+        ma_data_21d = self.get_data_array("ma_data_21d")
+        ma_data_55d = self.get_data_array("ma_data_55d")
+        slopes_macd = self.get_slope_of_line("macd", min_data_points_for_line)
+        slopes_macd_signal = self.get_slope_of_line("macd_signal", min_data_points_for_line)
+        slopes_momentum = self.get_slope_of_line("macd_signal", min_data_points_for_line - 1)
+
+        entry_signals = ~np.isnan(ma_data_55d) & \
+                        (self.get_data_array("williams_data") <= williams_entry_point) & \
+                        (self.get_data_array("momentum_data") <= momentum_entry_point) & \
+                        (self.get_data_array("stochastics_data_d") <= stochastics_d_entry_point) & \
+                        (self.get_data_array("macd") < self.get_data_array("macd_signal")) & \
+                        (slopes_macd < slope_macd_entry_point) & \
+                        (slopes_momentum < slope_momentum_entry_point)
+        ma_available = ~np.isnan(ma_data_21d) & ~np.isnan(ma_data_55d)
+        ma_exit_signals = ma_available & ((ma_data_21d >= ma_data_55d) | (close_data > ma_data_21d))
+        slope_exit_signals = ma_available & (slopes_macd_signal > slope_macd_exit_point)
+
+        trades = self.run_short_positions(self.FIRST_DATA_POINT[2], entry_signals, ma_exit_signals | slope_exit_signals,
+                                          trailing_stop_init, trailing_stop_from_prior_close=False,
+                                          check_trailing_stop_first=True)
+
+        profit, winners, losers = self.trade_totals(trades)
+        if verbose:
+            print(self.report_strategy_2(trades, profit, winners, losers, slopes_macd, slopes_macd_signal,
+                                         ma_exit_signals, slope_exit_signals))
+        if log_level() != OFF:
+            log_trades(2, self.stock_arrays.dates, close_data, trades,
+                       {"williams": self.get_data_array("williams_data"),
+                        "momentum": self.get_data_array("momentum_data"),
+                        "stochastics_d": self.get_data_array("stochastics_data_d"),
+                        "macd": self.get_data_array("macd"), "macd_signal": self.get_data_array("macd_signal"),
+                        "slope_macd": slopes_macd, "slope_macd_signal": slopes_macd_signal,
+                        "ma_21": ma_data_21d, "ma_55": ma_data_55d,
+                        "exit_signal": ma_exit_signals | slope_exit_signals})
+            log_summary(2, profit, winners, losers)
+        self.strategy_results[2] = {"profit": profit, "winners": winners, "losers": losers, "trades": trades,
+                                    "report_signals": (slopes_macd, slopes_macd_signal, ma_exit_signals,
+                                                       slope_exit_signals)}
         return profit
 
+    def run_strategy(self, strategy, verbose=False, **parameters):
+        """ backtest strategy 1 or 2 with the given thresholds, the defaults for the ones not given, and return its
+            profit; the summary is kept in self.strategy_results[strategy] """
+        if strategy == 1:
+            return self.backtest_strategy_1(verbose=verbose, **parameters)
+        if strategy == 2:
+            return self.backtest_strategy_2(verbose=verbose, **parameters)
+        raise ValueError("unknown strategy " + str(strategy) + "; use 1 or 2")
+
+    def trade_totals(self, trades):
+        """ profit in dollars, winners and losers of the trades which were closed; the profit is summed in the order
+            of the trades """
+        convert_to_dollars = 100
+        close_data = self.get_data_array('Close_Data')
+        exit = np.array([trade["exit"] for trade in trades if trade["exit"] is not None], dtype=np.int64)
+        purchase_price = np.array([trade["purchase_price"] for trade in trades[:len(exit)]], dtype=float)
+        price_changes = purchase_price - close_data[exit]
+        winners = int(np.count_nonzero(price_changes > 0))
+        return sum((price_changes * convert_to_dollars).tolist()), winners, len(exit) - winners
+
+    def report(self, strategy):
+        """ text of each trade of the last backtest of a strategy and its total profit, as a verbose backtest prints
+            it """
+        result = self.strategy_results[strategy]
+        if strategy == 1:
+            return self.report_strategy_1(result["trades"], result["profit"], result["winners"], result["losers"])
+        return self.report_strategy_2(result["trades"], result["profit"], result["winners"], result["losers"],
+                                      *result["report_signals"])
+
+    def report_strategy_1(self, trades, profit, winners, losers):
+        """ text of each trade of strategy 1 and the total profit, for verbose backtests """
+        convert_to_dollars = 100
+        close_data = self.get_data_array('Close_Data')
+        date_index = self.data_points["date_index"]
+        lines = [" \n\n************************************** BackTest Strategy 1 "
+                 "**************************************"]
+        for trade in trades:
+            purchase_price = trade["purchase_price"]
+            i = trade["exit"]
+            lines.append("date: " + str(date_index[trade["entry"]]) + " purchase at " + str(purchase_price))
+            if i is None:
+                break
+            lines.append(text_line("   sell position: ", date_index[i], " i = ", i, "price above trailing stop: ",
+                                   close_data[i], " > ", trade["trailing_stop"]))
+            lines.append("   date: " + str(date_index[i]) + "  sell at " + str(close_data[i]) + " profit = " +
+                         str((purchase_price - close_data[i]) * convert_to_dollars))
+        lines.append(" total profit = " + str(profit) + " winners: " + str(winners) + "  losers: " + str(losers))
+        return "\n".join(lines)
+
+    def report_strategy_2(self, trades, profit, winners, losers, slopes_macd, slopes_macd_signal, ma_exit_signals,
+                          slope_exit_signals):
+        """ text of each trade of strategy 2, with the reason it was closed, and the total profit, for verbose
+            backtests """
+        convert_to_dollars = 100
+        close_data = self.get_data_array('Close_Data')
+        ma_data_21d = self.get_data_array("ma_data_21d")
+        ma_data_55d = self.get_data_array("ma_data_55d")
+        date_index = self.data_points["date_index"]
+        lines = ["\n************************************** BackTest Strategy 2 ************************************"]
+        for trade in trades:
+            purchase_price = trade["purchase_price"]
+            i = trade["entry"]
+            lines.append("**date: " + str(date_index[i]) + " purchase at " + str(purchase_price))
+            lines.append(text_line("     open position slope_MACD_signal = ", slopes_macd_signal[i], "slope_MACD = ",
+                                   slopes_macd[i], " close price = ", close_data[i]))
+
+            i = trade["exit"]
+            if i is None:
+                break
+            if ma_exit_signals[i]:
+                lines.append(text_line(" close position 21dMA = ", ma_data_21d[i], "55dMA = ", ma_data_55d[i],
+                                       "  close price = ", close_data[i]))
+            if slope_exit_signals[i]:
+                lines.append(text_line(" close position slope_MACD_signal = ", slopes_macd_signal[i],
+                                       "slope_MACD = ", slopes_macd[i], " close price = ", close_data[i]))
+            if trade["trailing_stop_hit"]:
+                lines.append(text_line(" close position on trailing stop: close ", close_data[i], " > ",
+                                       trade["trailing_stop_checked"]))
+                lines.append(text_line("slope_MACD_signal = ", slopes_macd_signal[i], " slope_MACD = ",
+                                       slopes_macd[i]))
+            lines.append(text_line("   sell position: ", date_index[i], " i =", i, " price: ", close_data[i],
+                                   " trailing stop: ", trade["trailing_stop"]))
+            lines.append("   date: " + str(date_index[i]) + "  sell at " + str(close_data[i]) + " profit = " +
+                         str((purchase_price - close_data[i]) * convert_to_dollars))
+        lines.append(" total profit = " + str(profit) + " winners: " + str(winners) + "  losers: " + str(losers))
+        return "\n".join(lines)
+
+    def trade_list(self, strategy):
+        """ the trades closed in the last backtest of a strategy, as a dataframe with one row per trade: entry and
+            exit data point and date, purchase and sell price and profit in dollars; a position still open at the
+            end of the data is left out, as it is from the profit """
+        trades = []
+        for trade in self.strategy_results[strategy]["trades"]:
+            if trade["exit"] is None:
+                break
+            trades.append(trade)
+        convert_to_dollars = 100
+        close_data = self.get_data_array('Close_Data')
+        dates = self.data_points["date_index"].to_numpy()
+        entry = np.array([trade["entry"] for trade in trades], dtype=np.int64)
+        exit = np.array([trade["exit"] for trade in trades], dtype=np.int64)
+        purchase_price = np.array([trade["purchase_price"] for trade in trades], dtype=float)
+        return pd.DataFrame({"entry": entry, "exit": exit, "purchase_price": purchase_price,
+                             "sell_price": close_data[exit], "entry_date": dates[entry], "exit_date": dates[exit],
+                             "profit": (purchase_price - close_data[exit]) * convert_to_dollars})
+
+    @staged("run_short_positions")
+    def run_short_positions(self, first_data_point, entry_signals, exit_signals, trailing_stop_init,
+                            trailing_stop_from_prior_close, check_trailing_stop_first):
+        """ run the stateful part of a short strategy: open a position on the next entry signal, follow the
+            trailing stop while the position is open and close it on an exit signal or when the close goes above
+            the trailing stop. Only bars with an open position are visited one by one; between positions the
+            search jumps straight to the next entry signal.
+
+            :param first_data_point: int first data point at which a position can be opened
+            :param entry_signals: numpy boolean array of data points where a position is opened
+            :param exit_signals: numpy boolean array of data points where an open position is closed
+            :param trailing_stop_init: float distance of the trailing stop above the lowest price after purchase
+            :param trailing_stop_from_prior_close: boolean on a new low, reset the trailing stop from the previous
+                close instead of the current one
+            :param check_trailing_stop_first: boolean compare the close with the trailing stop before it is reset
+                instead of after
+            :param trades: list of dictionaries with entry and exit data point, purchase price, the trailing stop
+                the close was compared with, the trailing stop after reset and whether it closed the position;
+                exit is None if the position is still open at the end of the data
+        """
+        close_data = self.get_data_array('Close_Data').tolist()
+        exit_signals = exit_signals.tolist()
+        number_of_data_points = len(close_data)
+        entry_points = np.flatnonzero(entry_signals[first_data_point:]) + first_data_point
+
+        trades = []
+        i = first_data_point
+        while True:
+            next_entry = np.searchsorted(entry_points, i)
+            if next_entry >= len(entry_points):
+                break
+            entry = int(entry_points[next_entry])
+            purchase_price = close_data[entry]
+            lowest_price_after_purchase = purchase_price
+            trailing_stop = purchase_price + trailing_stop_init
+            trade = {"entry": entry, "exit": None, "purchase_price": purchase_price}
+            trades.append(trade)
+
+            for i in range(entry + 1, number_of_data_points):
+                close_price = close_data[i]
+                trailing_stop_checked = trailing_stop
+                if check_trailing_stop_first:
+                    trailing_stop_hit = close_price > trailing_stop
+
+                # reset trailing stop
+                if close_price < lowest_price_after_purchase:
+                    lowest_price_after_purchase = close_data[i - 1] if trailing_stop_from_prior_close else close_price
+                    trailing_stop = lowest_price_after_purchase + trailing_stop_init
+
+                if not check_trailing_stop_first:
+                    trailing_stop_checked = trailing_stop
+                    trailing_stop_hit = close_price > trailing_stop
+
+                if exit_signals[i] or trailing_stop_hit:
+                    trade.update({"exit": i, "trailing_stop_checked": trailing_stop_checked,
+                                  "trailing_stop": trailing_stop, "trailing_stop_hit": trailing_stop_hit})
+                    break
+
+            if trade["exit"] is None:
+                break
+            i = trade["exit"] + 1
+
+        return trades
+
+    @staged("get_data_points")
     def get_data_points(self):
-        self.data_points["date_index"] = self.candlestick_data[CommonDefs.INDEX_OF_DATE_INDEX]["date_index"]
-        number_of_data_points = 0
-        if len(self.candlestick_data) > 0:
-            number_of_data_points = len(self.candlestick_data[CommonDefs.INDEX_OF_MOMENTUM_DATA]["momentum"])
+        stock_arrays = self.stock_arrays
+        self.data_points["date_index"] = pd.Series(stock_arrays.dates, copy=False)
 
         # for each set of data, arrange the indicators for easy retrieval and comparison of data points
-        # skip the frst 89 because that's the 89dayMA
-        for j in range(89, number_of_data_points):
-            self.data_points['Close_Data'] = self.candlestick_data[CommonDefs.INDEX_OF_OHLC_DATA]["Close"]
-            self.data_points["williams_data"] = self.candlestick_data[CommonDefs.INDEX_OF_WILLIAMS_DATA]["%R"]
-            self.data_points["ma_data_21d"] = self.candlestick_data[CommonDefs.INDEX_OF_MA_DATA]["pd_sma_21day"]["MA_21"]
-            self.data_points["ma_data_55d"] = self.candlestick_data[CommonDefs.INDEX_OF_MA_DATA]["pd_sma_55day"]["MA_55"]
-            self.data_points["ma_data_89d"] = self.candlestick_data[CommonDefs.INDEX_OF_MA_DATA]["pd_sma_89day"]["MA_89"]
-            self.data_points["stochastics_data_k"] = self.candlestick_data[CommonDefs.INDEX_OF_STOCHASTICS_DATA]["%K"]
-            self.data_points["stochastics_data_d"] = self.candlestick_data[CommonDefs.INDEX_OF_STOCHASTICS_DATA]["%D"]
-            self.data_points["momentum_data"] = self.candlestick_data[CommonDefs.INDEX_OF_MOMENTUM_DATA]["momentum"]
-            self.data_points["macd"] = self.candlestick_data[CommonDefs.INDEX_OF_MACD_DATA]["macd"]["MACD_12_26"]
-            self.data_points["macd_signal"] = self.candlestick_data[CommonDefs.INDEX_OF_MACD_DATA]["macd"] \
-                ["MACDsign_12_26"]
+        self.data_points['Close_Data'] = stock_arrays["Close"]
+        self.data_points["williams_data"] = stock_arrays["%R"]
+        self.data_points["ma_data_21d"] = stock_arrays["MA_21"]
+        self.data_points["ma_data_55d"] = stock_arrays["MA_55"]
+        self.data_points["ma_data_89d"] = stock_arrays["MA_89"]
+        self.data_points["stochastics_data_k"] = stock_arrays["%K"]
+        self.data_points["stochastics_data_d"] = stock_arrays["%D"]
+        self.data_points["momentum_data"] = stock_arrays["momentum"]
+        self.data_points["macd"] = stock_arrays["MACD_12_26"]
+        self.data_points["macd_signal"] = stock_arrays["MACDsign_12_26"]
+
+    def get_data_array(self, name):
+        """ return the data point as a numpy float array, converting it the first time it is requested """
+        if name not in self.data_arrays:
+            self.data_arrays[name] = np.asarray(self.data_points[name], dtype=float)
+        return self.data_arrays[name]
+
+    @staged("calculate_slopes_of_line")
+    def calculate_slopes_of_line(self, windows_for_data_points):
+        """ precalculate the slope of line for every data point, for each data point name and window length
+
+            :param windows_for_data_points: dictionary of data point name to list of int window lengths
+            :param self.slopes_of_line: dictionary of (data point name, window) to numpy array; element i holds the
+                slope over the window which ends on the data point before i, as calculate_slope_of_line(series,
+                i - window, i)
+        """
+        for name, windows in windows_for_data_points.items():
+            slopes = rolling_slopes(self.data_points[name], windows).to_numpy()
+            for column, window in enumerate(windows):
+                self.slopes_of_line[(name, window)] = np.concatenate(([np.nan], slopes[:-1, column]))
+
+    def get_slope_of_line(self, name, window):
+        """ return the precalculated slopes of line for the data point name and window length, calculating them
+            if they have not been requested before """
+        if (name, window) not in self.slopes_of_line:
+            self.calculate_slopes_of_line({name: [window]})
+        return self.slopes_of_line[(name, window)]
 
     def calculate_slope_of_line(self, series, beginning, end):
         # calculate slope of MACD signal line using linear regression
         slope = 0
         if (end - beginning) > 1:
-            x_values = list(range(beginning, end))
-            y_values = series[beginning: end]
-            slope, intercept, r_value, p_value, std_err = stats.linregress(x_values, list(y_values))
+            slope = rolling_slopes(series[beginning: end], [end - beginning]).iloc[-1, 0]
 
         return slope
@@ -0,0 +1,252 @@
+""" Bar replay simulation of the BackTest strategies
+    The intraday .csv files are replayed bar by bar through an in-process or local socket feed, at a configurable
+    multiple of real time or as fast as possible. Each bar updates the streaming indicators and the strategy decides
+    at once whether to open or close a short position, as it would on a live feed. The replay reports the
+    throughput in bars per second and the latency from the arrival of each bar to the decision.
+
+    Usage: python BarReplay.py [--strategy 1|2] [--speed multiple_of_real_time] [--socket] [files or directories]
+"""
+import argparse
+import math
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from BackTest import BackTest
+from StockData import StockData
+from ParameterSweep import STRATEGY_PARAMETERS
+from streaming_indicators import StreamingIndicators, StreamingSlope
+
+DEFAULT_REPLAY_DIRECTORY = "./StockMarketData/Intraday/eachDay"
+CONVERT_TO_DOLLARS = 100
+
+
+def find_csv_files(paths):
+    """ .csv files in the given files and directories, in sorted order """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for r, d, f in os.walk(path):
+                files.extend(os.path.join(r, item) for item in f if item[-4:] == ".csv")
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def read_sessions(csv_files):
+    """ cleaned up bars of each .csv file, read as StockStrategy does, as a list of (timestamps, closes) """
+    sessions = []
+    for filename in csv_files:
+        stock_data = StockData.cleanup_stock_data(pd.read_csv(filename))
+        timestamps = pd.to_datetime(stock_data["Date"]).to_numpy("datetime64[ns]").astype(np.int64)
+        sessions.append((timestamps.tolist(), stock_data["Close"].to_numpy(dtype=float).tolist()))
+    return sessions
+
+
+def paced_bars(sessions, speed):
+    """ generate (session number, timestamp, close) for every bar, waiting between bars of the same session for the
+        time between their timestamps divided by speed; speed None or 0 replays as fast as possible """
+    for session_number, (timestamps, closes) in enumerate(sessions):
+        replay_start = time.perf_counter()
+        for timestamp, close in zip(timestamps, closes):
+            if speed:
+                delay = (timestamp - timestamps[0]) / 1e9 / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield session_number, timestamp, close
+
+
+def in_process_feed(sessions, speed):
+    """ bars straight from the generator """
+    return paced_bars(sessions, speed)
+
+
+def socket_feed(sessions, speed):
+    """ bars sent as text lines by a sender thread over a local TCP socket, and parsed as they are received """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(1)
+
+    def send_bars():
+        connection, _ = server.accept()
+        with connection, connection.makefile("w") as stream:
+            for session_number, timestamp, close in paced_bars(sessions, speed):
+                stream.write(str(session_number) + "," + str(timestamp) + "," + repr(close) + "\n")
+                if speed:
+                    stream.flush()
+        server.close()
+
+    sender = threading.Thread(target=send_bars, daemon=True)
+    sender.start()
+    client = socket.create_connection(server.getsockname())
+    with client, client.makefile("r") as stream:
+        for line in stream:
+            session_number, timestamp, close = line.split(",")
+            yield int(session_number), int(timestamp), float(close)
+    sender.join()
+
+
+class StreamingStrategy:
+    def __init__(self, strategy=1, **parameters):
+        """ A BackTest short strategy evaluated one bar at a time on streaming indicators. The entry and exit rules
+            and the trailing stop are those of backtest_strategy_1 or backtest_strategy_2 with the same parameters.
+
+            :param strategy: int 1 or 2
+            :param parameters: thresholds of the strategy, as in ParameterSweep.STRATEGY_PARAMETERS; defaults for the
+                ones not given
+            :param self.trades: list of (entry bar, exit bar, purchase price, sell price) of closed positions
+        """
+        self.strategy = strategy
+        self.parameters = dict(STRATEGY_PARAMETERS[strategy])
+        self.parameters.update(parameters)
+        self.indicators = StreamingIndicators()
+        self.first_data_point = BackTest.FIRST_DATA_POINT[strategy]
+        if strategy == 1:
+            self.slope_macd = StreamingSlope(5)
+        else:
+            self.slope_macd = StreamingSlope(9)
+            self.slope_macd_signal = StreamingSlope(9)
+            self.slope_momentum = StreamingSlope(8)
+        self.bar = -1
+        self.previous_close = math.nan
+        self.own_short = False
+        self.entry_bar = None
+        self.purchase_price = 0
+        self.lowest_price_after_purchase = 0
+        self.trailing_stop = 0
+        self.trades = []
+
+    def update(self, close):
+        """ add one bar and decide
+
+            :return: "open short" when a position is opened, "close short" when it is closed, otherwise None
+        """
+        self.bar = self.bar + 1
+        parameters = self.parameters
+        values = self.indicators.update(close)
+        macd_value, macd_signal = values["MACD_12_26"], values["MACDsign_12_26"]
+
+        # the slopes cover the bars before this one
+        slope_macd = self.slope_macd.value
+        self.slope_macd.update(macd_value)
+        if self.strategy == 2:
+            slope_macd_signal = self.slope_macd_signal.value
+            slope_momentum = self.slope_momentum.value
+            self.slope_macd_signal.update(macd_signal)
+            self.slope_momentum.update(macd_signal)
+
+        decision = None
+        if not self.own_short:
+            if self.bar >= self.first_data_point and \
+                    values["%R"] <= parameters["williams_entry_point"] and \
+                    values["momentum"] <= parameters["momentum_entry_point"] and \
+                    values["%D"] <= parameters["stochastics_d_entry_point"] and \
+                    macd_value < macd_signal and \
+                    slope_macd < parameters["slope_macd_entry_point"] and \
+                    (self.strategy == 1 or (not math.isnan(values["MA_55"]) and
+                                            slope_momentum < parameters["slope_momentum_entry_point"])):
+                self.own_short = True
+                self.entry_bar = self.bar
+                self.purchase_price = close
+                self.lowest_price_after_purchase = close
+                self.trailing_stop = close + parameters["trailing_stop_init"]
+                decision = "open short"
+        else:
+            if self.strategy == 1:
+                sell_position = slope_macd > parameters["slope_macd_exit_point"]
+                if close < self.lowest_price_after_purchase:
+                    self.lowest_price_after_purchase = self.previous_close
+                    self.trailing_stop = self.lowest_price_after_purchase + parameters["trailing_stop_init"]
+                sell_position = sell_position or close > self.trailing_stop
+            else:
+                ma_21d, ma_55d = values["MA_21"], values["MA_55"]
+                sell_position = not math.isnan(ma_21d) and not math.isnan(ma_55d) and \
+                    (ma_21d >= ma_55d or close > ma_21d or slope_macd_signal > parameters["slope_macd_exit_point"])
+                sell_position = sell_position or close > self.trailing_stop
+                if close < self.lowest_price_after_purchase:
+                    self.lowest_price_after_purchase = close
+                    self.trailing_stop = self.lowest_price_after_purchase + parameters["trailing_stop_init"]
+
+            if sell_position:
+                self.own_short = False
+                self.trades.append((self.entry_bar, self.bar, self.purchase_price, close))
+                decision = "close short"
+
+        self.previous_close = close
+        return decision
+
+
+def replay(sessions, strategy=1, speed=None, use_socket=False, parameters=None):
+    """ Replay the sessions through a feed and evaluate the strategy on each bar as it arrives
+
+        :param sessions: list of (timestamps, closes), e.g. from read_sessions
+        :param strategy: int 1 or 2
+        :param speed: multiple of real time; None or 0 replays as fast as possible
+        :param use_socket: boolean send the bars over a local TCP socket instead of in process
+        :param parameters: optional dictionary of strategy thresholds
+        :return: dictionary with the number of bars, elapsed seconds, bars per second, latency percentiles in
+            microseconds, and the trades, winners, losers and profit of all sessions
+    """
+    feed = socket_feed(sessions, speed) if use_socket else in_process_feed(sessions, speed)
+    total_bars = sum(len(closes) for _, closes in sessions)
+    latencies = np.empty(total_bars, dtype=np.int64)
+    trades = []
+    strategy_for_session = None
+    current_session = None
+    bar = 0
+
+    start = time.perf_counter()
+    for session_number, timestamp, close in feed:
+        arrival = time.perf_counter_ns()
+        if session_number != current_session:
+            if strategy_for_session is not None:
+                trades.extend(strategy_for_session.trades)
+            strategy_for_session = StreamingStrategy(strategy, **(parameters or {}))
+            current_session = session_number
+        strategy_for_session.update(close)
+        latencies[bar] = time.perf_counter_ns() - arrival
+        bar = bar + 1
+    elapsed = time.perf_counter() - start
+    if strategy_for_session is not None:
+        trades.extend(strategy_for_session.trades)
+
+    latencies = latencies[:bar] / 1000.0
+    profits = [(purchase_price - sell_price) * CONVERT_TO_DOLLARS for _, _, purchase_price, sell_price in trades]
+    return {"bars": bar,
+            "elapsed_seconds": elapsed,
+            "bars_per_second": bar / elapsed if elapsed > 0 else math.inf,
+            "latency_p50_us": float(np.percentile(latencies, 50)) if bar else math.nan,
+            "latency_p99_us": float(np.percentile(latencies, 99)) if bar else math.nan,
+            "latency_max_us": float(latencies.max()) if bar else math.nan,
+            "trades": trades,
+            "winners": sum(1 for profit in profits if profit > 0),
+            "losers": sum(1 for profit in profits if profit <= 0),
+            "profit": sum(profits)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay intraday bars through the BackTest strategies")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_REPLAY_DIRECTORY],
+                        help=".csv files or directories to replay")
+    parser.add_argument("--strategy", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--speed", type=float, default=0,
+                        help="multiple of real time; 0 replays as fast as possible")
+    parser.add_argument("--socket", action="store_true", help="send the bars over a local TCP socket")
+    args = parser.parse_args()
+
+    sessions = read_sessions(find_csv_files(args.paths))
+    report = replay(sessions, args.strategy, args.speed, args.socket)
+    print("bars: " + str(report["bars"]) + "  elapsed: " + "%.3f" % report["elapsed_seconds"] + " s" +
+          "  throughput: " + "%.0f" % report["bars_per_second"] + " bars/s")
+    print("latency from bar arrival to decision: p50 = " + "%.1f" % report["latency_p50_us"] + " us  p99 = " +
+          "%.1f" % report["latency_p99_us"] + " us  max = " + "%.1f" % report["latency_max_us"] + " us")
+    print("trades: " + str(len(report["trades"])) + "  winners: " + str(report["winners"]) + "  losers: " +
+          str(report["losers"]) + "  profit = " + str(report["profit"]))
+
+
+if __name__ == "__main__":
+    main()
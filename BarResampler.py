@@ -0,0 +1,146 @@
+""" Resampling of OHLCV bars to coarser timeframes
+    The bars of a symbol (minute bars, say) are aggregated to any coarser timeframe, e.g. 5, 15 or 60 minute bars,
+    or daily bars, in one vectorized pass: each bar falls in the bucket of its timestamp floored to a multiple of
+    the timeframe, and each bucket becomes one bar with the open of its first bar, the highest high, the lowest
+    low, the close of its last bar and the summed volume, stamped with the start of the bucket. Buckets without
+    bars are left out. The buckets are aligned to the epoch, which is midnight for the timeframes a day divides
+    into, so the buckets of a timeframe nest in those of each of its multiples.
+
+    A BarResampler keeps the bars of each timeframe it has made, and makes a coarser timeframe from the coarsest
+    one kept which divides it (1 minute -> 5 minutes -> 15 minutes), so scanning several timeframes reads and
+    aggregates the raw bars once. The bars are columns in the layout of MarketDataStore.load(), and dataframe()
+    and sessions() give them in the format StockData accepts, e.g. with StockData.from_bars().
+
+    Usage:
+        resampler = BarResampler.from_files(get_stock_data_files("minute"))
+        for timeframe in ["5min", "15min", "60min"]:
+            stock_data = StockData.from_bars(resampler, timeframe, split_by_day=True)
+"""
+import numpy as np
+import pandas as pd
+
+from MarketDataStore import TIMESTAMP_COLUMN, DATA_COLUMNS, NANOSECONDS_PER_DAY, read_csv_file
+
+
+def timeframe_nanoseconds(timeframe):
+    """ length of a timeframe in nanoseconds
+
+        :param timeframe: anything pd.Timedelta accepts, e.g. "5min", "1h" or "1D", or an int number of nanoseconds
+    """
+    if isinstance(timeframe, (int, np.integer)):
+        nanoseconds = int(timeframe)
+    else:
+        nanoseconds = pd.Timedelta(timeframe).value
+    if nanoseconds <= 0:
+        raise ValueError("timeframe must be positive: " + str(timeframe))
+    return nanoseconds
+
+
+def resample_columns(columns, timeframe):
+    """ Aggregate bars sorted by timestamp to a timeframe
+
+        :param columns: dictionary with the timestamp column (int64 nanoseconds) and the OHLCV columns
+        :param timeframe: timeframe of the bars made, as timeframe_nanoseconds() accepts
+        :return: dictionary of the same columns with one row per bucket of the timeframe which has bars
+    """
+    nanoseconds = timeframe_nanoseconds(timeframe)
+    timestamps = np.asarray(columns[TIMESTAMP_COLUMN])
+    if len(timestamps) == 0:
+        return {column: np.asarray(values).copy() for column, values in columns.items()}
+
+    buckets = timestamps // nanoseconds
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[:1] - 1))
+    ends = np.append(starts[1:], len(buckets))
+    return {TIMESTAMP_COLUMN: buckets[starts] * nanoseconds,
+            "Open": np.asarray(columns["Open"])[starts],
+            "High": np.fmax.reduceat(np.asarray(columns["High"]), starts),
+            "Low": np.fmin.reduceat(np.asarray(columns["Low"]), starts),
+            "Close": np.asarray(columns["Close"])[ends - 1],
+            "Volume": np.add.reduceat(np.asarray(columns["Volume"]), starts)}
+
+
+def columns_to_dataframe(columns):
+    """ dataframe with Date, Open, High, Low, Close and Volume columns, in the format StockData accepts """
+    data = {"Date": pd.to_datetime(np.asarray(columns[TIMESTAMP_COLUMN]))}
+    for column in DATA_COLUMNS:
+        data[column] = np.asarray(columns[column])
+    return pd.DataFrame(data)
+
+
+class BarResampler:
+    def __init__(self, columns):
+        """ Resampler of the bars of one symbol
+
+            :param columns: dictionary with the timestamp column (int64 nanoseconds) and the OHLCV columns of the
+                bars, sorted by timestamp, as MarketDataStore.load() returns them
+            :param self.raw_columns: the bars given, which any timeframe can be made from
+            :param self.columns_for_timeframe: dictionary of timeframe in nanoseconds to the bars made for it
+        """
+        self.raw_columns = {column: np.asarray(columns[column]) for column in [TIMESTAMP_COLUMN] + DATA_COLUMNS}
+        self.columns_for_timeframe = {}
+
+    @classmethod
+    def from_dataframe(cls, df_element):
+        """ resampler of the bars of a dataframe with a Date column and the OHLCV columns, in any order """
+        timestamps = pd.to_datetime(df_element["Date"]).to_numpy("datetime64[ns]").astype(np.int64)
+        order = np.argsort(timestamps, kind="stable")
+        columns = {TIMESTAMP_COLUMN: timestamps[order]}
+        for column in DATA_COLUMNS:
+            columns[column] = df_element[column].to_numpy(dtype=float)[order]
+        return cls(columns)
+
+    @classmethod
+    def from_files(cls, csv_files):
+        """ resampler of the bars of .csv files of one symbol, daily or intraday, read and cleaned up once """
+        return cls.from_dataframe(pd.concat([read_csv_file(filename) for filename in csv_files],
+                                            ignore_index=True))
+
+    @classmethod
+    def from_store(cls, store, symbol, start=None, end=None):
+        """ resampler of the bars of one symbol in a MarketDataStore over a date range """
+        return cls(store.load(symbol, start, end))
+
+    def timeframes(self):
+        """ the timeframes made so far, in nanoseconds """
+        return sorted(self.columns_for_timeframe)
+
+    def columns(self, timeframe):
+        """ Bars of a timeframe, made from the coarsest timeframe kept which divides it, or from the raw bars when
+            none does, and kept for the next time
+
+            :param timeframe: as timeframe_nanoseconds() accepts
+            :return: dictionary with the timestamp column and the OHLCV columns
+        """
+        nanoseconds = timeframe_nanoseconds(timeframe)
+        if nanoseconds not in self.columns_for_timeframe:
+            divisors = [kept for kept in self.columns_for_timeframe if nanoseconds % kept == 0]
+            source = self.columns_for_timeframe[max(divisors)] if divisors else self.raw_columns
+            self.columns_for_timeframe[nanoseconds] = resample_columns(source, nanoseconds)
+        return self.columns_for_timeframe[nanoseconds]
+
+    def columns_in_range(self, timeframe, start=None, end=None):
+        """ bars of a timeframe for a date range, as slices of the kept bars
+
+            :param start: first date/time to include, anything pd.Timestamp accepts; from the first bar when None
+            :param end: date/time to stop before, anything pd.Timestamp accepts; to the last bar when None
+        """
+        columns = self.columns(timeframe)
+        timestamps = columns[TIMESTAMP_COLUMN]
+        first = 0 if start is None else int(np.searchsorted(timestamps, pd.Timestamp(start).value, side="left"))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, pd.Timestamp(end).value,
+                                                                          side="left"))
+        return {column: values[first:max(first, last)] for column, values in columns.items()}
+
+    def dataframe(self, timeframe, start=None, end=None):
+        """ dataframe of the bars of a timeframe for a date range, in the format StockData accepts """
+        return columns_to_dataframe(self.columns_in_range(timeframe, start, end))
+
+    def sessions(self, timeframe, start=None, end=None):
+        """ list of dataframes of the bars of a timeframe, one per day, for a date range; for intraday timeframes
+            this is the same split as one .csv file per day """
+        columns = self.columns_in_range(timeframe, start, end)
+        days = columns[TIMESTAMP_COLUMN] // NANOSECONDS_PER_DAY
+        boundaries = np.append(np.flatnonzero(np.diff(days, prepend=days[:1] - 1)), len(days))
+        frame = columns_to_dataframe(columns)
+        return [frame.iloc[begin:finish].reset_index(drop=True)
+                for begin, finish in zip(boundaries[:-1], boundaries[1:])]
@@ -0,0 +1,254 @@
+""" Benchmarks of the indicators, the data clean up, the candlestick data and the backtest strategies
+    Each stage runs on the bundled data files (SPY, the SPX file from 2006 to 2020 and the IBM intraday days) and
+    on synthetic random walk series of 10k, 1M and 10M bars. The time of a stage is the best and the median of a
+    number of repeats; its peak memory is the largest amount allocated while it runs once more under tracemalloc.
+    The results are written as JSON, and can be compared with a stored baseline so that a kernel change which
+    makes a stage slower or larger shows up as a regression.
+
+    Usage: python Benchmark.py [--datasets SPY SPX IBM 10k 1M 10M] [--repeats n] [--output results.json]
+                               [--baseline baseline.json] [--save-baseline baseline.json] [--threshold 1.25]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from indicators import *
+from BackTest import BackTest
+from StockData import StockData, INDICATOR_PARAMETERS, read_stock_data
+
+BUNDLED_DATA_FILES = {"SPY": ["./daily/SPY.csv"],
+                      "SPX": ["./daily/SPX_Apr_2006_Sep11_2020.csv"],
+                      "IBM": ["./StockMarketData/Intraday/eachDay"]}
+SYNTHETIC_SIZES = {"10k": 10000, "1M": 1000000, "10M": 10000000}
+DEFAULT_DATASETS = ["SPY", "SPX", "IBM", "10k", "1M", "10M"]
+DEFAULT_REPEATS = 5
+DEFAULT_THRESHOLD = 1.25
+
+
+def synthetic_stock_data(number_of_bars, seed=0):
+    """ raw stock data of a random walk, in the format of a daily .csv file with a Date column, with one value
+        in a thousand missing so the clean up has errors to fix """
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.5, number_of_bars))
+    open_price = close + rng.normal(0, 0.2, number_of_bars)
+    high = np.maximum(open_price, close) + np.abs(rng.normal(0, 0.3, number_of_bars))
+    low = np.minimum(open_price, close) - np.abs(rng.normal(0, 0.3, number_of_bars))
+    volume = rng.integers(100, 100000, number_of_bars).astype(float)
+    columns = {"Date": pd.date_range("2000-01-03", periods=number_of_bars, freq="T"),
+               "Open": open_price, "High": high, "Low": low, "Close": close, "Volume": volume}
+    for name in ["Open", "High", "Low", "Close", "Volume"]:
+        columns[name][rng.random(number_of_bars) < 0.001] = np.nan
+    return pd.DataFrame(columns)
+
+
+def bundled_data_files(dataset):
+    """ list of .csv files of a bundled dataset """
+    files = []
+    for path in BUNDLED_DATA_FILES[dataset]:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, name) for name in os.listdir(path) if name[-4:] == ".csv"))
+        else:
+            files.append(path)
+    return files
+
+
+def measure(function, repeats):
+    """ run the function repeats times and once more under tracemalloc
+
+        :return: dictionary with the best and median seconds, the number of repeats and the peak bytes allocated,
+            and the result of the last run
+    """
+    times = []
+    result = None
+    for _ in range(repeats):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+
+    result = None
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = function()
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds_min": min(times), "seconds_median": statistics.median(times), "repeats": repeats,
+            "peak_bytes": peak_bytes}, result
+
+
+def indicator_stages():
+    """ list of (stage name, function of the cleaned up data) for each function in indicators.py """
+    n_stochastics = INDICATOR_PARAMETERS["stochastics"]
+    n_williams = INDICATOR_PARAMETERS["williams"]
+    n_momentum = INDICATOR_PARAMETERS["momentum"]
+    n_fast, n_slow = INDICATOR_PARAMETERS["macd_fast"], INDICATOR_PARAMETERS["macd_slow"]
+    return [
+        ("moving_average", lambda df: [moving_average(df, n) for n in INDICATOR_PARAMETERS["moving_averages"]]),
+        ("rolling_extrema", lambda df: rolling_extrema(df, n_stochastics)),
+        ("stochastic_oscillator_k", lambda df: stochastic_oscillator_k(df, n_stochastics)),
+        ("stochastic_oscillator_d", lambda df: stochastic_oscillator_d(df, n_stochastics,
+                                                                       INDICATOR_PARAMETERS["stochastics_smoothing"])),
+        ("macd", lambda df: macd(df, n_fast, n_slow)),
+        ("set_williams_scale", lambda df: df["Close"].pct_change().map(set_williams_scale)),
+        ("williams_R", lambda df: williams_R(df, n_williams)),
+        ("momentum", lambda df: momentum(df, n_momentum)),
+        ("rate_of_change", lambda df: rate_of_change(df, n_momentum)),
+        ("momentum_lookbacks", lambda df: momentum_lookbacks(df, [5, 10, 12, 20, 50])),
+        ("rolling_slopes", lambda df: rolling_slopes(df["Close"], [5, 8, 9, 21])),
+        ("rolling_slope", lambda df: rolling_slope(df["Close"], 9)),
+    ]
+
+
+def benchmark_dataset(dataset, repeats):
+    """ Run every stage on the files of one dataset. The stages run in the order of StockData, each on the
+        output of the one before, and only the data the following stages need is kept, so the 10M bar series
+        fits in memory.
+
+        :return: list of result dictionaries, one per stage, with the time summed over the files and the
+            largest peak memory of a file
+    """
+    if dataset in SYNTHETIC_SIZES:
+        filenames = [None]
+    else:
+        filenames = bundled_data_files(dataset)
+
+    totals = {}
+    number_of_bars = 0
+
+    def add(stage, measurement):
+        if stage not in totals:
+            totals[stage] = dict(measurement)
+        else:
+            for key in ["seconds_min", "seconds_median"]:
+                totals[stage][key] = totals[stage][key] + measurement[key]
+            totals[stage]["peak_bytes"] = max(totals[stage]["peak_bytes"], measurement["peak_bytes"])
+
+    for filename in filenames:
+        if filename is None:
+            raw = synthetic_stock_data(SYNTHETIC_SIZES[dataset])
+        else:
+            measurement, raw = measure(lambda: read_stock_data(filename), repeats)
+            add("read_csv", measurement)
+        number_of_bars = number_of_bars + len(raw)
+
+        measurement, stock_data = measure(lambda: StockData.cleanup_stock_data(raw), repeats)
+        add("cleanup_stock_data", measurement)
+        raw = None
+
+        for stage, function in indicator_stages():
+            measurement, _ = measure(lambda: function(stock_data), repeats)
+            add(stage, measurement)
+
+        measurement, candlestick_data = measure(lambda: StockData.calculate_candlestick_data(stock_data), repeats)
+        add("calculate_candlestick_data", measurement)
+        measurement, indicator_data = measure(lambda: StockData.calculate_indicator_data(stock_data), repeats)
+        add("calculate_indicator_data", measurement)
+        candlestick_data.extend(indicator_data)
+        indicator_data = stock_data = None
+
+        measurement, back_test = measure(lambda: BackTest(candlestick_data), repeats)
+        add("BackTest", measurement)
+        for strategy in [1, 2]:
+            backtest_strategy = getattr(back_test, "backtest_strategy_" + str(strategy))
+            measurement, _ = measure(lambda: backtest_strategy(verbose=False), repeats)
+            add("backtest_strategy_" + str(strategy), measurement)
+
+        candlestick_data = back_test = None
+        gc.collect()
+
+    return [dict({"dataset": dataset, "bars": number_of_bars, "stage": stage}, **measurement)
+            for stage, measurement in totals.items()]
+
+
+def environment():
+    """ versions and machine the benchmarks ran on """
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "platform": platform.platform(), "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """ Compare each stage with the same dataset and stage of a baseline
+
+        :param results: list of result dictionaries
+        :param baseline: list of result dictionaries of an earlier run
+        :param threshold: float ratio of time or peak memory to the baseline above which a stage has regressed
+        :return: list of comparison dictionaries with the time and memory ratios and whether the stage regressed
+    """
+    baseline_for = {(result["dataset"], result["stage"]): result for result in baseline}
+    comparisons = []
+    for result in results:
+        earlier = baseline_for.get((result["dataset"], result["stage"]))
+        if earlier is None:
+            continue
+        time_ratio = result["seconds_min"] / earlier["seconds_min"] if earlier["seconds_min"] > 0 else float("inf")
+        memory_ratio = result["peak_bytes"] / earlier["peak_bytes"] if earlier["peak_bytes"] > 0 else 1.0
+        comparisons.append({"dataset": result["dataset"], "stage": result["stage"], "time_ratio": time_ratio,
+                            "memory_ratio": memory_ratio,
+                            "regression": time_ratio > threshold or memory_ratio > threshold})
+    return comparisons
+
+
+def print_results(results, comparisons=None):
+    ratios = {(c["dataset"], c["stage"]): c for c in comparisons or []}
+    print("%-8s %-28s %10s %12s %12s %12s" % ("dataset", "stage", "bars", "best s", "median s", "peak MiB") +
+          ("  %8s %8s" % ("time x", "memory x") if comparisons else ""))
+    for result in results:
+        line = "%-8s %-28s %10d %12.6f %12.6f %12.2f" % (result["dataset"], result["stage"], result["bars"],
+                                                         result["seconds_min"], result["seconds_median"],
+                                                         result["peak_bytes"] / 2 ** 20)
+        comparison = ratios.get((result["dataset"], result["stage"]))
+        if comparison is not None:
+            line = line + "  %8.2f %8.2f" % (comparison["time_ratio"], comparison["memory_ratio"]) + \
+                   ("  REGRESSION" if comparison["regression"] else "")
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the indicators, clean up and backtests")
+    parser.add_argument("--datasets", nargs="+", default=DEFAULT_DATASETS,
+                        choices=list(BUNDLED_DATA_FILES) + list(SYNTHETIC_SIZES))
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--save-baseline", help="write the results as JSON to this file to compare with later")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="ratio to the baseline time or peak memory reported as a regression")
+    args = parser.parse_args()
+
+    results = []
+    for dataset in args.datasets:
+        results.extend(benchmark_dataset(dataset, args.repeats))
+
+    comparisons = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparisons = compare_with_baseline(results, json.load(f)["results"], args.threshold)
+
+    print_results(results, comparisons)
+    report = {"environment": environment(), "repeats": args.repeats, "results": results}
+    if comparisons is not None:
+        report["comparisons"] = comparisons
+    for filename in [args.output, args.save_baseline]:
+        if filename:
+            with open(filename, "w") as f:
+                json.dump(report, f, indent=1)
+
+    if comparisons and any(comparison["regression"] for comparison in comparisons):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
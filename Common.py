@@ -1,3 +1,10 @@
+import os
+
+LOCATION_OF_DATA_FILES = "./StockMarketData/"  # initially data files are read from local storage
+# directories searched for each data interval, in order; the first one which exists holds the data files
+DATA_DIRECTORIES = {"daily": [LOCATION_OF_DATA_FILES + "daily/OneYear", "./daily"],
+                    "minute": [LOCATION_OF_DATA_FILES + "Intraday/eachDay"]}
+
 
 class CommonDefs:
     INDEX_OF_OHLC_DATA = 0
@@ -7,4 +14,51 @@ class CommonDefs:
     INDEX_OF_WILLIAMS_DATA = 4
     INDEX_OF_MOMENTUM_DATA = 5
     INDEX_OF_DATE_INDEX = 6
-    INDEX_OF_MACD_DATA = 7
\ No newline at end of file
+    INDEX_OF_MACD_DATA = 7
+
+
+def data_directory(data_interval):
+    """ directory of the data files of a data interval: the first of its DATA_DIRECTORIES which exists, or the
+        first one if none does; LOCATION_OF_DATA_FILES for other intervals """
+    directories = DATA_DIRECTORIES.get(data_interval, [LOCATION_OF_DATA_FILES])
+    for directory in directories:
+        if os.path.isdir(directory):
+            return directory
+    return directories[0]
+
+
+def get_stock_data_files(data_interval, location=None, verbose=True):
+    """ Get all stock data files (.csv format) in the directory of interest
+        - data in csv format
+        - initially only IBM
+
+        Parameters:
+        -----------
+        LOCATION_OF_DATA_FILES: string of current base directory
+        data_interval: string: daily or Intraday (minute)
+        location: string directory to search instead of the one for the data interval
+        verbose: boolean print each file found
+        path_to_data_files:
+
+        Returns:
+        --------
+        list of files in directory of interest with .csv extension
+    """
+    # choice of daily or minute data
+    path_to_data_files = data_directory(data_interval)
+
+    # find all csv filenames
+    location = path_to_data_files if location is None else location
+    files_in_dir = []
+
+    # r=>root, d=>directories, f=>files
+    for r, d, f in os.walk(location):
+        for item in f:
+            if '.csv' in item[-4:]:
+                files_in_dir.append(os.path.join(r, item))
+
+    if verbose:
+        for item in files_in_dir:
+            print("file in dir: ", item)
+
+    return files_in_dir
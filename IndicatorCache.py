@@ -0,0 +1,119 @@
+""" On-disk cache of the cleaned up data and calculated indicators for each .csv data file
+    An entry is keyed by a hash of the content of the source file, the indicator parameters, the source code of
+    the modules which calculate and hold them and the versions of pandas and numpy, which the entries are pickles
+    of, so a changed file, parameter, calculation or library is never served from the cache. An entry which cannot
+    be read back counts as a miss.
+    Entries are pickled with the highest protocol, and the least recently used entries are removed once the cache
+    grows beyond its size limit.
+"""
+import hashlib
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# modules whose source code is part of every cache key
+CODE_MODULES = ["indicators.py", "StockData.py", "StockArrays.py", "Common.py"]
+CACHE_FILE_EXTENSION = ".pkl"
+
+
+def code_version():
+    """ hash of the source code of the modules which clean up the data and calculate the indicators, and of the
+        versions of the libraries their results are made of """
+    code_hash = hashlib.sha256()
+    for module in CODE_MODULES:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), module), "rb") as f:
+            code_hash.update(f.read())
+    code_hash.update(("pandas " + pd.__version__ + " numpy " + np.__version__).encode())
+    return code_hash.hexdigest()
+
+
+class IndicatorCache:
+    def __init__(self, cache_directory, max_size_bytes=1024 * 1024 * 1024):
+        """ Cache of the StockData results for each .csv data file
+
+            :param cache_directory: string directory for the cache entries; created if it does not exist
+            :param max_size_bytes: int the least recently used entries are removed when the entries in the
+                cache directory are larger than this in total
+            :param self.hits: int number of entries found in the cache
+            :param self.misses: int number of entries not found in the cache
+        """
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        self.code_version = code_version()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_directory, exist_ok=True)
+        self.evict()
+
+    def key(self, source_file, parameters):
+        """ cache key for a .csv data file
+
+            :param source_file: string path of the .csv file
+            :param parameters: dictionary of the indicator parameters, with repr-able values
+        """
+        key_hash = hashlib.sha256()
+        with open(source_file, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                key_hash.update(block)
+        key_hash.update(repr(sorted(parameters.items())).encode())
+        key_hash.update(self.code_version.encode())
+        return key_hash.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.cache_directory, key + CACHE_FILE_EXTENSION)
+
+    def load(self, key):
+        """ return the cached entry for the key, or None if there is none """
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, ValueError, TypeError,
+                IndexError):
+            # missing, truncated, or pickled by code or libraries which are gone
+            self.misses = self.misses + 1
+            return None
+
+        # mark the entry as recently used
+        os.utime(path)
+        self.hits = self.hits + 1
+        return entry
+
+    def store(self, key, entry):
+        """ write the entry for the key, then remove the least recently used entries if the cache is too large """
+        path = self.path(key)
+        temporary_path = path + ".tmp" + str(os.getpid())
+        with open(temporary_path, "wb") as f:
+            pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def evict(self):
+        """ remove the least recently used entries until the cache is within its size limit """
+        entries = []
+        for name in os.listdir(self.cache_directory):
+            if name.endswith(CACHE_FILE_EXTENSION):
+                try:
+                    stat = os.stat(os.path.join(self.cache_directory, name))
+                except OSError:
+                    # removed by another process sharing the cache since it was listed
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total_size <= self.max_size_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_directory, name))
+            except OSError:
+                pass
+            total_size = total_size - size
+
+    def clear(self):
+        """ remove all entries """
+        for name in os.listdir(self.cache_directory):
+            if name.endswith(CACHE_FILE_EXTENSION):
+                os.remove(os.path.join(self.cache_directory, name))
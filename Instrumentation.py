@@ -0,0 +1,202 @@
+""" Timing and memory instrumentation of the StockData pipeline and the BackTest strategies
+    StockData and BackTest mark each stage (clean up, candlesticks, each indicator, each strategy) with stage(name)
+    or the staged(name) decorator, and each input file with data_file(label). Nothing is recorded unless an
+    Instrumentation is active; when none is, stage() returns one shared context manager which does nothing, so the
+    marks cost a function call each. While one is active, each stage records its wall time, CPU time and peak
+    allocation (traced with tracemalloc) for the current file, and the records can be written as JSON, CSV or a
+    Chrome trace (chrome://tracing or https://ui.perfetto.dev) to see the stages nested as in a flame graph.
+
+    Usage:
+        with Instrumentation() as instrumentation:
+            StockData(stock_data_files)
+        instrumentation.write_chrome_trace("trace.json")
+"""
+import contextlib
+import csv
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+RECORD_FIELDS = ["file", "stage", "depth", "start_ns", "wall_seconds", "cpu_seconds", "peak_bytes", "pid", "tid"]
+
+# the active Instrumentation of this process; None when instrumentation is off
+_active = None
+_no_stage = contextlib.nullcontext()
+
+
+def stage(name):
+    """ context manager which records one stage in the active Instrumentation, or does nothing when it is off """
+    if _active is None:
+        return _no_stage
+    return _active.stage(name)
+
+
+def data_file(label):
+    """ context manager which makes the stages inside it belong to one input file """
+    if _active is None:
+        return _no_stage
+    return _active.data_file(label)
+
+
+def staged(name):
+    """ decorator which records each call of the function as a stage """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return function(*args, **kwargs)
+            with _active.stage(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def add_records(records):
+    """ add the records of stages which ran in another process to the active Instrumentation """
+    if _active is not None:
+        _active.add_records(records)
+
+
+def worker_settings():
+    """ settings for a worker process to record its stages with, so they can be added back with add_records; None
+        when instrumentation is off """
+    if _active is None:
+        return None
+    return {"trace_memory": _active.trace_memory}
+
+
+class Instrumentation:
+    def __init__(self, trace_memory=True):
+        """ Recorder of the stages which run while it is active
+
+            :param trace_memory: boolean record the peak allocation of each stage with tracemalloc; tracing slows
+                the stages down, so turn it off to see their times alone
+            :param self.records: list of dictionaries with the RECORD_FIELDS of each stage, in the order the stages
+                finished
+            :param self.current_file: string label of the file the stages belong to
+            :param self.open_stages: list of [name, start_ns, cpu start, traced memory at start, peak seen] of the
+                stages which have started and not finished, outermost first
+        """
+        self.trace_memory = trace_memory
+        self.records = []
+        self.current_file = ""
+        self.open_stages = []
+        self.previous = None
+        self.started_tracemalloc = False
+
+    def start(self):
+        """ make this the active Instrumentation of the process """
+        global _active
+        self.previous = _active
+        _active = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracemalloc = True
+        return self
+
+    def stop(self):
+        """ stop recording and make the Instrumentation active before start() active again """
+        global _active
+        _active = self.previous
+        self.previous = None
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @contextlib.contextmanager
+    def data_file(self, label):
+        previous_file = self.current_file
+        self.current_file = label
+        try:
+            yield
+        finally:
+            self.current_file = previous_file
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if self.trace_memory:
+            traced_memory, peak = tracemalloc.get_traced_memory()
+            if self.open_stages:
+                # the peak is reset below, so keep the peak the enclosing stage has seen until now
+                self.open_stages[-1][4] = max(self.open_stages[-1][4], peak)
+            tracemalloc.reset_peak()
+        else:
+            traced_memory = 0
+        open_stage = [name, time.perf_counter_ns(), time.process_time(), traced_memory, 0]
+        self.open_stages.append(open_stage)
+        try:
+            yield
+        finally:
+            wall_ns = time.perf_counter_ns() - open_stage[1]
+            cpu_seconds = time.process_time() - open_stage[2]
+            self.open_stages.pop()
+            peak_bytes = 0
+            if self.trace_memory:
+                peak = max(open_stage[4], tracemalloc.get_traced_memory()[1])
+                peak_bytes = peak - open_stage[3]
+                if self.open_stages:
+                    self.open_stages[-1][4] = max(self.open_stages[-1][4], peak)
+            self.records.append({"file": self.current_file, "stage": name, "depth": len(self.open_stages),
+                                 "start_ns": open_stage[1], "wall_seconds": wall_ns / 1e9,
+                                 "cpu_seconds": cpu_seconds, "peak_bytes": peak_bytes, "pid": os.getpid(),
+                                 "tid": threading.get_ident()})
+
+    def add_records(self, records):
+        """ add the records of stages which ran in another process, e.g. a worker process of StockData """
+        self.records.extend(records)
+
+    def summary(self):
+        """ total wall time, CPU time and the largest peak allocation of each stage over all files, as a list of
+            dictionaries in the order each stage first finished """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault(record["stage"], {"stage": record["stage"], "calls": 0, "wall_seconds": 0.0,
+                                                        "cpu_seconds": 0.0, "peak_bytes": 0})
+            total["calls"] = total["calls"] + 1
+            total["wall_seconds"] = total["wall_seconds"] + record["wall_seconds"]
+            total["cpu_seconds"] = total["cpu_seconds"] + record["cpu_seconds"]
+            total["peak_bytes"] = max(total["peak_bytes"], record["peak_bytes"])
+        return list(totals.values())
+
+    def print_summary(self):
+        print("%-36s %6s %12s %12s %12s" % ("stage", "calls", "wall s", "cpu s", "peak MiB"))
+        for total in self.summary():
+            print("%-36s %6d %12.6f %12.6f %12.2f" % (total["stage"], total["calls"], total["wall_seconds"],
+                                                     total["cpu_seconds"], total["peak_bytes"] / 2 ** 20))
+
+    def write_json(self, filename):
+        """ write the records and the summary of each stage as JSON """
+        with open(filename, "w") as f:
+            json.dump({"records": self.records, "summary": self.summary()}, f, indent=1)
+
+    def write_csv(self, filename):
+        """ write the records as CSV, one row per stage per file """
+        with open(filename, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=RECORD_FIELDS)
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def write_chrome_trace(self, filename):
+        """ write the records in the Chrome trace event format, as complete events with the file and the CPU time
+            and peak allocation as arguments; times are in microseconds from the first stage """
+        first_start_ns = min((record["start_ns"] for record in self.records), default=0)
+        events = []
+        for record in self.records:
+            events.append({"name": record["stage"], "cat": record["file"] or "stage", "ph": "X",
+                           "ts": (record["start_ns"] - first_start_ns) / 1000.0,
+                           "dur": record["wall_seconds"] * 1e6, "pid": record["pid"], "tid": record["tid"],
+                           "args": {"file": record["file"], "cpu_seconds": record["cpu_seconds"],
+                                    "peak_bytes": record["peak_bytes"]}})
+        # parents before children when they start at the same time, so the viewers nest them
+        events.sort(key=lambda event: (event["ts"], -event["dur"]))
+        with open(filename, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
@@ -0,0 +1,157 @@
+""" Columnar, memory-mapped store of market data per stock ticker symbol
+    The .csv files (daily files with a Date header, or intraday files without a header and with separate date and
+    time columns) are converted once into one directory per symbol, holding a .npy file per column: timestamp
+    (int64 nanoseconds), Open, High, Low, Close and Volume (float64), sorted by timestamp, plus a day index with
+    the first row of each day. Loading opens the columns memory-mapped, so a date range is a slice of the mapped
+    arrays and nothing outside it is read from disk.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from StockData import StockData
+
+TIMESTAMP_COLUMN = "timestamp"
+DATA_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+DAY_INDEX_COLUMNS = ["day", "day_start"]
+NANOSECONDS_PER_DAY = 24 * 60 * 60 * 1000000000
+
+
+def symbol_from_filename(filename):
+    """ stock ticker symbol from a data file name such as IBM_adjust_09.04.20.csv or SPY.csv """
+    name = os.path.basename(filename)
+    return name.split("_")[0].split(".")[0].upper()
+
+
+def read_csv_file(filename):
+    """ read and clean up one .csv data file in either format and return it with a datetime Date column """
+    with open(filename) as f:
+        has_header = "Date" in f.readline()
+
+    df_element = pd.read_csv(filename, header=0 if has_header else None)
+    df_element = StockData.cleanup_stock_data(df_element)
+    df_element["Date"] = pd.to_datetime(df_element["Date"])
+    return df_element
+
+
+class MarketDataStore:
+    def __init__(self, store_directory):
+        """ Columnar store of market data
+
+            :param store_directory: string directory of the store; created if it does not exist
+            :param self.mapped_columns: dictionary of symbol to its memory-mapped columns, opened on first use
+        """
+        self.store_directory = store_directory
+        self.mapped_columns = {}
+        os.makedirs(store_directory, exist_ok=True)
+
+    def symbols(self):
+        """ list of stock ticker symbols in the store """
+        return sorted(name for name in os.listdir(self.store_directory)
+                      if os.path.exists(os.path.join(self.store_directory, name, TIMESTAMP_COLUMN + ".npy")))
+
+    def convert_csv_files(self, csv_files, symbol=None):
+        """ Add .csv data files to the store. Rows are merged with the data already stored for the symbol; a row
+            with the same timestamp as a stored one replaces it.
+
+            :param csv_files: list of .csv file paths
+            :param symbol: string stock ticker symbol for all of the files; taken from each file name when None
+            :return: dictionary of symbol to the number of rows stored for it
+        """
+        frames_for_symbol = {}
+        for filename in csv_files:
+            frames_for_symbol.setdefault(symbol or symbol_from_filename(filename), []).append(read_csv_file(filename))
+
+        rows_for_symbol = {}
+        for stock_symbol, frames in frames_for_symbol.items():
+            columns = {TIMESTAMP_COLUMN: np.concatenate([frame["Date"].to_numpy("datetime64[ns]").astype(np.int64)
+                                                         for frame in frames])}
+            for column in DATA_COLUMNS:
+                columns[column] = np.concatenate([frame[column].to_numpy(dtype=float) for frame in frames])
+
+            if stock_symbol in self.symbols():
+                stored = self.load(stock_symbol)
+                for column in columns:
+                    columns[column] = np.concatenate([np.asarray(stored[column]), columns[column]])
+
+            # sort by timestamp; for repeated timestamps keep the row added last
+            order = np.argsort(columns[TIMESTAMP_COLUMN], kind="stable")[::-1]
+            timestamps = columns[TIMESTAMP_COLUMN][order]
+            _, last_rows = np.unique(timestamps, return_index=True)
+            rows = order[last_rows]
+            self.write_symbol(stock_symbol, {column: values[rows] for column, values in columns.items()})
+            rows_for_symbol[stock_symbol] = len(rows)
+
+        return rows_for_symbol
+
+    def write_symbol(self, symbol, columns):
+        """ write the sorted columns and the day index of one symbol """
+        self.mapped_columns.pop(symbol, None)
+        symbol_directory = os.path.join(self.store_directory, symbol)
+        os.makedirs(symbol_directory, exist_ok=True)
+
+        days = columns[TIMESTAMP_COLUMN] // NANOSECONDS_PER_DAY
+        day_start = np.flatnonzero(np.diff(days, prepend=days[:1] - 1))
+        columns = dict(columns)
+        columns["day"] = days[day_start]
+        columns["day_start"] = day_start
+
+        # write each column next to its final name first, so a reader never maps a partly written column
+        for column, values in columns.items():
+            path = os.path.join(symbol_directory, column + ".npy")
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(values))
+            os.replace(path + ".tmp", path)
+
+    def load(self, symbol, start=None, end=None):
+        """ Columns of one symbol for a date range, as slices of the memory-mapped arrays; no data is copied
+
+            :param symbol: string stock ticker symbol
+            :param start: first date/time to include, anything pd.Timestamp accepts; from the first row when None
+            :param end: date/time to stop before, anything pd.Timestamp accepts; to the last row when None
+            :return: dictionary with the timestamp column (int64 nanoseconds) and the OHLCV columns
+        """
+        columns = self.mapped_symbol(symbol)
+        first, last = self.row_range(symbol, start, end)
+        return {column: columns[column][first:last] for column in [TIMESTAMP_COLUMN] + DATA_COLUMNS}
+
+    def load_dataframe(self, symbol, start=None, end=None):
+        """ dataframe with Date, Open, High, Low, Close and Volume columns for a date range, in the format
+            StockData accepts """
+        columns = self.load(symbol, start, end)
+        data = {"Date": pd.to_datetime(np.asarray(columns[TIMESTAMP_COLUMN]))}
+        for column in DATA_COLUMNS:
+            data[column] = np.asarray(columns[column])
+        return pd.DataFrame(data)
+
+    def load_sessions(self, symbol, start=None, end=None):
+        """ list of dataframes, one per day, for a date range; for intraday data this is the same split as one
+            .csv file per day """
+        columns = self.mapped_symbol(symbol)
+        first, last = self.row_range(symbol, start, end)
+        day_start = np.asarray(columns["day_start"])
+        boundaries = np.concatenate(([first], day_start[(day_start > first) & (day_start < last)], [last]))
+
+        frame = self.load_dataframe(symbol, start, end)
+        return [frame.iloc[begin - first:finish - first].reset_index(drop=True)
+                for begin, finish in zip(boundaries[:-1], boundaries[1:]) if finish > begin]
+
+    def row_range(self, symbol, start, end):
+        """ first and last (exclusive) row of a date range, from a binary search of the sorted timestamps """
+        timestamps = self.mapped_symbol(symbol)[TIMESTAMP_COLUMN]
+        first = 0 if start is None else int(np.searchsorted(timestamps, pd.Timestamp(start).value, side="left"))
+        last = len(timestamps) if end is None else int(np.searchsorted(timestamps, pd.Timestamp(end).value,
+                                                                          side="left"))
+        return first, max(first, last)
+
+    def mapped_symbol(self, symbol):
+        """ memory-mapped columns of one symbol """
+        if symbol not in self.mapped_columns:
+            symbol_directory = os.path.join(self.store_directory, symbol)
+            if not os.path.exists(os.path.join(symbol_directory, TIMESTAMP_COLUMN + ".npy")):
+                raise KeyError("symbol " + symbol + " is not in the store " + self.store_directory)
+            self.mapped_columns[symbol] = {
+                column: np.load(os.path.join(symbol_directory, column + ".npy"), mmap_mode="r")
+                for column in [TIMESTAMP_COLUMN] + DATA_COLUMNS + DAY_INDEX_COLUMNS}
+        return self.mapped_columns[symbol]
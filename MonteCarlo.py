@@ -0,0 +1,182 @@
+""" Monte Carlo robustness analysis of the BackTest strategy trades
+    A backtest gives one sequence of trades, and so one final profit, one maximum drawdown and one longest losing
+    streak. Simulating other sequences shows how much of that was luck of the order and of the draw:
+        shuffle     the same trades in a random order: same final profit, other drawdowns and streaks
+        bootstrap   as many trades drawn with replacement from the trades
+        block       the profit of each bar with a position open, resampled in blocks of consecutive bars with
+                    replacement (moving block bootstrap), which keeps the dependence between neighbouring bars
+    The simulations run as batched NumPy operations on a 2-D array of one simulation per column, in chunks of
+    columns which fit in the given memory, so 100,000 simulations of thousands of trades take seconds and a bounded
+    amount of memory. Each simulation gives its final profit, maximum drawdown from the running peak of the equity
+    (which starts at 0) and longest run of losing trades or bars; losers are profits <= 0, as BackTest counts them.
+
+    Usage: python MonteCarlo.py [FILE_OR_DIRECTORY ...] [--strategy 1|2] [--method shuffle|bootstrap|block]
+                                [--simulations N] [--block-size N] [--seed N] [--memory MiB] [--output FILE]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from Analytics import bar_profits, strategy_trades
+
+SIMULATION_COLUMNS = ["final_profit", "max_drawdown", "longest_losing_streak"]
+METHODS = ["shuffle", "bootstrap", "block"]
+DEFAULT_MONTE_CARLO_DIRECTORY = "./StockMarketData/Intraday/eachDay"
+DEFAULT_MEMORY_LIMIT_BYTES = 256 * 2 ** 20
+# bytes used per element of a chunk: the profits and the resampling indices
+BYTES_PER_ELEMENT = 16
+
+
+def simulation_statistics(profits):
+    """ Final profit, maximum drawdown and longest losing streak of each simulation. The sequences are walked one
+        position at a time with a vector of all simulations, so the memory needed besides the profits is a few
+        vectors and each position is read once.
+
+        :param profits: 2-D float array with a row per position in the sequences and a column per simulation, so
+            each row is contiguous
+        :return: dictionary of the SIMULATION_COLUMNS to arrays with a value per simulation
+    """
+    number_of_simulations = profits.shape[1]
+    equity = np.zeros(number_of_simulations)
+    peak = np.zeros(number_of_simulations)
+    drawdown = np.empty(number_of_simulations)
+    max_drawdown = np.zeros(number_of_simulations)
+    losing_streak = np.zeros(number_of_simulations, dtype=np.int32)
+    longest_losing_streak = np.zeros(number_of_simulations, dtype=np.int32)
+    losses = np.empty(number_of_simulations, dtype=bool)
+    for position_profits in profits:
+        equity += position_profits
+        np.maximum(peak, equity, out=peak)
+        np.subtract(peak, equity, out=drawdown)
+        np.maximum(max_drawdown, drawdown, out=max_drawdown)
+        np.less_equal(position_profits, 0, out=losses)
+        losing_streak += 1
+        losing_streak *= losses
+        np.maximum(longest_losing_streak, losing_streak, out=longest_losing_streak)
+    return {"final_profit": equity, "max_drawdown": max_drawdown, "longest_losing_streak": longest_losing_streak}
+
+
+def resample(values, number_of_simulations, method, rng, block_size):
+    """ 2-D array of number_of_simulations resampled sequences of the values, one per column """
+    number_of_values = len(values)
+    index_type = np.int16 if number_of_values < 2 ** 15 else np.int64
+    if method == "shuffle":
+        # each permutation sorts random keys in a row of its own, so it works on contiguous memory: the keys are
+        # floats in [1, 2), which sort in the order of their bits, with the index of a value in their lowest bits,
+        # so the sorted keys hold the permutation
+        index_bits = max(number_of_values - 1, 1).bit_length()
+        keys = rng.random((number_of_simulations, number_of_values))
+        keys += 1.0
+        key_bits = keys.view(np.int64)
+        key_bits &= ~((1 << index_bits) - 1)
+        key_bits |= np.arange(number_of_values)
+        keys.sort(axis=1)
+        key_bits &= (1 << index_bits) - 1
+        indices = key_bits.T.astype(index_type, order="C")
+        del keys, key_bits
+        return values[indices]
+    if method == "bootstrap":
+        return values[rng.integers(0, number_of_values, (number_of_values, number_of_simulations), dtype=index_type)]
+    block_size = max(1, min(block_size, number_of_values))
+    number_of_blocks = -(-number_of_values // block_size)
+    block_starts = rng.integers(0, number_of_values - block_size + 1, (number_of_blocks, 1, number_of_simulations),
+                                dtype=index_type)
+    block_indices = block_starts + np.arange(block_size, dtype=index_type)[:, np.newaxis]
+    indices = block_indices.reshape(-1, number_of_simulations)
+    return values[indices[:number_of_values]]
+
+
+def simulate(values, number_of_simulations=10000, method="shuffle", block_size=20, seed=None,
+             memory_limit_bytes=DEFAULT_MEMORY_LIMIT_BYTES):
+    """ Monte Carlo simulation of sequences of trade or bar profits
+
+        :param values: array of the profit of each trade, for shuffle and bootstrap, or of each bar, for block
+        :param number_of_simulations: int number of sequences to simulate
+        :param method: string shuffle, bootstrap or block; see above
+        :param block_size: int number of consecutive bars in each block of the block bootstrap
+        :param seed: optional seed, so the same simulations can be drawn again
+        :param memory_limit_bytes: int the simulations run in chunks which need about this much memory
+        :return: dataframe with the SIMULATION_COLUMNS and one row per simulation
+    """
+    if method not in METHODS:
+        raise ValueError("method must be one of " + ", ".join(METHODS))
+    values = np.asarray(values, dtype=float)
+    rng = np.random.default_rng(seed)
+    chunk_size = max(1, memory_limit_bytes // (max(len(values), 1) * BYTES_PER_ELEMENT))
+
+    columns = {column: [] for column in SIMULATION_COLUMNS}
+    for chunk_start in range(0, number_of_simulations, chunk_size):
+        chunk = min(chunk_size, number_of_simulations - chunk_start)
+        if len(values):
+            statistics = simulation_statistics(resample(values, chunk, method, rng, block_size))
+        else:
+            statistics = simulation_statistics(np.zeros((0, chunk)))
+        for column in SIMULATION_COLUMNS:
+            columns[column].append(statistics[column])
+    return pd.DataFrame({column: np.concatenate(parts) for column, parts in columns.items()})
+
+
+def observed(values):
+    """ final profit, maximum drawdown and longest losing streak of the sequence as it happened """
+    statistics = simulation_statistics(np.asarray(values, dtype=float)[:, np.newaxis])
+    return {column: statistics[column][0] for column in SIMULATION_COLUMNS}
+
+
+def summarize(simulations, values=None, percentiles=(1, 5, 25, 50, 75, 95, 99)):
+    """ Distribution of each statistic over the simulations
+
+        :param simulations: dataframe from simulate()
+        :param values: optional profits the simulations were made from; their own statistics are added as the
+            observed row, with the share of simulations at or below each of them as the observed_percentile row
+        :return: dataframe with a row per statistic of the distribution and a column per SIMULATION_COLUMN
+    """
+    summary = simulations.quantile([percentile / 100 for percentile in percentiles])
+    summary.index = ["p" + str(percentile) for percentile in percentiles]
+    summary.loc["mean"] = simulations.mean()
+    summary.loc["std"] = simulations.std()
+    summary.loc["probability_of_loss"] = [(simulations["final_profit"] < 0).mean(), np.nan, np.nan]
+    if values is not None:
+        observed_statistics = observed(values)
+        summary.loc["observed"] = [observed_statistics[column] for column in SIMULATION_COLUMNS]
+        summary.loc["observed_percentile"] = [(simulations[column] <= observed_statistics[column]).mean() * 100
+                                              for column in SIMULATION_COLUMNS]
+    return summary
+
+
+def main(argv=None):
+    from BarReplay import find_csv_files
+    from StockData import StockData
+
+    parser = argparse.ArgumentParser(description="Monte Carlo robustness analysis of the BackTest strategy trades")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_MONTE_CARLO_DIRECTORY],
+                        help=".csv files or directories to backtest")
+    parser.add_argument("--strategy", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--method", choices=METHODS, default="shuffle")
+    parser.add_argument("--simulations", type=int, default=10000)
+    parser.add_argument("--block-size", type=int, default=20, help="bars per block of the block bootstrap")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--memory", type=int, default=DEFAULT_MEMORY_LIMIT_BYTES // 2 ** 20,
+                        help="MiB of memory for each chunk of simulations")
+    parser.add_argument("--output", help=".csv file to write each simulation to")
+    args = parser.parse_args(argv)
+
+    stock_data = StockData(find_csv_files(args.paths), run_strategies=False)
+    stock_arrays, trades = strategy_trades(stock_data, args.strategy)
+    profits_of_bars, in_position = bar_profits(stock_arrays.close, trades["entry"], trades["exit"])
+    values = profits_of_bars[in_position] if args.method == "block" else trades["profit"].to_numpy()
+    print("trades: " + str(len(trades)) + "  bars in a position: " + str(np.count_nonzero(in_position)))
+
+    started = time.perf_counter()
+    simulations = simulate(values, args.simulations, args.method, args.block_size, args.seed, args.memory * 2 ** 20)
+    elapsed = time.perf_counter() - started
+    with pd.option_context("display.width", 200):
+        print(summarize(simulations, values).to_string())
+    print(str(args.simulations) + " simulations in " + "%.2f" % elapsed + " s")
+    if args.output:
+        simulations.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
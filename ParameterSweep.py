@@ -0,0 +1,213 @@
+""" Parameter sweep for the BackTest strategy thresholds
+    The indicators for each data file are calculated once; each combination of thresholds is then backtested
+    over all data files in a pool of worker processes, and the profit, winners and losers are collected in a table
+"""
+import csv
+import hashlib
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from BackTest import BackTest
+
+# threshold parameters accepted by each strategy, with their default values
+STRATEGY_PARAMETERS = {
+    1: {"williams_entry_point": -75, "momentum_entry_point": 0.05, "stochastics_d_entry_point": 60,
+        "slope_macd_entry_point": 0.0025, "slope_macd_exit_point": 0.0011, "trailing_stop_init": 0.55},
+    2: {"williams_entry_point": -75, "momentum_entry_point": 0.05, "stochastics_d_entry_point": 60,
+        "slope_macd_entry_point": -0.005, "slope_macd_exit_point": 0.0015, "slope_momentum_entry_point": 0.0,
+        "trailing_stop_init": 0.45},
+}
+
+RESULT_COLUMNS = ["profit", "winners", "losers"]
+# column of the results file with the data_hash of the data each row was backtested on
+DATA_HASH_COLUMN = "data_hash"
+
+# per worker process: the StockArrays of the data to backtest and the BackTest objects built from them
+_worker_stock_arrays = []
+_worker_back_tests = []
+
+
+def parameter_grid(grid):
+    """ Every combination of the given parameter values
+
+        :param grid: dictionary of parameter name to list of values
+        :return: list of dictionaries of parameter name to value
+    """
+    names = list(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def random_parameter_sample(ranges, number_of_samples, seed=None):
+    """ Random combinations of parameter values
+
+        :param ranges: dictionary of parameter name to a (low, high) tuple, sampled uniformly, or to a list of
+            values to choose from
+        :param number_of_samples: int number of combinations
+        :param seed: optional seed, so the same sample can be drawn again to resume a sweep
+        :return: list of dictionaries of parameter name to value
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(number_of_samples):
+        sample = {}
+        for name, values in ranges.items():
+            if isinstance(values, tuple):
+                sample[name] = rng.uniform(values[0], values[1])
+            else:
+                sample[name] = rng.choice(values)
+        samples.append(sample)
+    return samples
+
+
+def data_hash(list_stock_arrays):
+    """ hash of the dates, column names and values of the data, which tells whether a results file was made from the
+        same data """
+    hash_of_data = hashlib.sha256()
+    for stock_arrays in list_stock_arrays:
+        hash_of_data.update(stock_arrays.dates.astype(str).tobytes())
+        hash_of_data.update(repr(stock_arrays.names).encode())
+        hash_of_data.update(stock_arrays.values.tobytes())
+    return hash_of_data.hexdigest()
+
+
+def _init_worker(list_stock_arrays):
+    global _worker_stock_arrays, _worker_back_tests
+    _worker_stock_arrays = list_stock_arrays
+    _worker_back_tests = []
+
+
+def _run_parameters(strategy, parameters):
+    """ backtest one combination of parameters over all data files of this worker """
+    global _worker_back_tests
+    if not _worker_back_tests:
+        _worker_back_tests = [BackTest(stock_arrays) for stock_arrays in _worker_stock_arrays]
+
+    totals = dict.fromkeys(RESULT_COLUMNS, 0)
+    for back_test in _worker_back_tests:
+        back_test.run_strategy(strategy, **parameters)
+        for column in RESULT_COLUMNS:
+            totals[column] = totals[column] + back_test.strategy_results[strategy][column]
+    return totals
+
+
+def print_progress(completed, total):
+    print("parameter sweep: " + str(completed) + " of " + str(total) + " combinations")
+
+
+class ParameterSweep:
+    def __init__(self, stock_data, strategy=1, max_workers=None, results_file=None, progress=print_progress,
+                 progress_interval=100):
+        """ Sweep the threshold parameters of a BackTest strategy over the data in a StockData object
+
+            :param stock_data: StockData with the indicators calculated, e.g. StockData(dfs, run_strategies=False)
+            :param strategy: int 1 or 2, the BackTest strategy to sweep
+            :param max_workers: int number of worker processes; all cores when None
+            :param results_file: optional .csv file; each finished combination is appended to it, and combinations
+                already in it are not run again, so an interrupted sweep can be resumed. Each row records the
+                data_hash of the data, and a results file made from different data is refused
+            :param progress: function called with (completed, total) combinations, or None
+            :param progress_interval: int number of finished combinations between progress calls
+        """
+        if strategy not in STRATEGY_PARAMETERS:
+            raise ValueError("unknown strategy " + str(strategy))
+        self.list_stock_arrays = stock_data.get_stock_arrays()
+        self.data_hash = data_hash(self.list_stock_arrays) if results_file else None
+        self.strategy = strategy
+        self.max_workers = max_workers or os.cpu_count()
+        self.results_file = results_file
+        self.progress = progress
+        self.progress_interval = progress_interval
+
+    def run(self, parameter_sets):
+        """ Backtest every parameter set and return a table of the results
+
+            :param parameter_sets: list of dictionaries of parameter name to value, e.g. from parameter_grid; any
+                parameter which is not given keeps the strategy default
+            :return: dataframe with one row per parameter set: every strategy parameter plus profit, winners and
+                losers
+        """
+        parameter_names = list(STRATEGY_PARAMETERS[self.strategy])
+        full_parameter_sets = []
+        for parameters in parameter_sets:
+            unknown = set(parameters) - set(parameter_names)
+            if unknown:
+                raise ValueError("unknown parameters for strategy " + str(self.strategy) + ": " +
+                                 ", ".join(sorted(unknown)))
+            full_parameters = dict(STRATEGY_PARAMETERS[self.strategy])
+            full_parameters.update(parameters)
+            full_parameter_sets.append(full_parameters)
+
+        results = self.load_results(parameter_names)
+        requested = set()
+        to_run = []
+        for parameters in full_parameter_sets:
+            key = tuple(float(parameters[name]) for name in parameter_names)
+            if key not in requested:
+                requested.add(key)
+                if key not in results:
+                    to_run.append(parameters)
+
+        total = len(requested)
+        completed = total - len(to_run)
+        if self.progress and completed:
+            self.progress(completed, total)
+
+        if to_run:
+            results_writer = None
+            results_csv = None
+            if self.results_file:
+                write_header = not os.path.exists(self.results_file) or os.path.getsize(self.results_file) == 0
+                results_csv = open(self.results_file, "a", newline="")
+                results_writer = csv.writer(results_csv)
+                if write_header:
+                    results_writer.writerow(parameter_names + RESULT_COLUMNS + [DATA_HASH_COLUMN])
+
+            try:
+                with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                         initargs=(self.list_stock_arrays,)) as executor:
+                    futures = {executor.submit(_run_parameters, self.strategy, parameters): parameters
+                               for parameters in to_run}
+                    for future in as_completed(futures):
+                        parameters = futures[future]
+                        totals = future.result()
+                        key = tuple(float(parameters[name]) for name in parameter_names)
+                        results[key] = totals
+                        if results_writer:
+                            results_writer.writerow([parameters[name] for name in parameter_names] +
+                                                    [totals[column] for column in RESULT_COLUMNS] + [self.data_hash])
+                            results_csv.flush()
+                        completed = completed + 1
+                        if self.progress and (completed % self.progress_interval == 0 or completed == total):
+                            self.progress(completed, total)
+            finally:
+                if results_csv:
+                    results_csv.close()
+
+        rows = []
+        for parameters in full_parameter_sets:
+            key = tuple(float(parameters[name]) for name in parameter_names)
+            rows.append(list(key) + [results[key][column] for column in RESULT_COLUMNS])
+        table = pd.DataFrame(rows, columns=parameter_names + RESULT_COLUMNS).drop_duplicates(parameter_names)
+        return table.reset_index(drop=True)
+
+    def load_results(self, parameter_names):
+        """ read the results of a previous, possibly interrupted, sweep from the results file
+
+            :return: dictionary of parameter values tuple to dictionary of profit, winners and losers
+        """
+        results = {}
+        if self.results_file and os.path.exists(self.results_file) and os.path.getsize(self.results_file) > 0:
+            previous = pd.read_csv(self.results_file, float_precision="round_trip")
+            if list(previous.columns) != parameter_names + RESULT_COLUMNS + [DATA_HASH_COLUMN]:
+                raise ValueError("results file " + self.results_file + " is for a different strategy")
+            if (previous[DATA_HASH_COLUMN] != self.data_hash).any():
+                raise ValueError("results file " + self.results_file + " is for different data")
+            for row in previous.itertuples(index=False):
+                row = list(row)
+                key = tuple(float(value) for value in row[:len(parameter_names)])
+                results[key] = dict(zip(RESULT_COLUMNS, row[len(parameter_names):-1]))
+        return results
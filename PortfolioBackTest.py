@@ -0,0 +1,317 @@
+""" Portfolio backtest of the BackTest strategies over many stock ticker symbols at once
+    The data of every symbol is aligned on one shared timestamp index, so each price and indicator is a 2-D array
+    of time by symbol. The indicators are calculated for all symbols in one pass of the same pandas rolling and
+    ewm operations indicators.py uses, applied to the whole 2-D frame, and the entry and exit signals are 2-D masks.
+    The stateful part of the strategies (open a short position, follow the trailing stop, close it) steps through
+    time once with the state of every symbol held in arrays, instead of once per symbol.
+
+    For symbols which trade on every timestamp of the index the results are those of BackTest on the data of the
+    symbol alone. A symbol without a bar at some timestamp has NaN there, which the rolling indicators count as a
+    missing value, as they would for a missing value in a single file.
+"""
+import numpy as np
+import pandas as pd
+
+from BackTest import BackTest
+from StockData import StockData, INDICATOR_PARAMETERS
+from ParameterSweep import STRATEGY_PARAMETERS
+
+CONVERT_TO_DOLLARS = 100
+RESULT_COLUMNS = ["profit", "winners", "losers", "trades"]
+
+
+def align_symbols(data_for_symbol, how="union"):
+    """ Align the data of each symbol on a shared timestamp index
+
+        :param data_for_symbol: dictionary of symbol to a dataframe with Date, Open, High, Low, Close and Volume
+            columns, cleaned up as StockData.cleanup_stock_data does
+        :param how: string "union" to keep every timestamp of any symbol, or "intersection" to keep only the
+            timestamps every symbol has
+        :return: tuple of the datetime64 timestamp index and a dictionary of column name to a 2-D float array of
+            time by symbol, NaN where a symbol has no bar
+    """
+    symbols = list(data_for_symbol)
+    timestamps = {}
+    for symbol, frame in data_for_symbol.items():
+        dates = frame["Date"]
+        if not pd.api.types.is_datetime64_any_dtype(dates):
+            dates = pd.to_datetime(dates)
+        timestamps[symbol] = dates.to_numpy("datetime64[ns]")
+    if how == "union":
+        index = np.unique(np.concatenate(list(timestamps.values())))
+    elif how == "intersection":
+        index = np.unique(timestamps[symbols[0]])
+        for symbol in symbols[1:]:
+            index = np.intersect1d(index, timestamps[symbol])
+    else:
+        raise ValueError("unknown alignment " + str(how))
+
+    columns = {name: np.full((len(index), len(symbols)), np.nan) for name in ["Open", "High", "Low", "Close",
+                                                                             "Volume"]}
+    for column, symbol in enumerate(symbols):
+        rows = np.searchsorted(index, timestamps[symbol])
+        found = (rows < len(index)) & (index[np.minimum(rows, len(index) - 1)] == timestamps[symbol])
+        for name, values in columns.items():
+            # for a repeated timestamp the last row of the symbol is kept
+            values[rows[found], column] = data_for_symbol[symbol][name].to_numpy(dtype=float)[found]
+    return index, columns
+
+
+def rolling_slopes_2d(values, n):
+    """ least-squares slope of each column over the n rows ending on each row, as rolling_slopes does for one
+        series: a weighted sum of the n rows, NaN when a row in the window is NaN or the window starts before the
+        first row, 0 when n is 1 or less """
+    if n <= 1:
+        return np.zeros_like(values)
+    slopes = np.full_like(values, np.nan)
+    if len(values) < n:
+        return slopes
+    weights = (np.arange(n) - (n - 1) / 2.0) / (n * (n * n - 1) / 12.0)
+    window_sum = np.zeros_like(values[n - 1:])
+    for k in range(n):
+        window_sum = window_sum + weights[k] * values[k:len(values) - n + 1 + k]
+    slopes[n - 1:] = window_sum
+    return slopes
+
+
+def shift_rows(values, rows=1):
+    """ values shifted down by rows, with NaN in the first rows """
+    shifted = np.full_like(values, np.nan)
+    shifted[rows:] = values[:-rows]
+    return shifted
+
+
+class PortfolioBackTest:
+    def __init__(self, data_for_symbol, how="union", parameters=INDICATOR_PARAMETERS):
+        """ Portfolio of symbols to backtest together
+
+            :param data_for_symbol: dictionary of symbol to its cleaned up dataframe, see align_symbols
+            :param how: string alignment of the timestamps, "union" or "intersection"
+            :param parameters: dictionary of indicator lookbacks, as StockData.INDICATOR_PARAMETERS
+            :param self.index: datetime64 array of the shared timestamps
+            :param self.prices: dictionary of OHLCV column name to 2-D array of time by symbol
+            :param self.indicators: dictionary of indicator name, as in the batch outputs (MA_n, %K, %D, %R,
+                momentum, MACD_f_s, MACDsign_f_s), to 2-D array of time by symbol
+            :param self.trades: dataframe of the trades of the last backtest
+        """
+        self.symbols = list(data_for_symbol)
+        self.parameters = parameters
+        self.index, self.prices = align_symbols(data_for_symbol, how)
+        self.indicators = {}
+        self.slopes = {}
+        self.trades = None
+        self.calculate_indicators()
+
+    @classmethod
+    def from_files(cls, files, start=None, end=None, **kwargs):
+        """ portfolio of the symbols in .csv files over a date range, with the symbol taken from each file name;
+            the files of one symbol are joined """
+        from MarketDataStore import read_csv_file, symbol_from_filename
+        frames_for_symbol = {}
+        for filename in files:
+            frames_for_symbol.setdefault(symbol_from_filename(filename), []).append(read_csv_file(filename))
+
+        data_for_symbol = {}
+        for symbol, frames in frames_for_symbol.items():
+            frame = pd.concat(frames, ignore_index=True).sort_values("Date", kind="stable")
+            if start is not None:
+                frame = frame[frame["Date"] >= pd.Timestamp(start)]
+            if end is not None:
+                frame = frame[frame["Date"] < pd.Timestamp(end)]
+            if len(frame):
+                data_for_symbol[symbol] = frame.reset_index(drop=True)
+        return cls(data_for_symbol, **kwargs)
+
+    @classmethod
+    def from_store(cls, store, symbols=None, start=None, end=None, **kwargs):
+        """ portfolio of symbols in a MarketDataStore over a date range; all symbols of the store when None """
+        symbols = symbols or store.symbols()
+        return cls({symbol: store.load_dataframe(symbol, start, end) for symbol in symbols}, **kwargs)
+
+    def calculate_indicators(self):
+        """ calculate every indicator StockData calculates, for all symbols at once """
+        parameters = self.parameters
+        close = pd.DataFrame(self.prices["Close"])
+        indicators = {}
+
+        for n in parameters["moving_averages"]:
+            indicators["MA_" + str(n)] = close.rolling(n, min_periods=n).mean().to_numpy()
+
+        # stochastics: the lookback ends on the current bar and the final bar is left without a value
+        n = parameters["stochastics"]
+        highest_high = close.rolling(n, min_periods=n).max().to_numpy()
+        lowest_low = close.rolling(n, min_periods=n).min().to_numpy()
+        highest_high[-1:] = np.nan
+        lowest_low[-1:] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            stochastics_k = (close.to_numpy() - lowest_low) / (highest_high - lowest_low) * 100
+        indicators["%K"] = stochastics_k
+        indicators["%D"] = pd.DataFrame(stochastics_k).rolling(n, min_periods=n).mean().to_numpy()
+
+        # williams %R: the lookback ends on the bar before the current one
+        n = parameters["williams"]
+        highest_high = shift_rows(close.rolling(n, min_periods=n).max().to_numpy())
+        lowest_low = shift_rows(close.rolling(n, min_periods=n).min().to_numpy())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            R = (highest_high - close.to_numpy()) / (highest_high - lowest_low)
+        indicators["%R"] = np.where((R == 0.0) | (R == -1.0), R, np.clip(R * (-100), -100, 0))
+
+        # momentum: bars up to and including n have no lookback value and stay 0
+        n = parameters["momentum"]
+        close_values = close.to_numpy()
+        momentum = np.zeros_like(close_values)
+        if len(close_values) > n + 1:
+            momentum[n + 1:] = close_values[n + 1:] - close_values[1:len(close_values) - n]
+        indicators["momentum"] = momentum
+
+        n_fast, n_slow = parameters["macd_fast"], parameters["macd_slow"]
+        suffix = "_" + str(n_fast) + "_" + str(n_slow)
+        ema_fast = close.ewm(span=n_fast, min_periods=n_slow).mean()
+        ema_slow = close.ewm(span=n_slow, min_periods=n_slow).mean()
+        macd = ema_fast - ema_slow
+        indicators["MACD" + suffix] = macd.to_numpy()
+        indicators["MACDsign" + suffix] = macd.ewm(span=9, min_periods=9).mean().to_numpy()
+        indicators["MACDdiff" + suffix] = indicators["MACD" + suffix] - indicators["MACDsign" + suffix]
+
+        self.indicators = indicators
+        self.slopes = {}
+
+    def get_slope_of_line(self, name, window):
+        """ slope of an indicator over the window of bars which ends on the bar before each one, as
+            BackTest.get_slope_of_line, for all symbols """
+        if (name, window) not in self.slopes:
+            self.slopes[(name, window)] = shift_rows(rolling_slopes_2d(self.indicators[name], window))
+        return self.slopes[(name, window)]
+
+    def backtest_strategy(self, strategy=1, **parameters):
+        """ Backtest strategy 1 or 2 of BackTest on every symbol
+
+            :param strategy: int 1 or 2
+            :param parameters: thresholds of the strategy, as in ParameterSweep.STRATEGY_PARAMETERS; defaults for
+                the ones not given
+            :return: dataframe with the profit, winners, losers and trades of each symbol, and a TOTAL row
+        """
+        if strategy not in STRATEGY_PARAMETERS:
+            raise ValueError("unknown strategy " + str(strategy))
+        thresholds = dict(STRATEGY_PARAMETERS[strategy])
+        thresholds.update(parameters)
+        close = self.prices["Close"]
+        macd, macd_signal = self.indicators["MACD_12_26"], self.indicators["MACDsign_12_26"]
+
+        with np.errstate(invalid="ignore"):
+            entry_signals = (self.indicators["%R"] <= thresholds["williams_entry_point"]) & \
+                            (self.indicators["momentum"] <= thresholds["momentum_entry_point"]) & \
+                            (self.indicators["%D"] <= thresholds["stochastics_d_entry_point"]) & \
+                            (macd < macd_signal)
+            first_data_point = BackTest.FIRST_DATA_POINT[strategy]
+            if strategy == 1:
+                slopes_macd = self.get_slope_of_line("MACD_12_26", 5)
+                entry_signals = entry_signals & (slopes_macd < thresholds["slope_macd_entry_point"])
+                exit_signals = slopes_macd > thresholds["slope_macd_exit_point"]
+            else:
+                ma_data_21d, ma_data_55d = self.indicators["MA_21"], self.indicators["MA_55"]
+                entry_signals = entry_signals & ~np.isnan(ma_data_55d) & \
+                    (self.get_slope_of_line("MACD_12_26", 9) < thresholds["slope_macd_entry_point"]) & \
+                    (self.get_slope_of_line("MACDsign_12_26", 8) < thresholds["slope_momentum_entry_point"])
+                ma_available = ~np.isnan(ma_data_21d) & ~np.isnan(ma_data_55d)
+                exit_signals = ma_available & ((ma_data_21d >= ma_data_55d) | (close > ma_data_21d) |
+                                               (self.get_slope_of_line("MACDsign_12_26", 9) >
+                                                thresholds["slope_macd_exit_point"]))
+
+        self.trades = self.run_short_positions(first_data_point, entry_signals, exit_signals,
+                                               thresholds["trailing_stop_init"],
+                                               trailing_stop_from_prior_close=strategy == 1,
+                                               check_trailing_stop_first=strategy == 2)
+        return self.results()
+
+    def run_short_positions(self, first_data_point, entry_signals, exit_signals, trailing_stop_init,
+                            trailing_stop_from_prior_close, check_trailing_stop_first):
+        """ The stateful part of the strategy, as BackTest.run_short_positions, for all symbols at once: step
+            through the bars once, with the position, purchase price, lowest price and trailing stop of every
+            symbol held in arrays. Bars where no symbol holds a position or has an entry signal are skipped.
+
+            :return: dataframe of the closed trades, with the symbol, entry and exit bar, purchase and sell price
+                and profit
+        """
+        close = self.prices["Close"]
+        number_of_data_points, number_of_symbols = close.shape
+        entry_signals = entry_signals & ~np.isnan(close)
+        entry_signals[:first_data_point] = False
+        bars_with_entries = np.flatnonzero(entry_signals.any(axis=1))
+
+        own_short = np.zeros(number_of_symbols, dtype=bool)
+        entry_bar = np.zeros(number_of_symbols, dtype=np.int64)
+        purchase_price = np.zeros(number_of_symbols)
+        lowest_price_after_purchase = np.zeros(number_of_symbols)
+        trailing_stop = np.zeros(number_of_symbols)
+        # close of the last bar each symbol traded on, for the trailing stop from the prior close
+        previous_close = np.full(number_of_symbols, np.nan)
+        closed = {"symbol": [], "entry": [], "exit": [], "purchase_price": [], "sell_price": []}
+
+        i = int(bars_with_entries[0]) if len(bars_with_entries) else number_of_data_points
+        while i < number_of_data_points:
+            # close positions; a position opened on an earlier bar is checked from the bar after its entry
+            if own_short.any():
+                close_price = close[i]
+                if check_trailing_stop_first:
+                    trailing_stop_hit = close_price > trailing_stop
+                new_low = own_short & (close_price < lowest_price_after_purchase)
+                if new_low.any():
+                    lowest_price_after_purchase = np.where(
+                        new_low, previous_close if trailing_stop_from_prior_close else close_price,
+                        lowest_price_after_purchase)
+                    trailing_stop = np.where(new_low, lowest_price_after_purchase + trailing_stop_init,
+                                             trailing_stop)
+                if not check_trailing_stop_first:
+                    trailing_stop_hit = close_price > trailing_stop
+                # a symbol without a bar at this timestamp keeps its position
+                sell = own_short & (exit_signals[i] | trailing_stop_hit) & ~np.isnan(close_price)
+                if sell.any():
+                    symbols = np.flatnonzero(sell)
+                    closed["symbol"].extend(symbols.tolist())
+                    closed["entry"].extend(entry_bar[symbols].tolist())
+                    closed["exit"].extend([i] * len(symbols))
+                    closed["purchase_price"].extend(purchase_price[symbols].tolist())
+                    closed["sell_price"].extend(close_price[symbols].tolist())
+                    own_short = own_short & ~sell
+                    # a position closed on this bar can only be opened again from the next bar
+                    no_entry = sell
+                else:
+                    no_entry = None
+            else:
+                no_entry = None
+
+            # open positions
+            enter = entry_signals[i] & ~own_short
+            if no_entry is not None:
+                enter = enter & ~no_entry
+            if enter.any():
+                own_short = own_short | enter
+                entry_bar = np.where(enter, i, entry_bar)
+                purchase_price = np.where(enter, close[i], purchase_price)
+                lowest_price_after_purchase = np.where(enter, close[i], lowest_price_after_purchase)
+                trailing_stop = np.where(enter, close[i] + trailing_stop_init, trailing_stop)
+
+            previous_close = np.where(np.isnan(close[i]), previous_close, close[i])
+            if own_short.any():
+                i = i + 1
+            else:
+                next_entry = np.searchsorted(bars_with_entries, i + 1)
+                i = int(bars_with_entries[next_entry]) if next_entry < len(bars_with_entries) else \
+                    number_of_data_points
+
+        trades = pd.DataFrame(closed)
+        trades["symbol"] = [self.symbols[symbol] for symbol in trades["symbol"]]
+        trades["entry_date"] = self.index[trades["entry"].to_numpy(dtype=np.int64)]
+        trades["exit_date"] = self.index[trades["exit"].to_numpy(dtype=np.int64)]
+        trades["profit"] = (trades["purchase_price"] - trades["sell_price"]) * CONVERT_TO_DOLLARS
+        return trades.sort_values(["symbol", "entry"], kind="stable").reset_index(drop=True)
+
+    def results(self):
+        """ profit, winners, losers and number of trades of each symbol of the last backtest, and their total """
+        profit = self.trades["profit"]
+        per_symbol = pd.DataFrame({"profit": profit, "winners": profit > 0, "losers": profit <= 0,
+                                   "trades": 1, "symbol": self.trades["symbol"]}).groupby("symbol").sum()
+        per_symbol = per_symbol.reindex(self.symbols, fill_value=0)[RESULT_COLUMNS]
+        per_symbol.loc["TOTAL"] = per_symbol.sum()
+        return per_symbol.astype({"winners": int, "losers": int, "trades": int})
@@ -0,0 +1,102 @@
+""" Struct-of-arrays container for the data of one stock data file
+    The OHLCV data and every indicator column are rows of one contiguous 2-D float64 array, and the dates a
+    separate array, instead of the list of dictionaries of Series addressed with CommonDefs.INDEX_OF_*. A column is
+    a view of its row, so reading one costs a dictionary lookup and no conversion, a range of bars is a view of the
+    whole block, and the container pickles as two arrays, which is cheap to send to worker processes.
+"""
+import numpy as np
+import pandas as pd
+
+from Common import *
+
+OHLCV_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+class StockArrays:
+    __slots__ = ("dates", "values", "column_index")
+
+    def __init__(self, dates, columns, column_index=None):
+        """ Container of the data of one file
+
+            :param dates: array of the dates of the bars, as in the Date column of the cleaned up data
+            :param columns: dictionary of column name to a sequence of values per bar, or a 2-D float64 array
+                with one row per column, used without a copy, together with column_index
+            :param column_index: dictionary of column name to its row in the 2-D array of columns
+            :param self.values: 2-D float64 array with one row per column and one column per bar
+        """
+        self.dates = np.asarray(dates)
+        if column_index is not None:
+            self.values = columns
+            self.column_index = column_index
+        else:
+            self.column_index = {name: row for row, name in enumerate(columns)}
+            self.values = np.empty((len(columns), len(self.dates)))
+            for name, row in self.column_index.items():
+                self.values[row] = np.asarray(columns[name], dtype=float)
+
+    @classmethod
+    def from_candlestick_data(cls, candlestick_stock_data, stock_data_adjusted=None):
+        """ container for the candlestick stock data of one file, as StockData calculates it: the OHLC data,
+            candlestick data and the indicators addressed with CommonDefs.INDEX_OF_*
+
+            :param stock_data_adjusted: optional cleaned up data of the file, for the Volume column, which the
+                candlestick stock data does not keep
+        """
+        ohlc_data = candlestick_stock_data[CommonDefs.INDEX_OF_OHLC_DATA]
+        if stock_data_adjusted is not None:
+            ohlc_data = stock_data_adjusted
+        columns = {name: ohlc_data[name] for name in OHLCV_COLUMNS if name in ohlc_data}
+        for moving_average in candlestick_stock_data[CommonDefs.INDEX_OF_MA_DATA].values():
+            columns[moving_average.columns[0]] = moving_average.iloc[:, 0]
+        columns["%K"] = candlestick_stock_data[CommonDefs.INDEX_OF_STOCHASTICS_DATA]["%K"]
+        columns["%D"] = candlestick_stock_data[CommonDefs.INDEX_OF_STOCHASTICS_DATA]["%D"]
+        columns["%R"] = candlestick_stock_data[CommonDefs.INDEX_OF_WILLIAMS_DATA]["%R"]
+        columns["momentum"] = candlestick_stock_data[CommonDefs.INDEX_OF_MOMENTUM_DATA]["momentum"]
+        macd = candlestick_stock_data[CommonDefs.INDEX_OF_MACD_DATA]["macd"]
+        for name in macd.columns:
+            columns[name] = macd[name]
+        return cls(candlestick_stock_data[CommonDefs.INDEX_OF_DATE_INDEX]["date_index"], columns)
+
+    @classmethod
+    def concatenate(cls, list_stock_arrays):
+        """ container of the bars of several containers with the same columns, one after another """
+        return cls(np.concatenate([stock_arrays.dates for stock_arrays in list_stock_arrays]),
+                   np.concatenate([stock_arrays.values for stock_arrays in list_stock_arrays], axis=1),
+                   dict(list_stock_arrays[0].column_index))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, name):
+        """ the values of one column, as a view """
+        return self.values[self.column_index[name]]
+
+    def __contains__(self, name):
+        return name in self.column_index
+
+    def __getstate__(self):
+        return self.dates, self.values, self.column_index
+
+    def __setstate__(self, state):
+        self.dates, self.values, self.column_index = state
+
+    @property
+    def names(self):
+        return list(self.column_index)
+
+    @property
+    def close(self):
+        return self.values[self.column_index["Close"]]
+
+    @property
+    def nbytes(self):
+        """ bytes held by the dates and the columns """
+        return self.dates.nbytes + self.values.nbytes
+
+    def slice(self, start=None, stop=None):
+        """ container of a range of bars, as views of this one's arrays """
+        return StockArrays(self.dates[start:stop], self.values[:, start:stop], self.column_index)
+
+    def to_dataframe(self):
+        """ dataframe with a Date column and one column per data column """
+        return pd.DataFrame({"Date": self.dates, **{name: self[name] for name in self.column_index}})
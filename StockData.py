@@ -1,16 +1,134 @@
 from indicators import *
 from BackTest import *
-
+from Instrumentation import Instrumentation, stage, data_file, add_records, worker_settings
+from StockArrays import StockArrays
+import TradeLog
+
+# lookbacks of the indicators calculated for each file; part of the IndicatorCache key
+INDICATOR_PARAMETERS = {"moving_averages": (21, 55, 89), "stochastics": 21, "stochastics_smoothing": 7,
+                        "williams": 14, "momentum": 12, "macd_fast": 12, "macd_slow": 26}
+
+
+def read_stock_data(df_element):
+    """ return the raw data of one .csv file, reading it first if df_element is the path of the file """
+    if isinstance(df_element, str):
+        return pd.read_csv(df_element)
+    return df_element
+
+
+def file_label(df_element, i):
+    """ name of the i'th data set in the instrumentation records: the path of the file, if it is given as one """
+    if isinstance(df_element, str):
+        return df_element
+    return "data set " + str(i)
+
+
+def process_stock_data(df_element, run_strategies=True, label="", instrumentation_settings=None,
+                       trade_log_settings=None, verbose=False):
+    """ Run the complete pipeline for the data of one .csv file: clean up, candlesticks, indicators and, optionally,
+        the backtest strategies. Each file is independent, so StockData can run this in worker processes.
+
+        :param df_element dataframe with the raw data from one .csv file, or the path of the file
+        :param run_strategies boolean run the backtest strategies on the indicators
+        :param label string name of the file in the instrumentation records
+        :param instrumentation_settings dictionary of Instrumentation settings from worker_settings(), for a worker
+            process to record its stages and return them; None records them in the active Instrumentation, if any
+        :param trade_log_settings dictionary of TradeLog settings from TradeLog.worker_settings(), for a worker
+            process to record the trades of the strategies and return them; None records them in the active
+            TradeLog, if any
+        :param verbose boolean return the text report of the trades of the strategies
+        :return: tuple of the adjusted data, the candlestick stock data, the profit of each strategy, the text
+            report of the strategies, the instrumentation records and the trade log chunks of a worker process; the
+            profits are 0 and the text empty when the strategies are not run, and the text is empty unless verbose
+    """
+    instrumentation = None
+    if instrumentation_settings is not None:
+        instrumentation = Instrumentation(**instrumentation_settings).start()
+    trade_log = None
+    if trade_log_settings is not None:
+        trade_log = TradeLog.TradeLog(**trade_log_settings).start()
+
+    profit_strategy_1 = 0
+    profit_strategy_2 = 0
+    report = ""
+    try:
+        with data_file(label):
+            with stage("cleanup_data"):
+                stock_data_adjusted = StockData.cleanup_stock_data(read_stock_data(df_element))
+            with stage("calculate_candlesticks"):
+                candlestick_stock_data = StockData.calculate_candlestick_data(stock_data_adjusted)
+            with stage("calculate_indicators"):
+                candlestick_stock_data.extend(StockData.calculate_indicator_data(stock_data_adjusted))
+
+            if run_strategies:
+                with TradeLog.data_set(label), stage("execute_strategies"):
+                    profit_strategy_1, profit_strategy_2, report = StockData.execute_strategies_for(
+                        candlestick_stock_data, verbose)
+    finally:
+        if trade_log is not None:
+            trade_log.stop()
+        if instrumentation is not None:
+            instrumentation.stop()
+
+    records = instrumentation.records if instrumentation is not None else []
+    chunks = trade_log.chunks if trade_log is not None else []
+    return stock_data_adjusted, candlestick_stock_data, profit_strategy_1, profit_strategy_2, report, records, \
+        chunks
+
+
+
+def load_or_process_stock_data(df_element, run_strategies=True, label="", cache=None, verbose=False):
+    """ process_stock_data for one file, taking its cleaned up data and indicators from the cache if they are in it
+        and storing them there if they are not. Files given as dataframes are always processed.
+
+        :param cache IndicatorCache, or None to always process the file
+        :param verbose boolean return the text report of the trades of the strategies
+        :return: tuple as returned by process_stock_data
+    """
+    key = None
+    if cache is not None and isinstance(df_element, str):
+        with data_file(label), stage("cache_load"):
+            key = cache.key(df_element, INDICATOR_PARAMETERS)
+            cached = cache.load(key)
+        if cached is not None:
+            stock_data_adjusted, candlestick_stock_data = cached
+            profit_strategy_1 = 0
+            profit_strategy_2 = 0
+            report = ""
+            if run_strategies:
+                with data_file(label), TradeLog.data_set(label), stage("execute_strategies"):
+                    profit_strategy_1, profit_strategy_2, report = StockData.execute_strategies_for(
+                        candlestick_stock_data, verbose)
+            return stock_data_adjusted, candlestick_stock_data, profit_strategy_1, profit_strategy_2, report, [], []
+
+    result = process_stock_data(df_element, run_strategies, label, verbose=verbose)
+    if key is not None:
+        with data_file(label), stage("cache_store"):
+            cache.store(key, (result[0], result[1]))
+    return result
 
 class StockData:
-    def __init__(self, list_of_stock_data_in_df):
+    def __init__(self, list_of_stock_data_in_df, run_strategies=True, max_workers=1, cache=None, verbose=False):
         """ stock_data class maintains the collection of raw stock data as well as the calculated values for
             indicators
 
-            :param list self.list_of_stock_data_in_df is a list of dataframes from the raw data in .csv files
-            :param list self.list_stock_data_adjusted is the cleaned up set of data from the .csv files
+            :param list self.list_of_stock_data_in_df is a list of dataframes from the raw data in .csv files, or
+                of the paths of the .csv files, which are then read when they are needed
+            :param list self.list_stock_data_adjusted is the cleaned up set of data from the .csv files, while
+                the data is processed
             :param list self.list_candlestick_stock_data has all of the adjusted OHLC data plus candlestick
-                data and indicator data
+                data and indicator data, while the data is processed
+            :param list self.list_stock_arrays has a StockArrays container of the data of each file; once it is
+                made, the cleaned up and candlestick stock data of the file are released
+            :param run_strategies boolean run the backtest strategies once the indicators are calculated; a
+                parameter sweep only needs the indicators
+            :param max_workers int number of worker processes which process the files concurrently; 1 processes
+                them one after the other in this process and None uses all cores
+            :param cache IndicatorCache in which the cleaned up data and indicators of each .csv file given as a
+                path are looked up before they are calculated, and stored after
+            :param verbose boolean print the text report of the trades of the strategies for each file
+            :param self.overall_profit_strategy_1 float profit of strategy 1 summed over all files
+            :param self.overall_profit_strategy_2 float profit of strategy 2 summed over all files
         """
 
         ''' top-level data format is arranged like this
@@ -24,61 +142,241 @@ class StockData:
         self.list_of_stock_data_in_df = list_of_stock_data_in_df
         self.list_stock_data_adjusted = []
         self.list_candlestick_stock_data = []
+        self.list_stock_arrays = []
+        self.verbose = verbose
+        self.overall_profit_strategy_1 = 0
+        self.overall_profit_strategy_2 = 0
+
+        if cache is not None:
+            self.process_files_with_cache(cache, max_workers)
+            if run_strategies:
+                self.execute_strategies()
+        elif max_workers != 1 and len(list_of_stock_data_in_df) > 1:
+            self.process_files_concurrently(run_strategies, max_workers)
+        else:
+            self.cleanup_data()
+            self.calculate_candlesticks()
+            self.calculate_indicators()
+            if run_strategies:
+                self.execute_strategies()
+        self.get_stock_arrays()
+
+    def get_stock_arrays(self):
+        """ return the StockArrays container of the data of each file, making them from the adjusted and the
+            candlestick stock data of the files processed since the last call, e.g. with add_processed_file """
+        for stock_data_adjusted, candlestick_stock_data in zip(self.list_stock_data_adjusted,
+                                                               self.list_candlestick_stock_data):
+            self.list_stock_arrays.append(StockArrays.from_candlestick_data(candlestick_stock_data,
+                                                                            stock_data_adjusted))
+        # the containers hold all of the data which is read later, so the data is not kept twice
+        self.list_stock_data_adjusted = []
+        self.list_candlestick_stock_data = []
+        return self.list_stock_arrays
 
-        self.cleanup_data()
-        self.calculate_candlesticks()
-        self.calculate_indicators()
-        self.execute_strategies()
+    def add_processed_file(self, df_element, result):
+        """ add the result of process_stock_data for one more file, e.g. from a StockDataLoader, and add its profits
+            to the overall profits
+
+            :param df_element dataframe or path of the file
+            :param result tuple as returned by process_stock_data
+        """
+        stock_data_adjusted, candlestick_stock_data, profit_strategy_1, profit_strategy_2 = result[:4]
+        self.list_of_stock_data_in_df.append(df_element)
+        self.list_stock_data_adjusted.append(stock_data_adjusted)
+        self.list_candlestick_stock_data.append(candlestick_stock_data)
+        self.overall_profit_strategy_1 = self.overall_profit_strategy_1 + profit_strategy_1
+        self.overall_profit_strategy_2 = self.overall_profit_strategy_2 + profit_strategy_2
+
+    @classmethod
+    def from_store(cls, store, symbol, start=None, end=None, split_by_day=False, **kwargs):
+        """ StockData for the data of one symbol in a MarketDataStore, over a date range
+
+            :param store MarketDataStore
+            :param symbol string stock ticker symbol
+            :param start first date/time to include; from the first row when None
+            :param end date/time to stop before; to the last row when None
+            :param split_by_day boolean make each day a separate data set, as with one intraday .csv file per day
+            :param kwargs the other StockData parameters
+        """
+        if split_by_day:
+            list_of_stock_data_in_df = store.load_sessions(symbol, start, end)
+        else:
+            list_of_stock_data_in_df = [store.load_dataframe(symbol, start, end)]
+        return cls(list_of_stock_data_in_df, **kwargs)
+
+    @classmethod
+    def from_bars(cls, resampler, timeframe, start=None, end=None, split_by_day=False, **kwargs):
+        """ StockData for the bars of a BarResampler aggregated to a timeframe, over a date range
+
+            :param resampler BarResampler with the bars of one symbol
+            :param timeframe timeframe of the bars, e.g. "5min", "60min" or "1D"
+            :param start first date/time to include; from the first bar when None
+            :param end date/time to stop before; to the last bar when None
+            :param split_by_day boolean make each day a separate data set, as with one intraday .csv file per day
+            :param kwargs the other StockData parameters
+        """
+        if split_by_day:
+            list_of_stock_data_in_df = resampler.sessions(timeframe, start, end)
+        else:
+            list_of_stock_data_in_df = [resampler.dataframe(timeframe, start, end)]
+        return cls(list_of_stock_data_in_df, **kwargs)
+
+    def process_files_concurrently(self, run_strategies, max_workers):
+        """ Process each file on a pool of worker processes. The results are merged back in the original order of
+            the files, and the strategy output and profits are printed and summed in that order too, so the result
+            is the same as processing the files one after the other.
+
+            :param run_strategies boolean run the backtest strategies once the indicators are calculated
+            :param max_workers int number of worker processes; None uses all cores
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        number_of_files = len(self.list_of_stock_data_in_df)
+        labels = [file_label(df_element, i) for i, df_element in enumerate(self.list_of_stock_data_in_df)]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = executor.map(process_stock_data, self.list_of_stock_data_in_df,
+                                   [run_strategies] * number_of_files, labels,
+                                   [worker_settings()] * number_of_files,
+                                   [TradeLog.worker_settings()] * number_of_files,
+                                   [self.verbose] * number_of_files)
+
+            for stock_data_adjusted, candlestick_stock_data, profit_strategy_1, profit_strategy_2, output, records, \
+                    chunks in results:
+                add_records(records)
+                TradeLog.add_chunks(chunks)
+                self.list_stock_data_adjusted.append(stock_data_adjusted)
+                self.list_candlestick_stock_data.append(candlestick_stock_data)
+                if run_strategies:
+                    print(output, end="")
+                    self.overall_profit_strategy_1 = self.overall_profit_strategy_1 + profit_strategy_1
+                    self.overall_profit_strategy_2 = self.overall_profit_strategy_2 + profit_strategy_2
+
+        if run_strategies:
+            self.print_overall_profit()
+
+    def process_files_with_cache(self, cache, max_workers):
+        """ Take the cleaned up data and indicators of each file from the cache, and calculate the ones which are not
+            in it, concurrently if max_workers is not 1. Files given as dataframes are always calculated.
+
+            :param cache IndicatorCache
+            :param max_workers int number of worker processes; None uses all cores
+            :param results list of (adjusted data, candlestick stock data) for each file, None until known
+            :param keys list of the cache key of each file, None for files given as dataframes
+        """
+        number_of_files = len(self.list_of_stock_data_in_df)
+        results = [None] * number_of_files
+        keys = [None] * number_of_files
+        labels = [file_label(df_element, i) for i, df_element in enumerate(self.list_of_stock_data_in_df)]
+        for i, df_element in enumerate(self.list_of_stock_data_in_df):
+            if isinstance(df_element, str):
+                with data_file(labels[i]), stage("cache_load"):
+                    keys[i] = cache.key(df_element, INDICATOR_PARAMETERS)
+                    results[i] = cache.load(keys[i])
+
+        to_calculate = [i for i in range(number_of_files) if results[i] is None]
+        to_calculate_in_df = [self.list_of_stock_data_in_df[i] for i in to_calculate]
+        to_calculate_labels = [labels[i] for i in to_calculate]
+        if max_workers != 1 and len(to_calculate) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                calculated = list(executor.map(process_stock_data, to_calculate_in_df,
+                                               [False] * len(to_calculate), to_calculate_labels,
+                                               [worker_settings()] * len(to_calculate)))
+        else:
+            calculated = [process_stock_data(df_element, False, label)
+                          for df_element, label in zip(to_calculate_in_df, to_calculate_labels)]
+
+        for i, result in zip(to_calculate, calculated):
+            add_records(result[5])
+            results[i] = (result[0], result[1])
+            if keys[i] is not None:
+                with data_file(labels[i]), stage("cache_store"):
+                    cache.store(keys[i], results[i])
+
+        for stock_data_adjusted, candlestick_stock_data in results:
+            self.list_stock_data_adjusted.append(stock_data_adjusted)
+            self.list_candlestick_stock_data.append(candlestick_stock_data)
 
     # clean up data
     def cleanup_data(self):
-        """ Cleans up data by finding non-numeric values and setting them to Nan, adds the column names
+        """ Cleans up data by finding non-numeric values and setting them to Nan, adds the column names """
+
+        for i, df_element in enumerate(self.list_of_stock_data_in_df):
+            with data_file(file_label(df_element, i)), stage("cleanup_data"):
+                self.list_stock_data_adjusted.append(StockData.cleanup_stock_data(read_stock_data(df_element)))
+
+    @staticmethod
+    def cleanup_stock_data(df_element):
+        """ Cleans up the data from one .csv file by finding non-numeric values and setting them to Nan, adds the
+            column names. Each NaN is replaced by the value which follows it in the .csv file, or the one before it
+            for the last row. Every step works on whole columns, and the cleaned up dataframe is built once from
+            the cleaned columns.
 
             :param col_names list for data sets which don't already have column names
             :param data_columns_list list of column names to assign to df
+            :param columns dictionary of column name to the cleaned up column, in the order of the dataframe
          """
-
-        for df_element in self.list_of_stock_data_in_df:
-            # Date
-            col_names = df_element.columns
-            if "Date" not in col_names:
-                # make sure column of dates is in string format
-                # join columns with date and time into one
-                df_element.iloc[:, 0] = df_element.iloc[:, 0].apply(lambda x:  str(x) +":")
-                df_element.iloc[:, 0] = df_element.iloc[:, 0] + df_element.iloc[:, 1]
-                # reformat
-                df_element.iloc[:, 0] = pd.to_datetime(df_element.iloc[:, 0], format='%m/%d/%Y:%H:%M')
-                df_element = df_element.drop(df_element.columns[1], axis=1)
-                # set column names as this data doesn't have any
-                df_element.columns = ["Date", "Open", "High", "Low", "Close", "Volume"]
-
-            if df_element.Date.isnull().values.any():
-                pass
-            elif "#" in df_element.Date.values:
-                pass
-
-            # coerce to a numeric; errors will get NaN
-            data_columns_list = ["Open", "High", "Low", "Close", "Volume"]
-            df_element = (df_element.drop(data_columns_list, axis=1)
-                          .join(df_element[data_columns_list].apply(pd.to_numeric, errors='coerce')))
-
-            for col_name in data_columns_list:
-                # return boolean index series of errors in stock values
-                indices_of_errors = np.where(df_element[col_name].isna())[0]
-
-                # fix errors by copying next or previous element
-                for i in indices_of_errors:
-                    if i == 0:
-                        df_element.loc[i, col_name] = df_element.loc[(i+1), col_name]
-                    elif i == len(df_element[col_name]):  # index is same as last element
-                        df_element.loc[i, col_name] = df_element.loc[(i-1), col_name]
-                    else:
-                        df_element.loc[i, col_name] = df_element.loc[(i+1), col_name]
-
-            self.list_stock_data_adjusted.append(df_element)
+        data_columns_list = ["Open", "High", "Low", "Close", "Volume"]
+
+        # Date
+        col_names = df_element.columns
+        columns = {}
+        if "Date" not in col_names:
+            # join columns with date and time into one; dates and times repeat, so each distinct date and time
+            # string is parsed only once
+            date_codes, dates = pd.factorize(df_element.iloc[:, 0])
+            time_codes, times = pd.factorize(df_element.iloc[:, 1])
+            dates = pd.to_datetime(dates.astype(str), format='%m/%d/%Y').to_numpy()
+            times = (pd.to_datetime(times.astype(str), format='%H:%M') - pd.Timestamp(1900, 1, 1)).to_numpy()
+            columns["Date"] = pd.Series(dates[date_codes] + times[time_codes], index=df_element.index)
+            # set column names as this data doesn't have any
+            data_columns = dict(zip(data_columns_list, (df_element.iloc[:, i] for i in range(2, 7))))
+        else:
+            for col_name in col_names:
+                if col_name not in data_columns_list:
+                    columns[col_name] = df_element[col_name]
+            data_columns = {col_name: df_element[col_name] for col_name in data_columns_list}
+
+        for col_name, column in data_columns.items():
+            # coerce to a numeric; errors will get NaN. Prices repeat, so each distinct string is converted once
+            if not pd.api.types.is_numeric_dtype(column):
+                codes, distinct_values = pd.factorize(column)
+                distinct_values = pd.to_numeric(pd.Series(distinct_values, dtype=object), errors='coerce').to_numpy()
+                missing = codes < 0
+                if missing.any():
+                    # missing values have code -1; look them up as NaN after the distinct values
+                    distinct_values = np.append(distinct_values.astype(float), np.nan)
+                column = pd.Series(distinct_values[codes], index=column.index)
+
+            # fix errors by copying next or previous element
+            values = column.to_numpy()
+            errors = np.isnan(values) if values.dtype.kind == 'f' else None
+            if errors is not None and errors.any():
+                values = values.copy()
+                values[:-1][errors[:-1]] = column.to_numpy()[1:][errors[:-1]]
+                if errors[-1] and len(values) > 1:
+                    values[-1] = values[-2]
+                column = pd.Series(values, index=column.index)
+            columns[col_name] = column
+
+        return pd.DataFrame(columns, index=df_element.index)
 
     def calculate_candlesticks(self):
-        """ Take the OHLC data and create candlestick data for dislplay
+        """ Take the OHLC data and create candlestick data for dislplay """
+        # list_of_candlestick_stock_data has all adjusted data plus indicators for each data file
+        #   - each element in the list has data for a separate data file
+        #       - each element has dictionary elements:
+        #           - candlestick data: calculated data for display on the chart page - each candlestick plus wick data
+        #           - OHLC data
+        #           - candlestick data
+
+        for i, stock_data in enumerate(self.list_stock_data_adjusted):
+            with data_file(file_label(self.list_of_stock_data_in_df[i], i)), stage("calculate_candlesticks"):
+                self.list_candlestick_stock_data.append(StockData.calculate_candlestick_data(stock_data))
+
+    @staticmethod
+    def calculate_candlestick_data(stock_data):
+        """ Take the OHLC data of one file and create candlestick data for dislplay
             :param ohlc_data dictionary of Open, High, Low, Close data
             :param dict_candlestick_stock_data dictionary with data elements
             :param hi_day_bounds_above_bar int green candle upper wick length
@@ -86,53 +384,39 @@ class StockData:
             :param lo_day_bounds_above_bar int green candle lower wick length
             :param lo_day_bounds_above_bar int red candle upper wick length
             :param lo_day_bounds_below_bar int red candle lower wick length
+            :return: list of the OHLC data and the candlestick data
 
         """
-        # list_of_candlestick_stock_data has all adjusted data plus indicators for each data file
-        #   - each element in the list has data for a separate data file
-        #       - each element has dictionary elements:
-        #           - candlestick data: calculated data for display on the chart page - each candlestick plus wick data
-        #           - OHLC data
-        #           - candlestick data
-
-        for stock_data in self.list_stock_data_adjusted:
+        ohlc_data = {}
+        ohlc_data['Close'] = stock_data['Close']
+        ohlc_data['Low'] = stock_data['Low']
+        ohlc_data['High'] = stock_data['High']
+        ohlc_data['Open'] = stock_data['Open']
 
-            ohlc_data = {}
-            ohlc_data['Close'] = stock_data['Close']
-            ohlc_data['Low'] = stock_data['Low']
-            ohlc_data['High'] = stock_data['High']
-            ohlc_data['Open'] = stock_data['Open']
+        # calculate candlestick plot data
+        hi_day = stock_data[stock_data['Open'] < stock_data['Close']]
+        lo_day = stock_data[stock_data['Open'] > stock_data['Close']]
 
-            # calculate candlestick plot data
-            hi_day = stock_data[stock_data['Open'] < stock_data['Close']]
-            lo_day = stock_data[stock_data['Open'] > stock_data['Close']]
+        hi_day_bounds_above_bar = hi_day['High'] - hi_day['Close']
+        hi_day_bounds_below_bar = hi_day['Open'] - hi_day['Low']
 
-            hi_day_bounds_above_bar = hi_day['High'] - hi_day['Close']
-            hi_day_bounds_below_bar = hi_day['Open'] - hi_day['Low']
+        lo_day_bounds_above_bar = lo_day['High'] - lo_day['Open']
+        lo_day_bounds_below_bar = lo_day['Close'] - lo_day['Low']
 
-            lo_day_bounds_above_bar = lo_day['High'] - lo_day['Open']
-            lo_day_bounds_below_bar = lo_day['Close'] - lo_day['Low']
+        dict_candlestick_stock_data = {}
+        dict_candlestick_stock_data['lo_day'] = lo_day
+        dict_candlestick_stock_data['hi_day'] = hi_day
+        dict_candlestick_stock_data['hi_day_bounds_above_bar'] = hi_day_bounds_above_bar
+        dict_candlestick_stock_data['hi_day_bounds_below_bar'] = hi_day_bounds_below_bar
+        dict_candlestick_stock_data['lo_day_bounds_above_bar'] = lo_day_bounds_above_bar
+        dict_candlestick_stock_data['lo_day_bounds_below_bar'] = lo_day_bounds_below_bar
 
-            dict_candlestick_stock_data = {}
-            dict_candlestick_stock_data['lo_day'] = lo_day
-            dict_candlestick_stock_data['hi_day'] = hi_day
-            dict_candlestick_stock_data['hi_day_bounds_above_bar'] = hi_day_bounds_above_bar
-            dict_candlestick_stock_data['hi_day_bounds_below_bar'] = hi_day_bounds_below_bar
-            dict_candlestick_stock_data['lo_day_bounds_above_bar'] = lo_day_bounds_above_bar
-            dict_candlestick_stock_data['lo_day_bounds_below_bar'] = lo_day_bounds_below_bar
-
-            self.list_candlestick_stock_data.append([ohlc_data, dict_candlestick_stock_data])
+        return [ohlc_data, dict_candlestick_stock_data]
 
     def calculate_indicators(self):
         """ calculate the list of indicators which are of interest for backtesting; each day/minute will have the
             following set of indicators calculated and stored for analysis and plotting
 
-            :param dict_moving_averages dictionary with moving average data for 21, 55, and 89-day averages
-            :param dict_stochastics dictionary with stochastics calculated data
-            :param dict_williams dictionary with williams %R calculated data
-            :param dict_momentum dictionary with momentum calculated data
-            :param dict_date_index dictionary with the date index for each set of data
-            :param dict_macd dictionary with the MACD calculated data
             :param self.list_candlestick_stock_data will have the following dictionary elements:
                 - OHLC data
                 - candlestick data
@@ -158,58 +442,99 @@ class StockData:
         #           - MACD data
 
         for i in range(0, len(self.list_candlestick_stock_data)):
-            dict_moving_averages = {}
-            dict_moving_averages['pd_sma_21day'] = moving_average(pd.DataFrame(self.list_stock_data_adjusted[i]['Close']), 21)
-            dict_moving_averages['pd_sma_55day'] = moving_average(pd.DataFrame(self.list_stock_data_adjusted[i]['Close']), 55)
-            dict_moving_averages['pd_sma_89day'] = moving_average(pd.DataFrame(self.list_stock_data_adjusted[i]['Close']), 89)
-
-            self.list_candlestick_stock_data[i].append(dict_moving_averages)
-
-            # stochastics
-            dict_stochastics = {}
-            number_of_days_for_lookback = 21
-            smoothing = 7
-            dict_stochastics['%K'] = stochastic_oscillator_k(self.list_stock_data_adjusted[i], number_of_days_for_lookback)
-            dict_stochastics['%D'] = stochastic_oscillator_d(self.list_stock_data_adjusted[i], number_of_days_for_lookback,smoothing)
-            self.list_candlestick_stock_data[i].append(dict_stochastics)
-
-            # williams %R
-            dict_williams = {}
-            number_of_days_for_lookback = 14
-            dict_williams["%R"] = williams_R(self.list_stock_data_adjusted[i], number_of_days_for_lookback)
-            self.list_candlestick_stock_data[i].append(dict_williams)
-
-            # momentum
-            dict_momentum = {}
-            number_of_days_for_lookback = 12
-            dict_momentum["momentum"] = momentum(self.list_stock_data_adjusted[i], number_of_days_for_lookback)
-            self.list_candlestick_stock_data[i].append(dict_momentum)
-
-            # date reference
-            dict_date_index = {}
-            dict_date_index["date_index"] = self.list_stock_data_adjusted[i]["Date"]
-            self.list_candlestick_stock_data[i].append(dict_date_index)
-
-            # MACD
-            dict_macd = {}
-            number_of_days_for_lookback_fast = 12
-            number_of_days_for_lookback_slow = 26
-            dict_macd["macd"] = macd(self.list_stock_data_adjusted[i], number_of_days_for_lookback_fast,
-                                     number_of_days_for_lookback_slow)
-            self.list_candlestick_stock_data[i].append(dict_macd)
+            with data_file(file_label(self.list_of_stock_data_in_df[i], i)), stage("calculate_indicators"):
+                self.list_candlestick_stock_data[i].extend(
+                    StockData.calculate_indicator_data(self.list_stock_data_adjusted[i]))
 
         return self.list_candlestick_stock_data
 
+    @staticmethod
+    def calculate_indicator_data(stock_data_adjusted):
+        """ calculate the indicators for the adjusted data of one file
+
+            :param dict_moving_averages dictionary with moving average data for 21, 55, and 89-day averages
+            :param dict_stochastics dictionary with stochastics calculated data
+            :param dict_williams dictionary with williams %R calculated data
+            :param dict_momentum dictionary with momentum calculated data
+            :param dict_date_index dictionary with the date index for each set of data
+            :param dict_macd dictionary with the MACD calculated data
+            :return: list of the indicator dictionaries, in the order of the CommonDefs.INDEX_OF_* definitions
+        """
+        dict_moving_averages = {}
+        for number_of_days in INDICATOR_PARAMETERS["moving_averages"]:
+            with stage("moving_average_" + str(number_of_days)):
+                dict_moving_averages['pd_sma_' + str(number_of_days) + 'day'] = \
+                    moving_average(pd.DataFrame(stock_data_adjusted['Close']), number_of_days)
+
+        # stochastics
+        dict_stochastics = {}
+        number_of_days_for_lookback = INDICATOR_PARAMETERS["stochastics"]
+        smoothing = INDICATOR_PARAMETERS["stochastics_smoothing"]
+        with stage("rolling_extrema"):
+            stochastics_extrema = rolling_extrema(stock_data_adjusted, number_of_days_for_lookback)
+        with stage("stochastic_oscillator_k"):
+            dict_stochastics['%K'] = stochastic_oscillator_k(stock_data_adjusted, number_of_days_for_lookback,
+                                                             extrema=stochastics_extrema)
+        with stage("stochastic_oscillator_d"):
+            dict_stochastics['%D'] = stochastic_oscillator_d(stock_data_adjusted, number_of_days_for_lookback,
+                                                             smoothing, stoch_osc_k=dict_stochastics['%K'])
+
+        # williams %R
+        dict_williams = {}
+        number_of_days_for_lookback = INDICATOR_PARAMETERS["williams"]
+        with stage("williams_R"):
+            dict_williams["%R"] = williams_R(stock_data_adjusted, number_of_days_for_lookback)
+
+        # momentum
+        dict_momentum = {}
+        number_of_days_for_lookback = INDICATOR_PARAMETERS["momentum"]
+        with stage("momentum"):
+            dict_momentum["momentum"] = momentum(stock_data_adjusted, number_of_days_for_lookback)
+
+        # date reference
+        dict_date_index = {}
+        dict_date_index["date_index"] = stock_data_adjusted["Date"]
+
+        # MACD
+        dict_macd = {}
+        number_of_days_for_lookback_fast = INDICATOR_PARAMETERS["macd_fast"]
+        number_of_days_for_lookback_slow = INDICATOR_PARAMETERS["macd_slow"]
+        with stage("macd"):
+            dict_macd["macd"] = macd(stock_data_adjusted, number_of_days_for_lookback_fast,
+                                     number_of_days_for_lookback_slow)
+
+        return [dict_moving_averages, dict_stochastics, dict_williams, dict_momentum, dict_date_index, dict_macd]
+
     def execute_strategies(self):
         # for each strategy, see if the indicators initiate a purchase
-        overall_profit_strategy_1 = 0
-        overall_profit_strategy_2 = 0
-        for i in range(0, len(self.list_candlestick_stock_data)):
-            back_test_strategies = BackTest(self.list_candlestick_stock_data[i])
+        for i, stock_arrays in enumerate(self.get_stock_arrays()):
+            label = file_label(self.list_of_stock_data_in_df[i], i)
+            with data_file(label), TradeLog.data_set(label), stage("execute_strategies"):
+                profit_strategy_1, profit_strategy_2, report = StockData.execute_strategies_for(stock_arrays,
+                                                                                                self.verbose)
+            print(report, end="")
 
-            overall_profit_strategy_1 = overall_profit_strategy_1 + back_test_strategies.backtest_strategy_1()
+            self.overall_profit_strategy_1 = self.overall_profit_strategy_1 + profit_strategy_1
 
-            overall_profit_strategy_2 = overall_profit_strategy_2 + back_test_strategies.backtest_strategy_2()
+            self.overall_profit_strategy_2 = self.overall_profit_strategy_2 + profit_strategy_2
 
-        print("\n overall_profit Strategy 1 = ", overall_profit_strategy_1)
-        print("\n overall_profit Strategy 2 = ", overall_profit_strategy_2)
+        self.print_overall_profit()
+
+    @staticmethod
+    def execute_strategies_for(stock_data, verbose=False):
+        """ run each strategy on the data of one file and return the profit of each and, if verbose, the text
+            report of their trades; the text is empty otherwise
+
+            :param stock_data the candlestick stock data of the file, or its StockArrays container
+        """
+        back_test_strategies = BackTest(stock_data)
+        profit_strategy_1 = back_test_strategies.backtest_strategy_1(verbose=False)
+        profit_strategy_2 = back_test_strategies.backtest_strategy_2(verbose=False)
+        report = ""
+        if verbose:
+            report = back_test_strategies.report(1) + "\n" + back_test_strategies.report(2) + "\n"
+        return profit_strategy_1, profit_strategy_2, report
+
+    def print_overall_profit(self):
+        print("\n overall_profit Strategy 1 = ", self.overall_profit_strategy_1)
+        print("\n overall_profit Strategy 2 = ", self.overall_profit_strategy_2)
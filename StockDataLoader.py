@@ -0,0 +1,86 @@
+""" Processing of stock data files on a background thread
+    The window of StockStrategy.py stays responsive while the files are cleaned up, their indicators calculated and
+    the strategies run: a StockDataLoader thread processes the files, one after the other or on a pool of worker
+    processes, and puts the result of each file on a queue as soon as it is ready, in the order of the files. The
+    Tk main loop takes them from the queue with after(), so nothing touches tkinter or matplotlib from the thread.
+    cancel() stops the loader before its next file; with worker processes, the loader stops without waiting for the
+    files they are processing, which are left to finish in the background.
+
+    The messages on the queue are tuples:
+        ("file", i, df_element, result)   result of process_stock_data for the i'th file
+        ("error", i, df_element, error)   the exception which stopped the loader at the i'th file
+        ("done", cancelled)               the last message; cancelled is True when cancel() stopped the loader
+"""
+import concurrent.futures
+import queue
+import threading
+
+from StockData import load_or_process_stock_data, file_label
+
+CANCEL_POLL_INTERVAL_S = 0.1  # how often the loader checks for cancel() while it waits for a worker process
+
+
+class StockDataLoader(threading.Thread):
+    def __init__(self, list_of_stock_data_in_df, run_strategies=True, cache=None, max_workers=1, verbose=False):
+        """ Thread which processes the stock data files
+
+            :param list_of_stock_data_in_df: list of paths of .csv files, or of dataframes with their raw data
+            :param run_strategies: boolean run the backtest strategies on each file once its indicators are
+                calculated
+            :param cache: IndicatorCache for the cleaned up data and indicators of the files, or None
+            :param max_workers: int number of worker processes which process the files concurrently; 1 processes
+                them on this thread and None uses all cores
+            :param verbose: boolean make the text report of the trades of the strategies part of the result of each
+                file
+            :param self.results: queue.Queue of the messages described above
+        """
+        super().__init__(daemon=True)
+        self.list_of_stock_data_in_df = list(list_of_stock_data_in_df)
+        self.run_strategies = run_strategies
+        self.cache = cache
+        self.max_workers = max_workers
+        self.verbose = verbose
+        self.results = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """ stop before the next file; the files being processed by worker processes are not waited for """
+        self.cancelled.set()
+
+    def run(self):
+        i = 0
+        df_element = None
+        try:
+            if self.max_workers == 1:
+                for i, df_element in enumerate(self.list_of_stock_data_in_df):
+                    if self.cancelled.is_set():
+                        break
+                    result = load_or_process_stock_data(df_element, self.run_strategies, file_label(df_element, i),
+                                                        self.cache, self.verbose)
+                    self.results.put(("file", i, df_element, result))
+            else:
+                executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.max_workers)
+                try:
+                    futures = [executor.submit(load_or_process_stock_data, df_element, self.run_strategies,
+                                               file_label(df_element, i), self.cache, self.verbose)
+                               for i, df_element in enumerate(self.list_of_stock_data_in_df)]
+                    for i, (df_element, future) in enumerate(zip(self.list_of_stock_data_in_df, futures)):
+                        while not future.done() and not self.cancelled.is_set():
+                            concurrent.futures.wait([future], timeout=CANCEL_POLL_INTERVAL_S)
+                        if self.cancelled.is_set():
+                            break
+                        self.results.put(("file", i, df_element, future.result()))
+                finally:
+                    # the files not started yet are cancelled, and the ones in progress are not waited for
+                    executor.shutdown(wait=False, cancel_futures=True)
+        except Exception as error:
+            self.results.put(("error", i, df_element, error))
+        self.results.put(("done", self.cancelled.is_set()))
+
+    def messages(self):
+        """ the messages on the queue now, without waiting for more """
+        while True:
+            try:
+                yield self.results.get_nowait()
+            except queue.Empty:
+                return
@@ -27,69 +27,41 @@
 #   version 0.4  09.28.20
 #       - change plot dpi 
 
-import os
 import tkinter as tk
-from StockData import StockData
+from StockData import StockData, file_label
+from StockDataLoader import StockDataLoader
+from MarketDataStore import symbol_from_filename
+from IndicatorCache import IndicatorCache
+from StockArrays import StockArrays
 import tkinter.font as tkFont
 from tkinter import *
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 from matplotlib.figure import Figure
+from matplotlib.collections import PolyCollection, LineCollection
+from matplotlib.colors import to_rgba
 from matplotlib import style
 from Common import *
 import pandas as pd
+import numpy as np
+import decimation
 style.use('ggplot')
 
 
-LOCATION_OF_DATA_FILES = "./StockMarketData/"  # initially data files are read from local storage
-
-
-def get_stock_data_files(data_interval):
-    """ Get all stock data files (.csv format) in the directory of interest
-        - data in csv format
-        - initially only IBM
-
-        Parameters:
-        -----------
-        LOCATION_OF_DATA_FILES: string of current base directory
-        data_interval: string: daily or Intraday (minute)
-        path_to_data_files:
-
-        Returns:
-        --------
-        list of files in directory of interest with .csv extension
-    """
-    path_to_data_files = LOCATION_OF_DATA_FILES
-    # choice of daily or minute data
-    if data_interval == "daily":
-        path_to_data_files = LOCATION_OF_DATA_FILES + "daily/OneYear"
-
-    elif data_interval == "minute":
-        path_to_data_files = LOCATION_OF_DATA_FILES + "Intraday/eachDay"
-
-    # find all csv filenames
-    location = path_to_data_files
-    files_in_dir = []
-
-    # r=>root, d=>directories, f=>files
-    for r, d, f in os.walk(location):
-        for item in f:
-            if '.csv' in item[-4:]:
-                files_in_dir.append(os.path.join(r, item))
-
-    for item in files_in_dir:
-        print("file in dir: ", item)
-
-    return files_in_dir
+LOCATION_OF_INDICATOR_CACHE = "./.indicator_cache/"  # cleaned up data and indicators of each data file
+LOADER_POLL_INTERVAL_MS = 100  # how often the main loop takes the results of the StockDataLoader
 
 
 class BaseWindow:
     """ This is the class for the Base Window. The Base window will include the data plots for stock market indicators
         and the Stock Ticker textbox.  nitially, data will be read from files; later on, data will be requested from
         stock market data site"""
-    def __init__(self, main_window, all_calculated_stock_data: StockData):
+    def __init__(self, main_window, stock_data_files, cache=None, max_workers=1):
         """ init function params:
             :param main_window tk.TK() base window param for display
-            :param all_calculated_stock_data list of data which was read from .csv files
+            :param stock_data_files list of the .csv files to choose the files of the stock ticker symbol from
+            :param cache IndicatorCache for the cleaned up data and indicators of each file, or None
+            :param max_workers int number of worker processes which process the files; 1 processes them on the
+                background thread and None uses all cores
 
             :param self.number_of_plots int  defines the number of plots to be displayed on the main chart page
             :param self.plot_layout int defines the grid pattern for plots
@@ -107,16 +79,29 @@ class BaseWindow:
                 :param self.helv10_bold tkFont
                 :param self.helv10 tkFont
             :param self.width_of_candlestick_bar int defines the width of the candlestick bar on the chart
+            :param self.line_decimation str "min_max" or "lttb"; how the indicator lines are decimated when the
+                visible range has more points than the charts have pixels
             :param self.main_frame tk.Frame  frame which holds the main frame which encompasses the main wincdow
             :param self.top_frame tk.Frame  frame which is at the top fo the window and holds the Stock Ticker name
                 and buttons
             :param self.chart_frame tk.Frame  frame which holds the data plots
             :param self.textbox_stock_tTicker tk.Entry  textbox which holds the stock ticker symbol
-            :param self.button_get_all_stock_data tk.Button  button which initiates drawing of the stock ticker data plots;
-                not implemented currently
+            :param self.button_get_all_stock_data tk.Button  button which initiates processing and drawing of the
+                data of the stock ticker symbol in the textbox
+            :param self.button_cancel tk.Button  button which cancels the processing of the data files
+            :param self.var_status tk.StringVar  progress of the processing of the data files
+            :param self.all_stock_data StockData  the data files processed so far
+            :param self.loader StockDataLoader  thread processing the data files; None when none is running
+            :param self.chart_series StockArrays  the data and indicators of all files concatenated, for the charts
+            :param self.drawn_range tuple  (start, stop, number of buckets) of the range drawn last
         """
 
-        self.all_stock_data = all_calculated_stock_data
+        self.main_window = main_window
+        self.stock_data_files = stock_data_files
+        self.cache = cache
+        self.max_workers = max_workers
+        self.all_stock_data = StockData([], run_strategies=False)
+        self.loader = None
 
         # Figure and layout params
         self.topFigure = Figure(figsize=(15, 8), dpi=85)
@@ -128,6 +113,7 @@ class BaseWindow:
         self.stochastics_plot_number = 4
         self.macd_plot_number = 5
         self.width_of_candlestick_bar = 0.88
+        self.line_decimation = "min_max"
 
         # Subplots for each indicator type
         # Use layout designations to add chart subplots
@@ -159,17 +145,29 @@ class BaseWindow:
                                               font=self.helv12)
         self.textbox_stock_tTicker.grid(column=0, row=0, sticky="NW", padx=(20, 0), pady=(10, 5))
 
-        # add button to initiate stock data retrieval and display to the top frame; not currently implemented
+        # add button to initiate stock data retrieval and display to the top frame
         self.button_get_stock_data = tk.Button(self.top_frame,
                                                text="Get Stock Data",
                                                fg="black",
                                                command=self.submit_contact_draw_stock_data_plots,
                                                font=self.helv12_bold)
         self.button_get_stock_data.grid(column=1, row=0, sticky="NW", padx=(20, 0), pady=(10, 0))
-        self.button_get_stock_data.state = "disabled"   # disabled for now
+
+        # add button to cancel the stock data retrieval, and its progress, to the top frame
+        self.button_cancel = tk.Button(self.top_frame,
+                                       text="Cancel",
+                                       fg="black",
+                                       command=self.cancel_stock_data,
+                                       font=self.helv12_bold,
+                                       state=DISABLED)
+        self.button_cancel.grid(column=2, row=0, sticky="NW", padx=(20, 0), pady=(10, 0))
+        self.var_status = tk.StringVar(self.top_frame, "")
+        self.label_status = tk.Label(self.top_frame, textvariable=self.var_status, bg="gainsboro", font=self.helv10)
+        self.label_status.grid(column=3, row=0, sticky="NW", padx=(20, 0), pady=(14, 0))
 
         # add the chart frame to the main frame
-        self.chart_frame = tk.Frame(self.main_frame, width=1200, height=720, bg="gainsboro", borderwidth=5, relief=RIDGE)
+        self.chart_frame = tk.Frame(self.main_frame, width=1200, height=720, bg="gainsboro", borderwidth=5,
+                                    relief=RIDGE)
         self.chart_frame.grid_propagate(False)
         self.chart_frame.grid(column=0, row=2, columnspan=2, sticky=E+W+N+S, padx=(0, 0), pady=(0, 0))
 
@@ -185,161 +183,259 @@ class BaseWindow:
         self.canvas1.get_tk_widget().grid(column=0, row=1, sticky=E+W+N+S)
         toolbar1 = NavigationToolbar2Tk(self.canvas1, self.chart_frame)
         toolbar1.grid(column=0, row=0)
+        self.toolbar1 = toolbar1
 
-        # since button is not implemented, automatically draw chart
-        self.submit_contact_draw_stock_data_plots()
-
-    def submit_contact_draw_stock_data_plots(self):
-        """ process the drawing of the stock indicator charts """
+        # draw the charts again at the level of detail of the visible range when the toolbar zooms or pans
+        self.chart_series = None
+        self.drawn_range = None
+        self.create_chart_artists()
         ax1, ax2, ax3, ax4, ax5 = self.topFigure.get_axes()
         ax1.get_shared_x_axes().join(ax1, ax2, ax3, ax4, ax5)
+        for axes in self.topFigure.get_axes():
+            axes.callbacks.connect('xlim_changed', self.on_x_limits_changed)
 
-        self.plot_candlesticks()
-        self.plot_williams_r()
-        self.plot_momentum()
-        self.plot_stochastics()
-        self.plot_macd()
+        main_window.protocol("WM_DELETE_WINDOW", self.close)
 
-    def plot_candlesticks(self):
-        """ For the candlestick charts, draw each candlestick in the appropriate color, given the calculated bar size
-            and the color - green for positive day/minute, red for negative day/minute
+        # start with the data of the stock ticker symbol in the textbox; the window shows while it is processed
+        self.submit_contact_draw_stock_data_plots()
 
-        :param index_offset list holds length of each data set from the .csv files
-        :param this_offset list holds offset for each successive set of data
-        :param hi_day pd.Dataframe  holds the set of OHLC data for candlestick bars which are positive
-        :param lo_day pd.Dataframe  holds the set of OHLC data for candlestick bars which are negative
+    def create_chart_artists(self):
+        """ Create the artists of the charts, empty; drawing a range sets their data, so each chart keeps the same
+            few artists however many files are loaded
 
-        :return: None
-        """
-        # Concatenate the data from all files in the directory to create a single plot which covers the date range
-        index_offset = []
-        this_offset = 0
-        candles_data = self.all_stock_data.list_candlestick_stock_data
-        for i in range(0, len(candles_data)):
-            hi_day = candles_data[i][CommonDefs.INDEX_OF_CANDLESTICK_PLOT_DATA]["hi_day"]
-            lo_day = candles_data[i][CommonDefs.INDEX_OF_CANDLESTICK_PLOT_DATA]["lo_day"]
-
-            # make the indices sequential by incrementing by previous number of data points
-            if i == 0:
-                index_offset.append(len(candles_data[i][CommonDefs.INDEX_OF_OHLC_DATA]['Close'].index))
-                index = [x for x in candles_data[i]
-                         [CommonDefs.INDEX_OF_OHLC_DATA]['Close'].index]
-            else:
-                this_offset = this_offset + len(candles_data[i-1][CommonDefs.INDEX_OF_OHLC_DATA]['Close'].index)
-                index = [x + this_offset for x in candles_data[i]
-                            [CommonDefs.INDEX_OF_OHLC_DATA]['Close'].index]
-
-            # add MA plots; use sequential index
-            ma_21d_data = candles_data[i][CommonDefs.INDEX_OF_OHLC_DATA] \
-                            ['Close'].rolling(window=21, min_periods=21).mean()
-            ma_55_data = candles_data[i][CommonDefs.INDEX_OF_OHLC_DATA] \
-                            ['Close'].rolling(window=55, min_periods=55).mean()
-            ma_89_data = candles_data[i][CommonDefs.INDEX_OF_OHLC_DATA] \
-                                            ['Close'].rolling(window=89, min_periods=89).mean()
-            self.stock_chart_subplot.plot(index, ma_21d_data, color='red')
-            self.stock_chart_subplot.plot(index, ma_55_data, color='yellow')
-            self.stock_chart_subplot.plot(index, ma_89_data, color='green')
-
-            # add Candlestick bars
-            # up day/minute
-            index = [x + this_offset for x in hi_day['Close'].index]
-            self.stock_chart_subplot.bar(index, hi_day['Close'] - hi_day['Open'],
-                                         bottom=hi_day['Open'], width=self.width_of_candlestick_bar, color='green')
-            # down day/minute
-            index = [x + this_offset for x in lo_day['Close'].index]
-            self.stock_chart_subplot.bar(index, lo_day['Open'] - lo_day['Close'],
-                                         bottom=lo_day['Close'], width=self.width_of_candlestick_bar, color='red')
-
-    def plot_williams_r(self):
-        """ plot the Williams %R as a series, with a sequential index which covers the entire data range
-
-            :param index_len int which has the number of stock ticker data sets - one per file
-            :param williams_data list of all williams_data for the data sets
+            :param self.chart_lines dict  line of each indicator, by its column name in the chart series
+            :param self.candlestick_bars PolyCollection  the bodies of all candlesticks drawn
+            :param self.candlestick_bounds LineCollection  the lines from the low to the high of each candlestick
+                drawn for a bucket of bars
         """
-        index_len = 0
-        for i in range(len(self.all_stock_data.list_candlestick_stock_data)):
-            williams_data = self.all_stock_data.list_candlestick_stock_data[i][CommonDefs.INDEX_OF_WILLIAMS_DATA]['%R']
-
-            # make sequential index across all data sets
-            index = [x + index_len for x in williams_data.index]
-            self.williams_ChartSubplot.plot(index, williams_data, color='green')
-            index_len = index_len + len(index)
+        self.chart_lines = {}
+        for axes, name, color in [(self.stock_chart_subplot, "MA_21", 'red'),
+                                  (self.stock_chart_subplot, "MA_55", 'yellow'),
+                                  (self.stock_chart_subplot, "MA_89", 'green'),
+                                  (self.williams_ChartSubplot, "%R", 'green'),
+                                  (self.momentum_ChartSubplot, "momentum", 'blue'),
+                                  (self.stochastics_ChartSubplot, "%K", 'gray'),
+                                  (self.stochastics_ChartSubplot, "%D", 'orange'),
+                                  (self.macd_ChartSubplot, "MACDsign_12_26", 'blue'),
+                                  (self.macd_ChartSubplot, "MACD_12_26", 'red')]:
+            self.chart_lines[name], = axes.plot([], [], color=color)
+        self.candlestick_bars = PolyCollection([], edgecolors='none')
+        self.candlestick_bounds = LineCollection([], linewidths=0.5)
+        self.stock_chart_subplot.add_collection(self.candlestick_bars)
+        self.stock_chart_subplot.add_collection(self.candlestick_bounds)
+
+    def select_stock_data_files(self, stock_ticker):
+        """ the data files of a stock ticker symbol, taken from the file names; all files when it is empty """
+        stock_ticker = stock_ticker.strip().upper()
+        if not stock_ticker:
+            return list(self.stock_data_files)
+        return [filename for filename in self.stock_data_files if symbol_from_filename(filename) == stock_ticker]
 
-    def plot_momentum(self):
-        """ plot the Momentum as a series, with a sequential index which covers the entire data range
-
-            :param index_len int which has the number of stock ticker data sets - one per file
-            :param momentum_data list of all momentum_data for the data sets
+    def submit_contact_draw_stock_data_plots(self):
+        """ process the drawing of the stock indicator charts: start processing the data files of the stock ticker
+            symbol in the textbox on a StockDataLoader thread, in place of any still running, and clear the charts;
+            they are drawn again each time more files are ready """
+        if self.loader is not None:
+            self.loader.cancel()
+            self.loader = None
+
+        stock_ticker = self.var_stock_ticker.get()
+        files = self.select_stock_data_files(stock_ticker)
+        self.all_stock_data = StockData([], run_strategies=False)
+        self.clear_charts()
+        if not files:
+            self.button_cancel.config(state=DISABLED)
+            self.var_status.set("No data files for " + stock_ticker)
+            return
+
+        self.loader = StockDataLoader(files, cache=self.cache, max_workers=self.max_workers, verbose=True)
+        self.loader.start()
+        self.button_cancel.config(state=NORMAL)
+        self.var_status.set("Processing 0 of " + str(len(files)) + " files")
+        self.main_window.after(LOADER_POLL_INTERVAL_MS, self.poll_stock_data_loader, self.loader)
+
+    def poll_stock_data_loader(self, loader):
+        """ take the results of the files the loader has finished since the last poll, print the trades of their
+            strategies, add them to the stock data and draw the charts again; poll again until the loader is done
+
+            :param loader StockDataLoader  the loader this poll was scheduled for; a loader which has been
+                replaced by a newer one is only polled for the trades of the files it finished until it is done
         """
-        index_len = 0
-        for i in range(len(self.all_stock_data.list_candlestick_stock_data)):
-            momentum_data = self.all_stock_data.list_candlestick_stock_data[i][CommonDefs.INDEX_OF_MOMENTUM_DATA]['momentum']
-
-            # make sequential index across all data sets
-            index = [x + index_len for x in momentum_data.index]
-            self.momentum_ChartSubplot.plot(index, momentum_data, color='blue')
-            index_len = index_len + len(index)
+        if loader is not self.loader:
+            for message in loader.messages():
+                if message[0] == "file":
+                    print(message[3][4], end="")
+                elif message[0] == "done":
+                    return
+            self.main_window.after(LOADER_POLL_INTERVAL_MS, self.poll_stock_data_loader, loader)
+            return
+        number_of_files = len(loader.list_of_stock_data_in_df)
+        files_added = False
+        error_message = None
+        done = False
+        cancelled = False
+        for message in loader.messages():
+            if message[0] == "file":
+                _, i, df_element, result = message
+                print(result[4], end="")
+                self.all_stock_data.add_processed_file(df_element, result)
+                files_added = True
+            elif message[0] == "error":
+                _, i, df_element, error = message
+                error_message = "Error in " + file_label(df_element, i) + ": " + str(error)
+                print(error_message)
+            else:
+                done = True
+                cancelled = message[1]
+
+        number_processed = len(self.all_stock_data.get_stock_arrays())
+        if files_added:
+            self.draw_stock_data()
+            self.var_status.set("Processing " + str(number_processed) + " of " + str(number_of_files) + " files")
+        if not done:
+            self.main_window.after(LOADER_POLL_INTERVAL_MS, self.poll_stock_data_loader, loader)
+            return
+
+        self.loader = None
+        self.button_cancel.config(state=DISABLED)
+        if error_message is not None:
+            self.var_status.set(error_message)
+        elif cancelled:
+            self.var_status.set("Cancelled after " + str(number_processed) + " of " + str(number_of_files) + " files")
+        else:
+            self.var_status.set(str(number_processed) + " files")
+            self.all_stock_data.print_overall_profit()
+
+    def cancel_stock_data(self):
+        """ cancel the processing of the data files; the files processed so far stay on the charts """
+        if self.loader is not None:
+            self.loader.cancel()
+            self.var_status.set("Cancelling")
+
+    def close(self):
+        """ cancel the processing of the data files and close the window """
+        if self.loader is not None:
+            self.loader.cancel()
+        self.main_window.destroy()
+
+    def clear_charts(self):
+        """ remove the data from the charts and let their limits fit the data drawn next """
+        self.chart_series = None
+        self.drawn_range = None
+        for line in self.chart_lines.values():
+            line.set_data([], [])
+        self.candlestick_bars.set_verts([])
+        self.candlestick_bounds.set_segments([])
+        for axes in self.topFigure.get_axes():
+            axes.set_autoscale_on(True)
+        # forget the zoom and pan of the data drawn before
+        self.toolbar1.update()
+        self.canvas1.draw_idle()
+
+    def draw_stock_data(self):
+        """ draw the data of the files processed so far; the visible range stays as it is if the toolbar has zoomed
+            or panned """
+        # Concatenate the data from all files in the directory to create a single plot which covers the date range;
+        # the moving averages and indicators are the ones StockData calculated
+        self.chart_series = StockArrays.concatenate(self.all_stock_data.get_stock_arrays())
+        if self.stock_chart_subplot.get_autoscalex_on():
+            start, stop = 0, len(self.chart_series)
+        else:
+            start, stop = decimation.visible_range(len(self.chart_series), self.stock_chart_subplot.get_xlim())
+        self.draw_visible_range(start, stop)
+        self.canvas1.draw_idle()
+
+    def on_x_limits_changed(self, axes):
+        """ when the navigation toolbar zooms or pans, draw the visible range again at the level of detail which
+            fits the width of the charts; the charts share the x axis, so each change is drawn once """
+        if self.chart_series is None:
+            return
+        start, stop = decimation.visible_range(len(self.chart_series), axes.get_xlim())
+        if (start, stop, self.number_of_buckets()) != self.drawn_range:
+            self.draw_visible_range(start, stop)
+            self.canvas1.draw_idle()
+
+    def number_of_buckets(self):
+        """ number of points the charts can show side by side: one per pixel of their width """
+        return max(int(self.stock_chart_subplot.bbox.width), 1)
+
+    def draw_visible_range(self, start, stop):
+        """ draw the data from position start to stop in each chart, replacing what was drawn before, and fit the
+            limits of the charts to it unless the toolbar has set them """
+        self.drawn_range = (start, stop, self.number_of_buckets())
+        for name, line in self.chart_lines.items():
+            line.set_data(*self.decimate_line(name, start, stop))
+        candlestick_corners = self.plot_candlesticks(start, stop)
+
+        for axes in self.topFigure.get_axes():
+            axes.relim()
+        # relim leaves out collections
+        self.stock_chart_subplot.update_datalim(candlestick_corners)
+        for axes in self.topFigure.get_axes():
+            axes.autoscale_view()
+
+    def decimate_line(self, name, start, stop):
+        """ positions and values of the points of a series to draw from start to stop, decimated with
+            self.line_decimation when there are more of them than the charts have pixels """
+        number_of_buckets = self.drawn_range[2]
+        if self.line_decimation == "lttb":
+            return decimation.decimate_lttb(self.chart_series[name], start, stop, 2 * number_of_buckets)
+        return decimation.decimate_min_max(self.chart_series[name], start, stop, number_of_buckets)
+
+    def plot_candlesticks(self, start, stop):
+        """ For the candlestick charts, draw each candlestick in the appropriate color, given the calculated bar size
+            and the color - green for positive day/minute, red for negative day/minute. When there are more bars
+            than pixels, consecutive bars are drawn as one candlestick of their bucket, as wide as the bucket, with
+            a line from the lowest low to the highest high of the bucket.
 
-    def plot_stochastics(self):
-        """ plot the stochastics %K and %D as series, with a sequential index which covers the entire data range
+        :param start int position of the first bar to draw
+        :param stop int position one past the last bar to draw
+        :param size array holds the number of bars in each candlestick drawn
+        :param hi_day array holds True for the candlesticks which are positive
+        :param drawn array holds True for the candlesticks which are positive or negative
 
-            :param index_len int which has the number of stock ticker data sets - one per file
-            :param stoch_k_data list of all stoch_k_data for the data sets
-            :param stoch_d_data list of all stoch_d_data for the data sets
-        """
-        index_len = 0
-        for i in range(len(self.all_stock_data.list_candlestick_stock_data)):
-            stoch_k_data = self.all_stock_data.list_candlestick_stock_data[i][CommonDefs.INDEX_OF_STOCHASTICS_DATA]['%K']
-            stoch_d_data = self.all_stock_data.list_candlestick_stock_data[i][CommonDefs.INDEX_OF_STOCHASTICS_DATA]['%D']
-
-            # make sequential index across all data sets
-            index = [x + index_len for x in stoch_k_data.index]
-            self.stochastics_ChartSubplot.plot(index, stoch_k_data, color='gray')
-            index = [x + index_len for x in stoch_d_data.index]
-            self.stochastics_ChartSubplot.plot(index, stoch_d_data, color='orange')
-            index_len = index_len + len(index)
-
-    def plot_macd(self):
-        """ plot the MACD and MACD signal as a series, with a sequential index which covers the entire data range
-
-            :param index_len int which has the number of stock ticker data sets - one per file
-            :param macd_data list of all macd data for the data sets
-            :param macd_data_signal list of all macd_signal_data for the data sets
+        :return: array of the (x, y) corners of the candlestick bars drawn
         """
-        index_len = 0
-        for i in range(len(self.all_stock_data.list_candlestick_stock_data)):
-            macd_data = self.all_stock_data.list_candlestick_stock_data[i] \
-                                [CommonDefs.INDEX_OF_MACD_DATA]["macd"]['MACD_12_26']
-            macd_data_signal = self.all_stock_data.list_candlestick_stock_data[i] \
-                                [CommonDefs.INDEX_OF_MACD_DATA]["macd"]["MACDsign_12_26"]
-
-            # make sequential index across all data sets
-            index = [x + index_len for x in macd_data_signal.index]
-            self.macd_ChartSubplot.plot(index, macd_data_signal, color='blue')
-            index = [x + index_len for x in macd_data_signal.index]
-            self.macd_ChartSubplot.plot(index, macd_data, color='red')
-            index_len = index_len + len(index)
+        index, size, open_data, high_data, low_data, close_data = decimation.decimate_ohlc(
+            self.chart_series["Open"], self.chart_series["High"], self.chart_series["Low"],
+            self.chart_series["Close"], start, stop, self.drawn_range[2])
+        hi_day = open_data < close_data
+        drawn = hi_day | (open_data > close_data)
+        index, size, open_data, high_data, low_data, close_data, hi_day = (
+            index[drawn], size[drawn], open_data[drawn], high_data[drawn], low_data[drawn], close_data[drawn],
+            hi_day[drawn])
+        colors = np.where(hi_day[:, np.newaxis], to_rgba('green'), to_rgba('red'))
+
+        # one rectangle per bar from the open to the close
+        half_width = size * self.width_of_candlestick_bar / 2
+        left, right = index - half_width, index + half_width
+        bottom, top = np.minimum(open_data, close_data), np.maximum(open_data, close_data)
+        bars = np.stack([np.column_stack([left, bottom]), np.column_stack([left, top]),
+                         np.column_stack([right, top]), np.column_stack([right, bottom])], axis=1)
+        self.candlestick_bars.set_verts(bars)
+        self.candlestick_bars.set_facecolor(colors)
+
+        # the low to high lines only for buckets of bars, as the bars themselves are drawn without them
+        if (size > 1).any():
+            self.candlestick_bounds.set_segments(np.stack([np.column_stack([index, low_data]),
+                                                           np.column_stack([index, high_data])], axis=1))
+            self.candlestick_bounds.set_color(colors)
+        else:
+            self.candlestick_bounds.set_segments([])
+        return bars.reshape(-1, 2)
 
 
 if __name__ == "__main__":
     #get filenames for all.csv files in the directory of interest
     stock_data_files = get_stock_data_files("minute")  # minute or daily data
 
-    # put data in list in pandas frame
-    list_all_stock_data_in_df = []
-    for filename in stock_data_files:
-        df_all_data = pd.read_csv(filename)  # one day of data
-        list_all_stock_data_in_df.append(df_all_data)
-
-    # for the list of all stock data for each file, calculate all indicators and run the backtest strategies
-    # in preparation for display of the data
-    # AllStockData has the list of all raw and and calculated stock market data and indicators
-    AllStockData = StockData(list_all_stock_data_in_df)
-
     # main window
     win = tk.Tk()
     win.title("Stock Data BackTest Analysis")
     win.resizable(False, False)
 
-    app = BaseWindow(win, AllStockData)
+    # for the files of the stock ticker symbol, calculate all indicators and run the backtest strategies on a
+    # background thread, drawing the charts as each file is ready; each file is read (one day of data) only if its
+    # cleaned up data and indicators are not in the cache already
+    app = BaseWindow(win, stock_data_files, cache=IndicatorCache(LOCATION_OF_INDICATOR_CACHE))
     win.mainloop()
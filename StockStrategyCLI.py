@@ -0,0 +1,266 @@
+""" Stock Strategy Backtest from the command line
+    Runs the same clean up, indicators and backtest strategies as StockStrategy.py, without a window: nothing from
+    tkinter or matplotlib is imported, so it runs on a server without a display. pandas and the rest of the
+    pipeline are imported only once the arguments are parsed, so --help and argument errors return at once.
+
+    With --portfolio, the symbols are backtested together by PortfolioBackTest on a shared timestamp index, and the
+    results are per symbol instead of per file. With --timeframe, the bars of each symbol are aggregated to that
+    timeframe, e.g. 5 minute bars from the minute data, before the backtests. With --trade-log, the trades are
+    written to a .csv, .parquet or .jsonl file as records by a TradeLog, instead of as text.
+
+    Usage: python StockStrategyCLI.py [--interval minute|daily | --data-dir DIR | --store DIR] [--symbols IBM ...]
+                                      [--start DATE] [--end DATE] [--timeframe 5min] [--format text|json|csv]
+                                      [--output FILE] [--cache DIR] [--workers N] [--trace FILE] [--portfolio]
+                                      [--trade-log FILE] [--log-level summary|trades|decisions]
+"""
+import argparse
+import contextlib
+import sys
+
+from Common import get_stock_data_files
+
+RESULT_FIELDS = ["file", "strategy", "profit", "winners", "losers", "trades"]
+
+
+def select_files(files, symbols):
+    """ the files whose stock ticker symbol, taken from the file name, is one of symbols; all files when None """
+    if not symbols:
+        return files
+    from MarketDataStore import symbol_from_filename
+    symbols = {symbol.upper() for symbol in symbols}
+    return [filename for filename in files if symbol_from_filename(filename) in symbols]
+
+
+def read_date_range(files, start, end):
+    """ Cleaned up data of each file limited to a date range; files with no data in the range are left out
+
+        :return: list of (file name, dataframe) pairs
+    """
+    import pandas as pd
+    from StockData import StockData, read_stock_data
+
+    data_sets = []
+    for filename in files:
+        stock_data = StockData.cleanup_stock_data(read_stock_data(filename))
+        dates = pd.to_datetime(stock_data["Date"])
+        in_range = pd.Series(True, index=stock_data.index)
+        if start is not None:
+            in_range = in_range & (dates >= pd.Timestamp(start))
+        if end is not None:
+            in_range = in_range & (dates < pd.Timestamp(end))
+        if in_range.any():
+            data_sets.append((filename, stock_data[in_range].reset_index(drop=True)))
+    return data_sets
+
+
+def load_resamplers(args):
+    """ BarResampler of the bars of each symbol, from the store or from its files
+
+        :return: dictionary of symbol to BarResampler
+    """
+    from BarResampler import BarResampler
+    from MarketDataStore import MarketDataStore, symbol_from_filename
+    if args.store:
+        store = MarketDataStore(args.store)
+        return {symbol.upper(): BarResampler.from_store(store, symbol.upper())
+                for symbol in args.symbols or store.symbols()}
+
+    files = select_files(sorted(get_stock_data_files(args.interval, location=args.data_dir, verbose=False)),
+                         args.symbols)
+    files_for_symbol = {}
+    for filename in files:
+        files_for_symbol.setdefault(symbol_from_filename(filename), []).append(filename)
+    return {symbol: BarResampler.from_files(symbol_files) for symbol, symbol_files in files_for_symbol.items()}
+
+
+def load_resampled_data_sets(args):
+    """ list of (name, dataframe) pairs to backtest with the bars of each symbol aggregated to args.timeframe; the
+        whole date range of a symbol is one data set, or each day one with --split-by-day """
+    data_sets = []
+    for symbol, resampler in load_resamplers(args).items():
+        sessions = resampler.sessions(args.timeframe, args.start, args.end) if args.split_by_day else \
+            [resampler.dataframe(args.timeframe, args.start, args.end)]
+        data_sets.extend((symbol + " " + args.timeframe + " " + str(i), session) for i, session in enumerate(sessions)
+                         if len(session))
+    return data_sets
+
+
+def data_source(args):
+    """ the store or directory the data sets are read from, for messages """
+    from Common import data_directory
+    if args.store:
+        return "the store " + args.store
+    return args.data_dir or data_directory(args.interval)
+
+
+def load_data_sets(args):
+    """ list of (name, data) pairs to backtest, where data is a .csv file path or a dataframe """
+    if args.timeframe:
+        return load_resampled_data_sets(args)
+    if args.store:
+        from MarketDataStore import MarketDataStore
+        store = MarketDataStore(args.store)
+        data_sets = []
+        for symbol in args.symbols or store.symbols():
+            sessions = store.load_sessions(symbol.upper(), args.start, args.end) if args.split_by_day else \
+                [store.load_dataframe(symbol.upper(), args.start, args.end)]
+            data_sets.extend((symbol.upper() + " " + str(i), session) for i, session in enumerate(sessions)
+                             if len(session))
+        return data_sets
+
+    files = sorted(get_stock_data_files(args.interval, location=args.data_dir, verbose=False))
+    files = select_files(files, args.symbols)
+    if args.start is None and args.end is None:
+        return [(filename, filename) for filename in files]
+    return read_date_range(files, args.start, args.end)
+
+
+def run_backtests(data_sets, args):
+    """ calculate the indicators of every data set and run each strategy on them
+
+        :return: list of result dictionaries with the RESULT_FIELDS, one per data set and strategy
+    """
+    from StockData import StockData
+    from BackTest import BackTest
+
+    cache = None
+    if args.cache:
+        from IndicatorCache import IndicatorCache
+        cache = IndicatorCache(args.cache)
+
+    all_stock_data = StockData([data for _, data in data_sets], run_strategies=False, max_workers=args.workers,
+                               cache=cache)
+    from TradeLog import data_set
+
+    # the trades are printed as text unless they go to a trade log
+    verbose = args.format == "text" and not args.trade_log
+    results = []
+    for (name, _), stock_arrays in zip(data_sets, all_stock_data.get_stock_arrays()):
+        back_test = BackTest(stock_arrays)
+        with data_set(name):
+            back_test.backtest_strategy_1(verbose=verbose)
+            back_test.backtest_strategy_2(verbose=verbose)
+        for strategy in [1, 2]:
+            strategy_result = back_test.strategy_results[strategy]
+            results.append({"file": name, "strategy": strategy, "profit": strategy_result["profit"],
+                            "winners": strategy_result["winners"], "losers": strategy_result["losers"],
+                            "trades": strategy_result["winners"] + strategy_result["losers"]})
+    return results
+
+
+def run_portfolio_backtest(args):
+    """ backtest each strategy on all symbols together
+
+        :return: list of result dictionaries with the RESULT_FIELDS, one per symbol and strategy, with the symbol
+            in place of the file
+    """
+    from PortfolioBackTest import PortfolioBackTest
+
+    if args.timeframe:
+        portfolio = PortfolioBackTest({symbol: resampler.dataframe(args.timeframe, args.start, args.end)
+                                       for symbol, resampler in load_resamplers(args).items()})
+    elif args.store:
+        from MarketDataStore import MarketDataStore
+        symbols = [symbol.upper() for symbol in args.symbols] if args.symbols else None
+        portfolio = PortfolioBackTest.from_store(MarketDataStore(args.store), symbols, args.start, args.end)
+    else:
+        files = sorted(get_stock_data_files(args.interval, location=args.data_dir, verbose=False))
+        portfolio = PortfolioBackTest.from_files(select_files(files, args.symbols), args.start, args.end)
+
+    results = []
+    for strategy in [1, 2]:
+        per_symbol = portfolio.backtest_strategy(strategy)
+        if args.format == "text":
+            print("\n************************************** Portfolio Strategy " + str(strategy) +
+                  " **************************************")
+            print(per_symbol.to_string())
+        for symbol, row in per_symbol.drop(index="TOTAL").iterrows():
+            results.append({"file": symbol, "strategy": strategy, "profit": float(row["profit"]),
+                            "winners": int(row["winners"]), "losers": int(row["losers"]),
+                            "trades": int(row["trades"])})
+    return results
+
+
+def write_results(results, output_format, stream):
+    """ write the results as JSON or CSV, or, for text, the overall profit of each strategy after the trades the
+        strategies printed """
+    if output_format == "json":
+        import json
+        overall = {str(strategy): sum(result["profit"] for result in results if result["strategy"] == strategy)
+                   for strategy in [1, 2]}
+        json.dump({"results": results, "overall_profit": overall}, stream, indent=1)
+        stream.write("\n")
+    elif output_format == "csv":
+        import csv
+        writer = csv.DictWriter(stream, fieldnames=RESULT_FIELDS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(results)
+    else:
+        for strategy in [1, 2]:
+            overall_profit = sum(result["profit"] for result in results if result["strategy"] == strategy)
+            print("\n overall_profit Strategy " + str(strategy) + " = ", overall_profit, file=stream)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backtest the stock strategies without the GUI")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--interval", choices=["minute", "daily"], default="minute",
+                        help="data files of this interval: ./StockMarketData/Intraday/eachDay for minute, "
+                             "./StockMarketData/daily/OneYear or else ./daily for daily")
+    source.add_argument("--data-dir", help="directory of .csv data files")
+    source.add_argument("--store", help="MarketDataStore directory to read the data from")
+    parser.add_argument("--symbols", nargs="+", help="stock ticker symbols to backtest; all when not given")
+    parser.add_argument("--start", help="first date/time to include, e.g. 2020-09-08")
+    parser.add_argument("--end", help="date/time to stop before")
+    parser.add_argument("--timeframe", help="aggregate the bars of each symbol to this timeframe first, e.g. 5min, "
+                                            "60min or 1D")
+    parser.add_argument("--split-by-day", action="store_true",
+                        help="with --store or --timeframe, backtest each day separately as with one intraday file "
+                             "per day")
+    parser.add_argument("--format", choices=["text", "json", "csv"], default="text")
+    parser.add_argument("--output", help="file to write the results to; stdout when not given")
+    parser.add_argument("--cache", help="IndicatorCache directory for the cleaned up data and indicators")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="worker processes for the data files; 0 uses all cores")
+    parser.add_argument("--portfolio", action="store_true",
+                        help="backtest all symbols together on a shared timestamp index, with results per symbol")
+    parser.add_argument("--trace", help="record the time and memory of each stage and write them as a Chrome "
+                                        "trace to this file")
+    parser.add_argument("--trade-log", help="write the trades as records to this .csv, .parquet or .jsonl file "
+                                            "instead of printing them")
+    parser.add_argument("--log-level", choices=["summary", "trades", "decisions"], default="trades",
+                        help="records in the trade log: a summary per backtest, each trade too, or also the "
+                             "indicator values each trade was opened and closed on")
+    args = parser.parse_args(argv)
+    if args.workers == 0:
+        args.workers = None
+
+    with contextlib.ExitStack() as stack:
+        stream = stack.enter_context(open(args.output, "w")) if args.output else sys.stdout
+        instrumentation = None
+        if args.trace:
+            from Instrumentation import Instrumentation
+            instrumentation = stack.enter_context(Instrumentation())
+        if args.trade_log:
+            from TradeLog import TradeLog
+            stack.enter_context(TradeLog(args.log_level, args.trade_log))
+
+        # the strategies print their trades in text format; send them to the output too
+        if args.portfolio:
+            with contextlib.redirect_stdout(stream):
+                results = run_portfolio_backtest(args)
+        else:
+            data_sets = load_data_sets(args)
+            if not data_sets:
+                parser.error("no data to backtest in " + data_source(args) + "; give the directory of the .csv "
+                             "files with --data-dir")
+            with contextlib.redirect_stdout(stream):
+                results = run_backtests(data_sets, args)
+        write_results(results, args.format, stream)
+
+        if instrumentation is not None:
+            instrumentation.write_chrome_trace(args.trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+""" Short strategies written as rules instead of BackTest methods
+    A strategy is an entry rule, an optional exit rule and a trailing stop, e.g.
+
+        RuleStrategy(entry="williams_R(14) <= -75 and macd < macd_signal and slope(macd, 9) < -0.005",
+                     exit="slope(macd_signal, 9) > 0.0015", trailing_stop=0.45)
+
+    A rule is an expression of the indicators with comparisons, and, or, not, parentheses and + - * /:
+        close, open, high, low, volume          the price data
+        moving_average(n) or ma(n)              moving average of the close over n bars
+        williams_R(n), momentum(n)              Williams %R and momentum, with a lookback of n bars
+        stochastic_k(n), stochastic_d(n, s)     stochastics %K and %D
+        macd(f, s), macd_signal(f, s), macd_diff(f, s)
+        slope(expression, n)                    slope of the line fitted to the n bars before the current one, as
+                                                BackTest calculates the slopes of line
+        previous(expression, n)                 the value n bars (1 when not given) before
+        available(expression)                   True where the expression has a value (is not NaN)
+        abs(expression)
+    The indicators without parameters have the lookbacks StockData calculates, e.g. williams_R is williams_R(14),
+    and are the columns StockData calculated; with other lookbacks they are calculated from the price data.
+    Comparisons with a missing value (NaN) are False.
+
+    Each rule is parsed and checked once, into a tree of tuples. The tree is evaluated with whole arrays over the
+    bars of a data set, and IndicatorColumns keeps the array of every subexpression it evaluates, keyed by its tree,
+    so an indicator or expression used by several rules or several strategies is calculated once per data set. The
+    positions are then followed by BackTest.run_short_positions, as for the BackTest strategies.
+
+    Usage: python StrategyRules.py [FILE_OR_DIRECTORY ...] --entry RULE [--exit RULE] [--trailing-stop X]
+"""
+import argparse
+import ast
+import operator
+
+import numpy as np
+import pandas as pd
+
+from BackTest import BackTest
+from StockData import INDICATOR_PARAMETERS
+from TradeLog import OFF, log_level, log_trades, log_summary
+from indicators import moving_average, stochastic_oscillator_k, stochastic_oscillator_d, williams_R, momentum, \
+    macd, rolling_slopes
+
+DEFAULT_RULES_DIRECTORY = "./StockMarketData/Intraday/eachDay"
+
+# the lookbacks of each indicator when a rule gives none; None where the rule has to give them
+INDICATOR_DEFAULTS = {
+    "moving_average": None,
+    "williams_R": (INDICATOR_PARAMETERS["williams"],),
+    "momentum": (INDICATOR_PARAMETERS["momentum"],),
+    "stochastic_k": (INDICATOR_PARAMETERS["stochastics"],),
+    "stochastic_d": (INDICATOR_PARAMETERS["stochastics"], INDICATOR_PARAMETERS["stochastics_smoothing"]),
+    "macd": (INDICATOR_PARAMETERS["macd_fast"], INDICATOR_PARAMETERS["macd_slow"]),
+    "macd_signal": (INDICATOR_PARAMETERS["macd_fast"], INDICATOR_PARAMETERS["macd_slow"]),
+    "macd_diff": (INDICATOR_PARAMETERS["macd_fast"], INDICATOR_PARAMETERS["macd_slow"]),
+}
+INDICATOR_ALIASES = {"ma": "moving_average", "williams_r": "williams_R"}
+PRICE_COLUMNS = {"close": "Close", "open": "Open", "high": "High", "low": "Low", "volume": "Volume"}
+
+COMPARISONS = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+ARITHMETIC = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+BOOLEAN_KINDS = {"and", "or", "not", "available"} | set(COMPARISONS.values())
+OPERATIONS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "==": operator.eq,
+              "!=": operator.ne, "+": operator.add, "-": operator.sub, "*": operator.mul, "/": operator.truediv}
+
+
+def compile_rule(rule):
+    """ Parse a rule into its tree: nested tuples whose first item is the kind of node, with the default lookbacks
+        filled in, so equal subexpressions have equal trees
+
+        :param rule: string rule as described above
+        :return: tuple tree of the rule
+    """
+    try:
+        expression = ast.parse(rule.strip(), mode="eval").body
+    except SyntaxError as error:
+        raise ValueError("rule is not a valid expression: " + rule + " (" + str(error.msg) + ")")
+    tree = _compile_node(expression, rule)
+    if not _check_types(tree, rule):
+        raise ValueError("rule is a value, not a condition: " + rule)
+    return tree
+
+
+def _check_types(tree, rule):
+    """ True when a tree is a condition (a boolean array), False when it is a value (a float array); raises
+        ValueError where a condition is used as a value or a value as a condition """
+    kind = tree[0]
+    if kind in ("number", "column", "indicator"):
+        return False
+    children = [child for child in tree[1:] if isinstance(child, tuple)]
+    children_are_conditions = [_check_types(child, rule) for child in children]
+    if kind in ("and", "or", "not"):
+        if not all(children_are_conditions):
+            raise ValueError(kind + " needs conditions, such as comparisons, not values in rule: " + rule)
+    elif any(children_are_conditions):
+        raise ValueError(kind + " needs values, not conditions, in rule: " + rule)
+    return kind in BOOLEAN_KINDS
+
+
+def _compile_node(node, rule):
+    if isinstance(node, ast.BoolOp):
+        return ("and" if isinstance(node.op, ast.And) else "or",) + \
+            tuple(_compile_node(value, rule) for value in node.values)
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+        return ("not", _compile_node(node.operand, rule))
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _compile_node(node.operand, rule)
+        if operand[0] == "number":
+            return ("number", -operand[1] if isinstance(node.op, ast.USub) else operand[1])
+        return ("-", ("number", 0.0), operand) if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.Compare):
+        # a < b < c is a < b and b < c
+        operands = [_compile_node(node.left, rule)] + [_compile_node(value, rule) for value in node.comparators]
+        comparisons = []
+        for i, comparison in enumerate(node.ops):
+            if type(comparison) not in COMPARISONS:
+                raise ValueError("unsupported comparison in rule: " + rule)
+            comparisons.append((COMPARISONS[type(comparison)], operands[i], operands[i + 1]))
+        return comparisons[0] if len(comparisons) == 1 else ("and",) + tuple(comparisons)
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        return (ARITHMETIC[type(node.op)], _compile_node(node.left, rule), _compile_node(node.right, rule))
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return ("number", float(node.value))
+    if isinstance(node, ast.Name):
+        return _compile_call(node.id, [], rule)
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+        return _compile_call(node.func.id, node.args, rule)
+    raise ValueError("unsupported expression " + ast.dump(node) + " in rule: " + rule)
+
+
+def _lookback(argument, rule):
+    """ int lookback given as an argument of an indicator """
+    if not (isinstance(argument, ast.Constant) and isinstance(argument.value, int) and argument.value > 0):
+        raise ValueError("lookbacks must be positive whole numbers in rule: " + rule)
+    return argument.value
+
+
+def _compile_call(name, arguments, rule):
+    if name in PRICE_COLUMNS and not arguments:
+        return ("column", PRICE_COLUMNS[name])
+    if name in ("slope", "previous"):
+        if not 1 <= len(arguments) <= 2 or (name == "slope" and len(arguments) != 2):
+            raise ValueError(name + " takes an expression and a number of bars in rule: " + rule)
+        bars = _lookback(arguments[1], rule) if len(arguments) == 2 else 1
+        return (name, _compile_node(arguments[0], rule), bars)
+    if name in ("available", "abs"):
+        if len(arguments) != 1:
+            raise ValueError(name + " takes one expression in rule: " + rule)
+        return (name, _compile_node(arguments[0], rule))
+
+    name = INDICATOR_ALIASES.get(name, name)
+    if name not in INDICATOR_DEFAULTS:
+        raise ValueError("unknown name " + name + " in rule: " + rule)
+    lookbacks = tuple(_lookback(argument, rule) for argument in arguments) or INDICATOR_DEFAULTS[name]
+    expected = 1 if name == "moving_average" else len(INDICATOR_DEFAULTS[name])
+    if lookbacks is None or len(lookbacks) != expected:
+        raise ValueError(name + " takes " + str(expected) + " lookback(s) in rule: " + rule)
+    return ("indicator", name, lookbacks)
+
+
+def warm_up(tree):
+    """ number of bars before the value of a tree can be available, from the lookbacks in it; the first data point
+        at which a strategy opens positions when none is given """
+    kind = tree[0]
+    if kind in ("number", "column"):
+        return 0
+    if kind == "indicator":
+        name, lookbacks = tree[1], tree[2]
+        if name in ("williams_R", "momentum"):
+            return lookbacks[0] + 1
+        if name == "stochastic_d":
+            return 2 * lookbacks[0]
+        if name in ("macd_signal", "macd_diff"):
+            return lookbacks[1] + 9
+        return lookbacks[-1]
+    if kind == "slope":
+        return warm_up(tree[1]) + tree[2] + 1
+    if kind == "previous":
+        return warm_up(tree[1]) + tree[2]
+    return max(warm_up(child) for child in tree[1:] if isinstance(child, tuple))
+
+
+class IndicatorColumns:
+    def __init__(self, stock_arrays):
+        """ Evaluator of rule trees over the bars of one data set
+
+            :param stock_arrays: StockArrays of the data set, with the columns StockData calculates
+            :param self.values: dictionary of tree to the array of its values, for every tree evaluated so far
+            :param self.dataframe: dataframe of the price data, made when an indicator has to be calculated
+        """
+        self.stock_arrays = stock_arrays
+        self.values = {}
+        self.dataframe = None
+
+    def evaluate(self, tree):
+        """ array of the values of a tree, a float array or, for comparisons and and/or/not, a boolean array """
+        if tree not in self.values:
+            self.values[tree] = self.calculate(tree)
+        return self.values[tree]
+
+    def calculate(self, tree):
+        kind = tree[0]
+        if kind == "number":
+            return np.full(len(self.stock_arrays), tree[1])
+        if kind == "column":
+            return self.stock_arrays[tree[1]]
+        if kind == "indicator":
+            return self.indicator(tree[1], tree[2])
+        if kind == "and":
+            return np.logical_and.reduce([self.evaluate(child) for child in tree[1:]])
+        if kind == "or":
+            return np.logical_or.reduce([self.evaluate(child) for child in tree[1:]])
+        if kind == "not":
+            return ~self.evaluate(tree[1])
+        if kind == "available":
+            return ~np.isnan(self.evaluate(tree[1]))
+        if kind == "abs":
+            return np.abs(self.evaluate(tree[1]))
+        if kind == "slope":
+            # as BackTest.calculate_slopes_of_line: the window ends on the bar before
+            slopes = rolling_slopes(self.evaluate(tree[1]), [tree[2]]).to_numpy()[:, 0]
+            return np.concatenate(([np.nan], slopes[:-1]))
+        if kind == "previous":
+            values = np.asarray(self.evaluate(tree[1]), dtype=float)
+            bars = min(tree[2], len(values))
+            return np.concatenate((np.full(bars, np.nan), values[:len(values) - bars]))
+        left = self.evaluate(tree[1])
+        right = self.evaluate(tree[2])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = OPERATIONS[kind](left, right)
+        if kind in COMPARISONS.values():
+            # a comparison with a missing value is False, != included
+            values = values & ~np.isnan(left) & ~np.isnan(right)
+        return values
+
+    def indicator(self, name, lookbacks):
+        """ array of an indicator: the column StockData calculated when the lookbacks are the same, otherwise
+            calculated from the price data with the functions of indicators.py """
+        stock_arrays = self.stock_arrays
+        column = {("williams_R", INDICATOR_DEFAULTS["williams_R"]): "%R",
+                  ("momentum", INDICATOR_DEFAULTS["momentum"]): "momentum",
+                  ("stochastic_k", INDICATOR_DEFAULTS["stochastic_k"]): "%K",
+                  ("stochastic_d", INDICATOR_DEFAULTS["stochastic_d"]): "%D"}.get((name, lookbacks))
+        if name == "moving_average":
+            column = "MA_" + str(lookbacks[0])
+        elif name.startswith("macd"):
+            column = {"macd": "MACD_", "macd_signal": "MACDsign_", "macd_diff": "MACDdiff_"}[name] + \
+                str(lookbacks[0]) + "_" + str(lookbacks[1])
+        if column is not None and column in stock_arrays:
+            return stock_arrays[column]
+
+        if self.dataframe is None:
+            self.dataframe = pd.DataFrame({column: stock_arrays[column]
+                                           for column in ["Open", "High", "Low", "Close"]})
+        df = self.dataframe
+        if name == "moving_average":
+            return moving_average(df, lookbacks[0]).iloc[:, 0].to_numpy()
+        if name == "williams_R":
+            return williams_R(df, lookbacks[0]).to_numpy()
+        if name == "momentum":
+            return momentum(df, lookbacks[0]).to_numpy()
+        if name == "stochastic_k":
+            return stochastic_oscillator_k(df, lookbacks[0]).to_numpy()
+        if name == "stochastic_d":
+            stoch_osc_k = pd.Series(self.evaluate(("indicator", "stochastic_k", lookbacks[:1])), index=df.index)
+            return stochastic_oscillator_d(df, lookbacks[0], lookbacks[1], stoch_osc_k=stoch_osc_k).to_numpy()
+        macd_data = macd(df, lookbacks[0], lookbacks[1])
+        return macd_data[column].to_numpy()
+
+
+class RuleStrategy:
+    def __init__(self, entry, exit=None, trailing_stop=None, name="rules", first_data_point=None,
+                 trailing_stop_from_prior_close=False, check_trailing_stop_first=True):
+        """ Short strategy given by rules
+
+            :param entry: string rule; a position is opened on a bar where it holds
+            :param exit: optional string rule; an open position is closed on a bar where it holds
+            :param trailing_stop: optional float distance of the trailing stop above the lowest price after purchase
+            :param name: string key of the results in BackTest.strategy_results
+            :param first_data_point: int first bar at which a position can be opened; the warm up of the entry rule
+                when None
+            :param trailing_stop_from_prior_close, check_trailing_stop_first: how the trailing stop is followed, as
+                for BackTest.run_short_positions; strategy 1 resets it from the prior close and checks it after,
+                strategy 2 checks it first
+        """
+        self.entry = compile_rule(entry)
+        self.exit = compile_rule(exit) if exit else None
+        self.trailing_stop = trailing_stop
+        self.name = name
+        self.first_data_point = warm_up(self.entry) if first_data_point is None else first_data_point
+        self.trailing_stop_from_prior_close = trailing_stop_from_prior_close
+        self.check_trailing_stop_first = check_trailing_stop_first
+
+    def signals(self, indicator_columns):
+        """ entry and exit signals, as boolean arrays over the bars of the data set """
+        number_of_data_points = len(indicator_columns.stock_arrays)
+        entry_signals = np.broadcast_to(indicator_columns.evaluate(self.entry), (number_of_data_points,))
+        if self.exit is None:
+            exit_signals = np.zeros(number_of_data_points, dtype=bool)
+        else:
+            exit_signals = np.broadcast_to(indicator_columns.evaluate(self.exit), (number_of_data_points,))
+        return entry_signals.astype(bool), exit_signals.astype(bool)
+
+    def backtest(self, back_test, indicator_columns=None):
+        """ Run the strategy on the data of a BackTest, keeping the profit, winners, losers and trades in
+            back_test.strategy_results[self.name], so back_test.trade_list(self.name) lists its trades
+
+            :param indicator_columns: IndicatorColumns of the same data, to share the values of the rules with
+                other strategies; a new one when None
+            :return: float profit in dollars
+        """
+        if indicator_columns is None:
+            indicator_columns = IndicatorColumns(back_test.stock_arrays)
+        entry_signals, exit_signals = self.signals(indicator_columns)
+        trailing_stop = np.inf if self.trailing_stop is None else self.trailing_stop
+        trades = back_test.run_short_positions(self.first_data_point, entry_signals, exit_signals, trailing_stop,
+                                               self.trailing_stop_from_prior_close, self.check_trailing_stop_first)
+        back_test.strategy_results[self.name] = {"trades": trades}
+        profit = back_test.trade_list(self.name)["profit"]
+        back_test.strategy_results[self.name].update({"profit": float(profit.sum()),
+                                                      "winners": int((profit > 0).sum()),
+                                                      "losers": int((profit <= 0).sum())})
+        if log_level() != OFF:
+            log_trades(self.name, back_test.stock_arrays.dates, back_test.stock_arrays.close, trades)
+            log_summary(self.name, **{column: back_test.strategy_results[self.name][column]
+                                      for column in ["profit", "winners", "losers"]})
+        return back_test.strategy_results[self.name]["profit"]
+
+
+def run_strategies(stock_data, strategies):
+    """ Backtest several rule strategies on every data set, evaluating the rules they share once per data set
+
+        :param stock_data: StockData with the indicators calculated, e.g. StockData(dfs, run_strategies=False)
+        :param strategies: list of RuleStrategy with distinct names
+        :return: dataframe with the profit, winners and losers of each strategy over all data sets, by name
+    """
+    totals = {strategy.name: {"profit": 0.0, "winners": 0, "losers": 0} for strategy in strategies}
+    for stock_arrays in stock_data.get_stock_arrays():
+        back_test = BackTest(stock_arrays)
+        indicator_columns = IndicatorColumns(stock_arrays)
+        for strategy in strategies:
+            strategy.backtest(back_test, indicator_columns)
+            for column in totals[strategy.name]:
+                totals[strategy.name][column] = totals[strategy.name][column] + \
+                    back_test.strategy_results[strategy.name][column]
+    return pd.DataFrame.from_dict(totals, orient="index")
+
+
+def main(argv=None):
+    from BarReplay import find_csv_files
+    from StockData import StockData
+
+    parser = argparse.ArgumentParser(description="Backtest a short strategy given by rules")
+    parser.add_argument("paths", nargs="*", default=[DEFAULT_RULES_DIRECTORY],
+                        help=".csv files or directories to backtest")
+    parser.add_argument("--entry", required=True, help="rule which opens a position")
+    parser.add_argument("--exit", help="rule which closes a position")
+    parser.add_argument("--trailing-stop", type=float, help="distance of the trailing stop above the lowest price")
+    parser.add_argument("--first-data-point", type=int, help="first bar at which a position can be opened")
+    args = parser.parse_args(argv)
+
+    strategy = RuleStrategy(args.entry, args.exit, args.trailing_stop, first_data_point=args.first_data_point)
+    stock_data = StockData(find_csv_files(args.paths), run_strategies=False)
+    print(run_strategies(stock_data, [strategy]).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+""" Structured log of the trades and decisions of the BackTest strategies
+    Instead of printing each trade as text, the strategies add their trades to the active TradeLog as records in
+    an in-memory columnar buffer: for each backtest the rows are built with whole arrays from its trades and added
+    as one chunk, and the chunks become one table, written in bulk as CSV, Parquet (with pyarrow) or JSON lines,
+    when the buffer is flushed. Nothing is recorded unless a TradeLog is active; when none is, log_level() is OFF
+    and the strategies skip building the records, and the ones below the level of the active TradeLog are not built
+    either, so logging which is off costs a function call per backtest.
+
+    The levels, each recording what the ones below it do and more:
+        SUMMARY     one summary row per backtest with its profit, winners and losers
+        TRADES      an open and a close row per trade: data point, date, price, trailing stop and profit
+        DECISIONS   the indicator values the strategy decided on at each open and close, in DECISION_COLUMNS
+    The columns depend only on the level, so the chunks of every strategy and every flush have the same schema.
+
+    Usage:
+        with TradeLog(TRADES, "trades.csv"):
+            StockData(stock_data_files)
+"""
+import contextlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+OFF = 0
+SUMMARY = 1
+TRADES = 2
+DECISIONS = 3
+LEVELS = {"off": OFF, "summary": SUMMARY, "trades": TRADES, "decisions": DECISIONS}
+
+TRADE_LOG_COLUMNS = ["data_set", "strategy", "event", "data_point", "date", "price", "trailing_stop",
+                     "trailing_stop_hit", "profit", "winners", "losers"]
+# indicator values at the bar of each open and close; NaN for those a strategy does not decide on
+DECISION_COLUMNS = ["williams", "momentum", "stochastics_d", "macd", "macd_signal", "slope_macd",
+                    "slope_macd_signal", "ma_21", "ma_55", "exit_signal"]
+FILE_FORMATS = {".csv": "csv", ".parquet": "parquet", ".jsonl": "jsonl", ".json": "jsonl"}
+
+# the active TradeLog of this process; None when logging is off
+_active = None
+_no_data_set = contextlib.nullcontext()
+
+
+def json_lines(records):
+    """ the records as JSON lines: floats with the fewest digits which read back as the same value, missing values
+        as null and the dates in ISO format """
+    records = records.astype(object).where(records.notna(), None)
+    return "".join(json.dumps(record, default=pd.Timestamp.isoformat) + "\n" for record in records.to_dict("records"))
+
+
+def log_level():
+    """ level of the active TradeLog, OFF when none is active """
+    if _active is None:
+        return OFF
+    return _active.level
+
+
+def data_set(label):
+    """ context manager which makes the records added inside it belong to one data set """
+    if _active is None:
+        return _no_data_set
+    return _active.data_set(label)
+
+
+def log_trades(strategy, dates, close_data, trades, decisions=None):
+    """ add the trades of a backtest to the active TradeLog, if its level records them """
+    if _active is not None and _active.level >= TRADES:
+        _active.add_trades(strategy, dates, close_data, trades, decisions)
+
+
+def log_summary(strategy, profit, winners, losers):
+    """ add the summary of a backtest to the active TradeLog, if its level records it """
+    if _active is not None and _active.level >= SUMMARY:
+        _active.add_summary(strategy, profit, winners, losers)
+
+
+def add_chunks(chunks):
+    """ add the chunks recorded in another process to the active TradeLog """
+    if _active is not None:
+        _active.add_chunks(chunks)
+
+
+def worker_settings():
+    """ settings for a worker process to record its trades with, so they can be added back with add_chunks; None
+        when logging is off """
+    if _active is None:
+        return None
+    return {"level": _active.level}
+
+
+class TradeLog:
+    def __init__(self, level=TRADES, path=None, file_format=None, buffer_rows=100000):
+        """ Buffer of the records of the backtests which run while it is active
+
+            :param level: int SUMMARY, TRADES or DECISIONS, or its name
+            :param path: optional file the records are written to on flush(); they stay in the buffer when None
+            :param file_format: string csv, parquet or jsonl; from the extension of path when None
+            :param buffer_rows: int flush to path once the buffer holds this many rows
+            :param self.chunks: list of dictionaries of column name to array, one per backtest, in the order they
+                were added
+            :param self.columns: list of the columns of the records at this level
+            :param self.current_data_set: string label of the data set the records belong to
+            :param self.rows_written: int rows written to path so far
+        """
+        self.level = LEVELS[level] if isinstance(level, str) else level
+        self.path = path
+        if path is not None and file_format is None:
+            file_format = FILE_FORMATS.get(os.path.splitext(path)[1].lower())
+            if file_format is None:
+                raise ValueError("unknown trade log format for " + path + "; use " + ", ".join(FILE_FORMATS))
+        if file_format == "parquet":
+            try:
+                import pyarrow.parquet
+            except ImportError:
+                raise ValueError("writing the trade log as Parquet needs pyarrow; install it or use a .csv or "
+                                 ".jsonl file") from None
+        self.file_format = file_format
+        self.buffer_rows = buffer_rows
+        self.columns = TRADE_LOG_COLUMNS + (DECISION_COLUMNS if self.level >= DECISIONS else [])
+        self.chunks = []
+        self.buffered_rows = 0
+        self.current_data_set = ""
+        self.rows_written = 0
+        self.parquet_writer = None
+        self.previous = None
+
+    def start(self):
+        """ make this the active TradeLog of the process """
+        global _active
+        self.previous = _active
+        _active = self
+        return self
+
+    def stop(self):
+        """ flush the records to path, if given, and make the TradeLog active before start() active again """
+        global _active
+        _active = self.previous
+        self.previous = None
+        if self.path is not None:
+            self.flush()
+            if self.parquet_writer is not None:
+                self.parquet_writer.close()
+                self.parquet_writer = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @contextlib.contextmanager
+    def data_set(self, label):
+        previous_data_set = self.current_data_set
+        self.current_data_set = label
+        try:
+            yield
+        finally:
+            self.current_data_set = previous_data_set
+
+    def add_trades(self, strategy, dates, close_data, trades, decisions=None):
+        """ Add an open row for each trade and a close row for each trade which was closed, in the order of their
+            data points
+
+            :param strategy: strategy number or name
+            :param dates: array of the date of each bar
+            :param close_data: array of the Close data
+            :param trades: list of trade dictionaries, as BackTest.run_short_positions returns them
+            :param decisions: optional dictionary of DECISION_COLUMNS name to an array of its value at each bar
+        """
+        convert_to_dollars = 100
+        closed = [trade for trade in trades if trade["exit"] is not None]
+        entry = np.array([trade["entry"] for trade in trades], dtype=np.int64)
+        exit = np.array([trade["exit"] for trade in closed], dtype=np.int64)
+        purchase_price = np.array([trade["purchase_price"] for trade in closed], dtype=float)
+        number_of_rows = len(entry) + len(exit)
+
+        data_point = np.concatenate((entry, exit))
+        chunk = {"event": np.concatenate((np.full(len(entry), "open", dtype=object),
+                                          np.full(len(exit), "close", dtype=object))),
+                 "data_point": data_point,
+                 "date": np.asarray(dates)[data_point],
+                 "price": np.asarray(close_data, dtype=float)[data_point],
+                 "trailing_stop": np.concatenate((np.full(len(entry), np.nan),
+                                                  [trade["trailing_stop"] for trade in closed])),
+                 "trailing_stop_hit": np.concatenate((np.zeros(len(entry), dtype=bool),
+                                                      np.array([trade["trailing_stop_hit"] for trade in closed],
+                                                               dtype=bool))),
+                 "profit": np.concatenate((np.full(len(entry), np.nan),
+                                           (purchase_price - np.asarray(close_data, dtype=float)[exit]) *
+                                           convert_to_dollars))}
+        if self.level >= DECISIONS:
+            decisions = decisions or {}
+            for column in DECISION_COLUMNS:
+                if column in decisions:
+                    chunk[column] = np.asarray(decisions[column], dtype=float)[data_point]
+        # the open and close rows of a trade follow each other, as no position opens before the last one closed
+        order = np.argsort(data_point, kind="stable")
+        self.add_chunk(strategy, {column: values[order] for column, values in chunk.items()}, number_of_rows)
+
+    def add_summary(self, strategy, profit, winners, losers):
+        """ add the summary row of a backtest """
+        self.add_chunk(strategy, {"event": np.array(["summary"], dtype=object), "profit": np.array([profit]),
+                                  "winners": np.array([winners], dtype=float),
+                                  "losers": np.array([losers], dtype=float)}, 1)
+
+    def add_chunk(self, strategy, chunk, number_of_rows):
+        """ add the rows of one backtest, with the data set and strategy, and flush once the buffer is full """
+        chunk["data_set"] = np.full(number_of_rows, self.current_data_set, dtype=object)
+        chunk["strategy"] = np.full(number_of_rows, str(strategy), dtype=object)
+        self.add_chunks([(chunk, number_of_rows)])
+
+    def add_chunks(self, chunks):
+        """ add (chunk, number of rows) tuples, e.g. the chunks of a TradeLog in a worker process """
+        self.chunks.extend(chunks)
+        self.buffered_rows = self.buffered_rows + sum(number_of_rows for _, number_of_rows in chunks)
+        if self.path is not None and self.buffered_rows >= self.buffer_rows:
+            self.flush()
+
+    def records(self):
+        """ dataframe of the records in the buffer, with the columns of this level; values a record does not have
+            are NaN, or NaT for the date """
+        columns = {}
+        for column in self.columns:
+            parts = []
+            for chunk, number_of_rows in self.chunks:
+                if column in chunk:
+                    parts.append(chunk[column])
+                elif column == "date":
+                    parts.append(np.full(number_of_rows, np.datetime64("NaT", "ns")))
+                elif column == "data_point":
+                    parts.append(np.full(number_of_rows, -1, dtype=np.int64))
+                elif column == "trailing_stop_hit":
+                    parts.append(np.zeros(number_of_rows, dtype=bool))
+                else:
+                    parts.append(np.full(number_of_rows, np.nan))
+            if column == "date" and len({part.dtype for part in parts}) > 1:
+                # timestamps mixed with other dates, e.g. the strings of daily data, are kept as Timestamp objects,
+                # which numpy would turn into integers
+                parts = [pd.Series(part).astype(object).to_numpy() if part.dtype.kind == "M" else part
+                         for part in parts]
+            columns[column] = np.concatenate(parts) if parts else np.array([])
+        return pd.DataFrame(columns, columns=self.columns)
+
+    def flush(self):
+        """ write the records in the buffer to path, after the ones written before, and empty the buffer; the
+            records are returned as a dataframe, and only kept in it when there is no path """
+        records = self.records()
+        if self.path is None:
+            return records
+        if self.file_format == "csv":
+            records.to_csv(self.path, mode="w" if self.rows_written == 0 else "a", header=self.rows_written == 0,
+                           index=False)
+        elif self.file_format == "jsonl":
+            with open(self.path, "w" if self.rows_written == 0 else "a") as f:
+                f.write(json_lines(records))
+        else:
+            import pyarrow
+            import pyarrow.parquet
+            table = pyarrow.Table.from_pandas(records, preserve_index=False)
+            if self.parquet_writer is None:
+                self.parquet_writer = pyarrow.parquet.ParquetWriter(self.path, table.schema)
+            self.parquet_writer.write_table(table)
+        self.rows_written = self.rows_written + len(records)
+        self.chunks = []
+        self.buffered_rows = 0
+        return records
@@ -0,0 +1,240 @@
+""" Walk-forward optimization of the BackTest strategy thresholds
+    The data is split into rolling windows: on each train window every combination of thresholds is backtested and
+    the best one, by profit or another result column, is then backtested on the test window which follows it. The
+    results of the test windows are out of sample, unlike the profit of a single backtest over all of the data.
+
+    The indicators are calculated once for the whole data, by StockData, and the slopes of line once by a BackTest
+    of the whole data; each window is a BackTest.window() of views into them, so overlapping windows share them
+    instead of calculating them again. The windows run in parallel on worker processes, which each receive the data
+    once. Several data sets, such as the intraday files of several days, are concatenated into one series.
+
+    Usage: python WalkForward.py [FILE_OR_DIRECTORY ...] [--strategy 1|2] [--train N] [--test N] [--step N]
+                                 [--anchored] [--grid NAME=V1,V2,...] [--objective profit] [--workers N]
+                                 [--output FILE]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from BackTest import BackTest
+from ParameterSweep import STRATEGY_PARAMETERS, RESULT_COLUMNS, parameter_grid
+from StockArrays import StockArrays
+
+DEFAULT_WALK_FORWARD_FILES = ["./daily/SPX_Apr_2006_Sep11_2020.csv"]
+
+# thresholds optimized on each train window when no grid is given
+DEFAULT_GRIDS = {
+    1: {"williams_entry_point": [-85, -75, -65], "stochastics_d_entry_point": [50, 60, 70],
+        "slope_macd_entry_point": [0.0, 0.0025, 0.005], "trailing_stop_init": [0.35, 0.55, 0.75]},
+    2: {"williams_entry_point": [-85, -75, -65], "stochastics_d_entry_point": [50, 60, 70],
+        "slope_macd_entry_point": [-0.01, -0.005, 0.0], "trailing_stop_init": [0.3, 0.45, 0.6]},
+}
+
+# per worker process: BackTest of the whole data, which the windows are views of
+_worker_back_test = None
+
+
+def walk_forward_windows(number_of_data_points, train_size, test_size, step=None, anchored=False):
+    """ Train and test windows which roll over the data
+
+        :param number_of_data_points: int length of the data
+        :param train_size: int number of data points in each train window
+        :param test_size: int number of data points in each test window; the last one may be shorter
+        :param step: int number of data points each window moves by; test_size when None, so the test windows
+            follow each other without a gap
+        :param anchored: boolean every train window starts at the first data point and grows, instead of keeping
+            its size
+        :return: list of (train_start, train_stop, test_start, test_stop) tuples, each a range of data points
+    """
+    if train_size <= 0 or test_size <= 0:
+        raise ValueError("train and test windows need at least one data point")
+    step = step or test_size
+    windows = []
+    train_stop = train_size
+    while train_stop < number_of_data_points:
+        train_start = 0 if anchored else train_stop - train_size
+        windows.append((train_start, train_stop, train_stop, min(train_stop + test_size, number_of_data_points)))
+        train_stop = train_stop + step
+    return windows
+
+
+def window_back_test(back_test, strategy, start, stop):
+    """ BackTest of a strategy on the data points from start to stop of the whole data, which opens positions from
+        start on; the data points before start it needs come from the whole data """
+    # the data points before the first one at which the strategy opens positions, so it can from start on
+    warm_up = min(BackTest.FIRST_DATA_POINT[strategy], start)
+    return back_test.window(start - warm_up, stop)
+
+
+def run_strategy(back_test, strategy, parameters):
+    """ profit, winners and losers of a strategy with the given thresholds """
+    back_test.run_strategy(strategy, **parameters)
+    return {column: back_test.strategy_results[strategy][column] for column in RESULT_COLUMNS}
+
+
+def optimize_window(back_test, strategy, window, parameter_sets, objective):
+    """ Backtest every parameter set on the train window and the best one on the test window
+
+        :param back_test: BackTest of the whole data
+        :param window: (train_start, train_stop, test_start, test_stop) tuple
+        :param parameter_sets: list of dictionaries of parameter name to value
+        :param objective: string result column to maximize on the train window; the first best set is kept
+        :return: tuple of the best parameter set, its train results and its test results
+    """
+    train_start, train_stop, test_start, test_stop = window
+    train_back_test = window_back_test(back_test, strategy, train_start, train_stop)
+    best_parameters = None
+    best_result = None
+    for parameters in parameter_sets:
+        result = run_strategy(train_back_test, strategy, parameters)
+        if best_result is None or result[objective] > best_result[objective]:
+            best_parameters, best_result = parameters, result
+
+    test_result = run_strategy(window_back_test(back_test, strategy, test_start, test_stop), strategy,
+                               best_parameters)
+    return best_parameters, best_result, test_result
+
+
+def _init_worker(stock_arrays):
+    global _worker_back_test
+    _worker_back_test = BackTest(stock_arrays)
+
+
+def _optimize_window(strategy, window, parameter_sets, objective):
+    return optimize_window(_worker_back_test, strategy, window, parameter_sets, objective)
+
+
+class WalkForward:
+    def __init__(self, stock_data, strategy=1, max_workers=None):
+        """ Walk-forward optimization of the thresholds of a BackTest strategy
+
+            :param stock_data: StockData with the indicators calculated, e.g. StockData(dfs, run_strategies=False),
+                or a StockArrays container; the data sets of a StockData are concatenated in their order
+            :param strategy: int 1 or 2, the BackTest strategy to optimize
+            :param max_workers: int number of worker processes; 1 runs the windows in this process and None uses
+                all cores
+            :param self.stock_arrays: StockArrays of the whole data
+        """
+        if strategy not in STRATEGY_PARAMETERS:
+            raise ValueError("unknown strategy " + str(strategy))
+        if isinstance(stock_data, StockArrays):
+            self.stock_arrays = stock_data
+        else:
+            self.stock_arrays = StockArrays.concatenate(stock_data.get_stock_arrays())
+        self.strategy = strategy
+        self.max_workers = max_workers or os.cpu_count()
+
+    def run(self, train_size, test_size, step=None, anchored=False, parameter_sets=None, objective="profit"):
+        """ Optimize on each train window and backtest the best thresholds on its test window
+
+            :param train_size, test_size, step, anchored: the windows, as for walk_forward_windows
+            :param parameter_sets: list of dictionaries of parameter name to value; parameters which are not given
+                keep the strategy default. The DEFAULT_GRIDS combinations when None
+            :param objective: string result column to maximize on each train window
+            :return: dataframe with one row per window: its data points and dates, the best value of each parameter
+                which varies, and the train and test profit, winners and losers
+        """
+        if objective not in RESULT_COLUMNS:
+            raise ValueError("objective must be one of " + ", ".join(RESULT_COLUMNS))
+        if parameter_sets is None:
+            parameter_sets = parameter_grid(DEFAULT_GRIDS[self.strategy])
+        unknown = set().union(*parameter_sets) - set(STRATEGY_PARAMETERS[self.strategy])
+        if unknown:
+            raise ValueError("unknown parameters for strategy " + str(self.strategy) + ": " +
+                             ", ".join(sorted(unknown)))
+
+        windows = walk_forward_windows(len(self.stock_arrays), train_size, test_size, step, anchored)
+        if self.max_workers == 1:
+            back_test = BackTest(self.stock_arrays)
+            optimized = [optimize_window(back_test, self.strategy, window, parameter_sets, objective)
+                         for window in windows]
+        else:
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                     initargs=(self.stock_arrays,)) as executor:
+                optimized = list(executor.map(_optimize_window, [self.strategy] * len(windows), windows,
+                                              [parameter_sets] * len(windows), [objective] * len(windows)))
+
+        parameter_names = sorted(set().union(*parameter_sets), key=list(STRATEGY_PARAMETERS[self.strategy]).index)
+        dates = self.stock_arrays.dates
+        rows = []
+        for number, (window, (parameters, train_result, test_result)) in enumerate(zip(windows, optimized)):
+            train_start, train_stop, test_start, test_stop = window
+            row = {"window": number, "train_start": train_start, "train_stop": train_stop,
+                   "test_start": test_start, "test_stop": test_stop,
+                   "train_first_date": dates[train_start], "train_last_date": dates[train_stop - 1],
+                   "test_first_date": dates[test_start], "test_last_date": dates[test_stop - 1]}
+            for name in parameter_names:
+                row[name] = parameters.get(name, STRATEGY_PARAMETERS[self.strategy][name])
+            for column in RESULT_COLUMNS:
+                row["train_" + column] = train_result[column]
+            for column in RESULT_COLUMNS:
+                row["test_" + column] = test_result[column]
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    @staticmethod
+    def summary(results):
+        """ totals of the test windows, which are out of sample, next to the mean of the train windows
+
+            :param results: dataframe from run()
+            :return: dictionary
+        """
+        return {"windows": len(results),
+                "test_profit": float(results["test_profit"].sum()),
+                "test_winners": int(results["test_winners"].sum()),
+                "test_losers": int(results["test_losers"].sum()),
+                "profitable_test_windows": int((results["test_profit"] > 0).sum()),
+                "mean_train_profit": float(results["train_profit"].mean()) if len(results) else 0.0,
+                "mean_test_profit": float(results["test_profit"].mean()) if len(results) else 0.0}
+
+
+def parse_grid(grid_arguments):
+    """ dictionary of parameter name to list of values from NAME=V1,V2,... arguments """
+    grid = {}
+    for argument in grid_arguments:
+        name, _, values = argument.partition("=")
+        if not values:
+            raise ValueError("grid argument must be NAME=V1,V2,...: " + argument)
+        grid[name] = [float(value) for value in values.split(",")]
+    return grid
+
+
+def main(argv=None):
+    from BarReplay import find_csv_files
+    from StockData import StockData
+
+    parser = argparse.ArgumentParser(description="Walk-forward optimization of the BackTest strategy thresholds")
+    parser.add_argument("paths", nargs="*", default=DEFAULT_WALK_FORWARD_FILES,
+                        help=".csv files or directories; several are concatenated in file name order")
+    parser.add_argument("--strategy", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--train", type=int, default=756, help="data points in each train window")
+    parser.add_argument("--test", type=int, default=126, help="data points in each test window")
+    parser.add_argument("--step", type=int, help="data points each window moves by; the test window when not given")
+    parser.add_argument("--anchored", action="store_true", help="train windows all start at the first data point")
+    parser.add_argument("--grid", nargs="+", default=[], metavar="NAME=V1,V2,...",
+                        help="threshold values to optimize over; the default grid of the strategy when not given")
+    parser.add_argument("--objective", choices=RESULT_COLUMNS, default="profit")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes; 0 uses all cores")
+    parser.add_argument("--output", help=".csv file to write the result of each window to")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    stock_data = StockData(find_csv_files(args.paths), run_strategies=False, max_workers=args.workers or None)
+    parameter_sets = parameter_grid(parse_grid(args.grid)) if args.grid else None
+    walk_forward = WalkForward(stock_data, args.strategy, max_workers=args.workers or None)
+    results = walk_forward.run(args.train, args.test, args.step, args.anchored, parameter_sets, args.objective)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(results.drop(columns=["train_start", "train_stop", "test_start", "test_stop"]).to_string(index=False))
+    for name, value in WalkForward.summary(results).items():
+        print(name + " = " + str(value))
+    print("elapsed: " + "%.2f" % (time.perf_counter() - started) + " s")
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+""" Level of detail for the charts
+    When the visible range of a chart holds more bars than the axes has pixels, drawing every bar costs time and
+    adds nothing to the picture. These functions reduce a range of a series to about one point per pixel:
+    candlesticks collapse into buckets of consecutive bars with the open of the first bar, the highest high, the
+    lowest low and the close of the last bar, and lines keep the lowest and highest point of each bucket (min-max)
+    or the point of each bucket which keeps the shape of the line best (Largest Triangle Three Buckets). Ranges
+    with no more bars than buckets are returned at full resolution.
+    The x values are the positions of the bars in the series, as the charts use a sequential index.
+"""
+import numpy as np
+
+
+def visible_range(number_of_points, x_limits):
+    """ positions of the first and one past the last bar within the x limits of an axes, with one more bar on each
+        side so lines run to the edges of the axes
+
+        :param x_limits: (left, right) x limits of the axes
+        :return: (start, stop) positions
+    """
+    left, right = sorted(x_limits)
+    start = min(max(int(np.floor(left)) - 1, 0), number_of_points)
+    stop = max(min(int(np.ceil(right)) + 2, number_of_points), start)
+    return start, stop
+
+
+def bucket_starts(start, stop, number_of_buckets):
+    """ positions of the first bar of each of number_of_buckets buckets of nearly equal size between start and
+        stop; a bucket holds at least one bar """
+    number_of_buckets = max(min(number_of_buckets, stop - start), 1)
+    return np.unique(np.linspace(start, stop, number_of_buckets + 1)[:-1].astype(np.int64))
+
+
+def decimate_ohlc(open_data, high_data, low_data, close_data, start, stop, number_of_buckets):
+    """ Candlesticks of the bars from start to stop, collapsed into at most number_of_buckets buckets
+
+        :param open_data, high_data, low_data, close_data: arrays of the OHLC data of all bars
+        :return: (x, size, open, high, low, close) arrays with one value per bucket, where x is the middle position
+            of the bucket and size the number of bars in it; the bars themselves, with a size of 1, when there are
+            no more than number_of_buckets of them
+    """
+    if stop - start <= number_of_buckets:
+        x = np.arange(start, stop, dtype=float)
+        return (x, np.ones(len(x)), open_data[start:stop], high_data[start:stop], low_data[start:stop],
+                close_data[start:stop])
+
+    starts = bucket_starts(start, stop, number_of_buckets)
+    ends = np.append(starts[1:], stop)
+    offsets = starts - start
+    # fmax and fmin leave out bars without data unless the whole bucket has none
+    high = np.fmax.reduceat(high_data[start:stop], offsets)
+    low = np.fmin.reduceat(low_data[start:stop], offsets)
+    return ((starts + ends - 1) / 2.0, (ends - starts).astype(float), open_data[starts], high, low,
+            close_data[ends - 1])
+
+
+def decimate_min_max(y, start, stop, number_of_buckets):
+    """ Line of the points from start to stop reduced to the lowest and highest point of each of
+        number_of_buckets buckets, in the order of their positions, so peaks and troughs are kept
+
+        :param y: array of the values of all points
+        :return: (x, y) arrays of the positions and values of the points kept; all points when there are no more
+            than two per bucket
+    """
+    if stop - start <= 2 * number_of_buckets:
+        return np.arange(start, stop, dtype=float), y[start:stop]
+
+    values = y[start:stop]
+    offsets = bucket_starts(start, stop, number_of_buckets) - start
+    sizes = np.diff(np.append(offsets, len(values)))
+    kept = []
+    for extreme in (np.fmin.reduceat(values, offsets), np.fmax.reduceat(values, offsets)):
+        # first point of each bucket equal to the extreme of its bucket; buckets without data have none
+        positions = np.flatnonzero(values == np.repeat(extreme, sizes))
+        buckets = np.searchsorted(offsets, positions, side="right") - 1
+        kept.append(positions[np.unique(buckets, return_index=True)[1]])
+    positions = np.unique(np.concatenate(kept))
+    return (positions + start).astype(float), values[positions]
+
+
+def decimate_lttb(y, start, stop, number_of_points):
+    """ Line of the points from start to stop reduced to number_of_points points with Largest Triangle Three
+        Buckets: the first and last point are kept, and from each bucket in between the point which makes the
+        largest triangle with the point kept from the bucket before and the mean of the bucket after.
+        Points without data are left out.
+
+        :param y: array of the values of all points
+        :return: (x, y) arrays of the positions and values of the points kept; all points with data when there are
+            no more than number_of_points of them
+    """
+    x_data = np.arange(start, stop, dtype=float)
+    y_data = y[start:stop]
+    has_data = ~np.isnan(y_data)
+    x_data, y_data = x_data[has_data], y_data[has_data]
+    if len(x_data) <= max(number_of_points, 3):
+        return x_data, y_data
+
+    # buckets of the points between the first and the last
+    edges = np.linspace(1, len(x_data) - 1, number_of_points - 1).astype(np.int64)
+    bucket_sums_x = np.add.reduceat(x_data[:-1], edges[:-1])
+    bucket_sums_y = np.add.reduceat(y_data[:-1], edges[:-1])
+    bucket_sizes = np.diff(edges)
+    # the bucket after the last one is the last point itself
+    means_x = np.append(bucket_sums_x / bucket_sizes, x_data[-1])
+    means_y = np.append(bucket_sums_y / bucket_sizes, y_data[-1])
+
+    kept = np.empty(number_of_points, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = len(x_data) - 1
+    previous = 0
+    for bucket in range(number_of_points - 2):
+        first, last = edges[bucket], edges[bucket + 1]
+        area = np.abs((x_data[previous] - means_x[bucket + 1]) * (y_data[first:last] - y_data[previous]) -
+                      (x_data[previous] - x_data[first:last]) * (means_y[bucket + 1] - y_data[previous]))
+        previous = first + int(np.argmax(area))
+        kept[bucket + 1] = previous
+    return x_data[kept], y_data[kept]
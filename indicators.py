@@ -12,40 +12,55 @@ def moving_average(df, num):
     df = pd.DataFrame(ma)
     return df
 
-def stochastic_oscillator_k(df, n):
-    """Calculate stochastic oscillator %K for given data.
+def rolling_extrema(df, n, use_high_low=False):
+    """Calculate the highest high and lowest low over a sliding lookback window.
 
-    :param highest_high_over_lookback: list which has max value over the specified lookback range
-    :param pd_highest_high_over_lookback: pandas series from highest_high_over_lookback
-    :param lowest_low_over_loopback: list which has min value over the specified lookback range
-    :param pd_lowest_low_over_lookback: pandas series from lowest_low_over_loopback
+    Both extrema are computed in a single linear pass per column (pandas rolling max/min use a monotonic
+    deque internally), so callers can share the result instead of re-slicing the data for every bar.
+    The value at bar i covers bars i-n+1 through i.
 
+    :param n: int number of bars in the lookback window
+    :param use_high_low: boolean use the High and Low columns instead of Close for the extrema
+    :param extrema: dataframe with columns highest_high and lowest_low
     """
+    if use_high_low:
+        high, low = df["High"], df["Low"]
+    else:
+        high = low = df["Close"]
 
-    highest_high_over_lookback = [np.NaN  for x in range(0, len(df["Close"]))]
-    for i in range(0, len(df["Close"]) - n ):
-        high_val = df["Close"][i:i+n].max()
-        highest_high_over_lookback[i+n-1] = high_val
+    extrema = pd.DataFrame({'highest_high': high.rolling(n, min_periods=n).max(),
+                            'lowest_low': low.rolling(n, min_periods=n).min()}, index=df.index)
+    return extrema
 
-    pd_highest_high_over_lookback = pd.Series(highest_high_over_lookback)
+def stochastic_oscillator_k(df, n, use_high_low=False, extrema=None):
+    """Calculate stochastic oscillator %K for given data.
 
-    lowest_low_over_loopback = [np.NaN for x in range(0, len(df["Close"]))]
+    :param use_high_low: boolean use the High and Low columns for the lookback extrema
+    :param extrema: dataframe from rolling_extrema(df, n) to reuse; calculated when not given
+    :param highest_high_over_lookback: series which has max value over the specified lookback range
+    :param lowest_low_over_lookback: series which has min value over the specified lookback range
 
-    for i in range(0, len(df["Close"]) - n):
-        low_val = df["Close"][i:i + n].min()
-        lowest_low_over_loopback[i + n-1] = low_val
+    """
+    if extrema is None:
+        extrema = rolling_extrema(df, n, use_high_low)
 
-    pd_lowest_low_over_lookback = pd.Series(lowest_low_over_loopback)
+    # the lookback ends on the current bar; the final bar is left without a value
+    highest_high_over_lookback = extrema['highest_high'].copy()
+    lowest_low_over_lookback = extrema['lowest_low'].copy()
+    highest_high_over_lookback.iloc[-1:] = np.nan
+    lowest_low_over_lookback.iloc[-1:] = np.nan
 
-    return ((df["Close"] - pd_lowest_low_over_lookback)/(pd_highest_high_over_lookback - pd_lowest_low_over_lookback)) * 100
+    return ((df["Close"] - lowest_low_over_lookback)/(highest_high_over_lookback - lowest_low_over_lookback)) * 100
 
-def stochastic_oscillator_d(df, n, smoothing):
+def stochastic_oscillator_d(df, n, smoothing, stoch_osc_k=None):
     """Calculate stochastic oscillator %D for given data.
 
-    :param stoch_osc_k dataframe: with stochastics osc %k to use in average %d calculation
+    :param stoch_osc_k dataframe: with stochastics osc %k to use in average %d calculation; calculated when
+        not given
 
     """
-    stoch_osc_k = stochastic_oscillator_k(df, n)
+    if stoch_osc_k is None:
+        stoch_osc_k = stochastic_oscillator_k(df, n)
     return stoch_osc_k.rolling(n, min_periods=n).mean()
 
 def macd(df, n_fast, n_slow):
@@ -76,52 +91,141 @@ def set_williams_scale(x):
             x  = 0
     return x
 
-def williams_R(df, n):
+def williams_R(df, n, use_high_low=False, extrema=None):
     """ calculate Williams %R
         :param n: int
+        :param use_high_low: boolean use the High and Low columns for the lookback extrema
+        :param extrema: dataframe from rolling_extrema(df, n) to reuse; calculated when not given
         :param %R: series
-        :param highest_high_over_lookback: list which has max value over the specified lookback range
-        :param pd_highest_high_over_lookback: pandas series from highest_high_over_lookback
-        :param lowest_low_over_loopback: list which has min value over the specified lookback range
-        :param pd_lowest_low_over_lookback: pandas series from lowest_low_over_loopback
+        :param highest_high_over_lookback: series which has max value over the specified lookback range
+        :param lowest_low_over_lookback: series which has min value over the specified lookback range
     """
 
     # formula:
     #   param n = number of days lookback
     #   %R = (Highest High - Close) / (Highest High - Lowest Low) * -100
-    #   highest high over the lookback period
-    #  consider adapting data from stochastics calculation
+    #   highest high over the lookback period, which ends on the bar before the current one
 
-    highest_high_over_lookback = [np.NaN  for x in range(0, len(df["Close"]))]
-    for i in range(0, len(df["Close"]) - n ):
-        high_val = df["Close"][i:i+n].max()
-        highest_high_over_lookback[i+n] = high_val
+    if extrema is None:
+        extrema = rolling_extrema(df, n, use_high_low)
 
-    pd_highest_high_over_lookback = pd.Series(highest_high_over_lookback)
+    highest_high_over_lookback = extrema['highest_high'].shift(1)
+    lowest_low_over_lookback = extrema['lowest_low'].shift(1)
 
-    lowest_low_over_loopback = [np.NaN for x in range(0, len(df["Close"]))]
-    for i in range(0, len(df["Close"]) - n):
-        low_val = df["Close"][i:i + n].min()
-        lowest_low_over_loopback[i + n] = low_val
+    R = (highest_high_over_lookback - df["Close"]) / (highest_high_over_lookback - lowest_low_over_lookback)
+    R = R.to_numpy()
 
-    pd_lowest_low_over_lookback = pd.Series(lowest_low_over_loopback)
-
-    R = (pd_highest_high_over_lookback - df["Close"][:]) / (pd_highest_high_over_lookback - pd_lowest_low_over_lookback)
-    f = lambda x: set_williams_scale(x)
-    R = [f(x) for x in R]
-    R = pd.Series(R)
+    # same scaling as set_williams_scale, applied to the whole series
+    R = np.where((R == 0.0) | (R == -1.0), R, np.clip(R * (-100), -100, 0))
+    R = pd.Series(R, index=df.index)
     return R
 
 def momentum(df, n):
     """ Calcualate momentum
         :param n number of days lookback
-        :param mo is momentum for the given lookback
+        :param mo is momentum for the given lookback; the first n+1 values are 0
+    """
+    return momentum_lookbacks(df, [n]).iloc[:, 0].rename(None)
+
+def rate_of_change(df, n):
+    """ Calculate rate of change, the momentum as a percentage of the close n days earlier
+        :param n number of days lookback
+        :param roc is rate of change for the given lookback; the first n+1 values are 0
+    """
+    return momentum_lookbacks(df, [n], as_percentage=True).iloc[:, 0].rename(None)
+
+def momentum_lookbacks(df, lookbacks, as_percentage=False):
+    """ Calculate momentum (or rate of change) for several lookbacks in one pass
+        :param lookbacks list of int number of days lookback
+        :param as_percentage boolean return the rate of change, the percentage change instead of the price difference
+        :param mo dataframe with one column per lookback, named Momentum_n or ROC_n
+    """
+    close = df["Close"].to_numpy(dtype=float)
+    number_of_data_points = len(close)
+    mo = np.zeros((number_of_data_points, len(lookbacks)))
+    for column, n in enumerate(lookbacks):
+        # bars up to and including n have no lookback value and stay 0
+        if number_of_data_points > n + 1:
+            previous_close = close[1:number_of_data_points - n]
+            mo[n + 1:, column] = close[n + 1:] - previous_close
+            if as_percentage:
+                mo[n + 1:, column] = mo[n + 1:, column] / previous_close * 100
+
+    prefix = 'ROC_' if as_percentage else 'Momentum_'
+    return pd.DataFrame(mo, index=df.index, columns=[prefix + str(n) for n in lookbacks])
+
+def rolling_slopes(series, lookbacks, block_size=1024):
+    """ Calculate the least-squares slope of a series over a sliding window, for several window lengths in one
+        pass. The value at bar i is the slope of the line fitted to bars i-n+1 through i; windows with a NaN,
+        or which start before the first bar, are NaN. Windows of 1 bar or less have a slope of 0.
+
+        The window sums of y and x*y come from prefix sums which restart every block_size bars, so their
+        magnitude (and the rounding error of differencing them) stays bounded on long series; a window spans
+        at most two blocks.
+
+        :param lookbacks list of int number of bars in each window
+        :param block_size int number of bars per prefix sum block; raised to the longest lookback if needed
+        :param y_sum_incl, y_sum_excl block prefix sums of the series values, including/excluding each bar
+        :param xy_sum_incl, xy_sum_excl block prefix sums of (bar number in block) times series value
+        :param slopes dataframe with one column per lookback, named Slope_n
+    """
+    y = np.asarray(series, dtype=float)
+    number_of_data_points = len(y)
+    slopes = np.full((number_of_data_points, len(lookbacks)), np.nan)
+
+    valid = np.isfinite(y)
+    # the slope does not change when the series is shifted, so centre it to keep the prefix sums small
+    offset = y[valid].mean() if valid.any() else 0.0
+    y = np.where(valid, y - offset, 0.0)
+    invalid_count = np.concatenate(([0], np.cumsum(~valid)))
+
+    block_size = max([block_size] + list(lookbacks))
+    number_of_blocks = -(-number_of_data_points // block_size)
+    blocks = np.zeros(number_of_blocks * block_size)
+    blocks[:number_of_data_points] = y
+    blocks = blocks.reshape(number_of_blocks, block_size)
+    x_in_block = np.arange(block_size, dtype=float)
+
+    y_sum_incl = np.cumsum(blocks, axis=1)
+    xy_sum_incl = np.cumsum(blocks * x_in_block, axis=1)
+    y_sum_excl = y_sum_incl - blocks
+    xy_sum_excl = xy_sum_incl - blocks * x_in_block
+    y_block_total = y_sum_incl[:, -1]
+    xy_block_total = xy_sum_incl[:, -1]
+    y_sum_incl, xy_sum_incl = y_sum_incl.ravel(), xy_sum_incl.ravel()
+    y_sum_excl, xy_sum_excl = y_sum_excl.ravel(), xy_sum_excl.ravel()
+
+    for column, n in enumerate(lookbacks):
+        if n <= 1:
+            slopes[:, column] = 0.0
+            continue
+        if number_of_data_points < n:
+            continue
+        last = np.arange(n - 1, number_of_data_points)
+        first = last - n + 1
+        block = first // block_size
+        first_in_block = first - block * block_size
+        crosses_block = (last // block_size) != block
+
+        # part of the window in the first bar's block, with x measured from the first bar
+        tail_y = np.where(crosses_block, y_block_total[block], y_sum_incl[last]) - y_sum_excl[first]
+        tail_xy = (np.where(crosses_block, xy_block_total[block], xy_sum_incl[last]) - xy_sum_excl[first]
+                   - first_in_block * tail_y)
+        # part of the window in the next block, if any
+        head_y = np.where(crosses_block, y_sum_incl[last], 0.0)
+        head_xy = np.where(crosses_block, xy_sum_incl[last] + (block_size - first_in_block) * y_sum_incl[last], 0.0)
+
+        sum_y = tail_y + head_y
+        sum_xy = tail_xy + head_xy
+        # sum of (x - mean x) * y over the window, divided by sum of (x - mean x)^2
+        slope = (sum_xy - (n - 1) / 2.0 * sum_y) / (n * (n * n - 1) / 12.0)
+        slope[(invalid_count[last + 1] - invalid_count[first]) > 0] = np.nan
+        slopes[n - 1:, column] = slope
+
+    return pd.DataFrame(slopes, index=getattr(series, 'index', None), columns=['Slope_' + str(n) for n in lookbacks])
+
+def rolling_slope(series, n):
+    """ Calculate the least-squares slope of a series over a sliding window of n bars
+        :param n number of bars in the window
     """
-    mo = []
-    for index, row in df.iterrows():
-        if index > n:
-            mo.append((df["Close"][index]) - (df["Close"][index - n]))
-        else:
-            mo.append(0)
-
-    return pd.Series(mo)
+    return rolling_slopes(series, [n]).iloc[:, 0].rename(None)
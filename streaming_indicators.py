@@ -0,0 +1,326 @@
+""" Streaming versions of the indicators in indicators.py
+    Each indicator is an object which takes one bar at a time and updates its value in constant time, using ring
+    buffers and monotonic deques instead of recalculating the whole series. The arithmetic follows the batch
+    functions step by step (including the pandas rolling mean and ewm recurrences), so after each bar the value is
+    exactly the one the batch function returns for that bar. The one exception is stochastic %K (and so %D): the
+    batch function leaves the final bar of the data without a value, while the streaming one always has the value
+    for the latest bar.
+"""
+from collections import deque
+import math
+
+import numpy as np
+
+from StockData import INDICATOR_PARAMETERS
+
+
+def divide(numerator, denominator):
+    """ divide as numpy (and so pandas) does: x/0 is +-inf and 0/0 is NaN instead of an error """
+    if denominator == 0:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return float(np.float64(numerator) / np.float64(denominator))
+    return numerator / denominator
+
+
+class StreamingSMA:
+    def __init__(self, n, min_periods=None):
+        """ simple moving average over the last n values, as Series.rolling(n, min_periods).mean()
+
+            :param self.window: deque of the last n values
+            :param self.sum_x: float running sum of the non-NaN values in the window, with separate Kahan
+                compensation for added and removed values as pandas keeps
+        """
+        self.n = n
+        self.min_periods = n if min_periods is None else min_periods
+        self.window = deque(maxlen=n)
+        self.nobs = 0
+        self.neg_ct = 0
+        self.sum_x = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.num_consecutive_same_value = 0
+        self.prev_value = None
+        self.value = math.nan
+
+    def update(self, val):
+        if len(self.window) == self.n:
+            removed = self.window[0]
+            if removed == removed:
+                self.nobs = self.nobs - 1
+                y = - removed - self.compensation_remove
+                t = self.sum_x + y
+                self.compensation_remove = t - self.sum_x - y
+                self.sum_x = t
+                if math.copysign(1.0, removed) < 0:
+                    self.neg_ct = self.neg_ct - 1
+        self.window.append(val)
+        if self.prev_value is None:
+            self.prev_value = val
+
+        if val == val:
+            self.nobs = self.nobs + 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1.0, val) < 0:
+                self.neg_ct = self.neg_ct + 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value = self.num_consecutive_same_value + 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+        if self.nobs >= self.min_periods and self.nobs > 0:
+            result = self.sum_x / self.nobs
+            if self.num_consecutive_same_value >= self.nobs:
+                result = self.prev_value
+            elif self.neg_ct == 0 and result < 0:
+                result = 0.0
+            elif self.neg_ct == self.nobs and result > 0:
+                result = 0.0
+            self.value = result
+        else:
+            self.value = math.nan
+        return self.value
+
+
+class StreamingEMA:
+    def __init__(self, span, min_periods=0):
+        """ exponential moving average, as Series.ewm(span=span, min_periods=min_periods).mean()
+
+            :param self.weighted: float current average; None before the first value
+            :param self.old_wt: float weight of the average against the next value
+        """
+        center_of_mass = (span - 1) / 2.0
+        alpha = 1. / (1. + center_of_mass)
+        self.old_wt_factor = 1. - alpha
+        self.new_wt = 1.
+        self.min_periods = max(min_periods, 1)
+        self.weighted = None
+        self.old_wt = 1.
+        self.nobs = 0
+        self.value = math.nan
+
+    def update(self, cur):
+        is_observation = cur == cur
+        self.nobs = self.nobs + int(is_observation)
+        if self.weighted is None:
+            self.weighted = cur
+        elif self.weighted == self.weighted:
+            self.old_wt = self.old_wt * self.old_wt_factor
+            if is_observation:
+                # avoid numerical errors on constant series
+                if self.weighted != cur:
+                    self.weighted = self.old_wt * self.weighted + self.new_wt * cur
+                    self.weighted = self.weighted / (self.old_wt + self.new_wt)
+                self.old_wt = self.old_wt + self.new_wt
+        elif is_observation:
+            self.weighted = cur
+
+        self.value = self.weighted if self.nobs >= self.min_periods else math.nan
+        return self.value
+
+
+class StreamingExtremum:
+    def __init__(self, n, find_max):
+        """ highest (or lowest) of the last n values, as Series.rolling(n, min_periods=n).max() (or .min())
+
+            :param self.candidates: monotonic deque of (bar number, value) which can still become the extremum
+            :param self.valid: deque of whether each of the last n values is a number
+        """
+        self.n = n
+        self.find_max = find_max
+        self.candidates = deque()
+        self.valid = deque(maxlen=n)
+        self.nobs = 0
+        self.bar = -1
+        self.value = math.nan
+
+    def update(self, val):
+        self.bar = self.bar + 1
+        if len(self.valid) == self.n and self.valid[0]:
+            self.nobs = self.nobs - 1
+        is_observation = val == val
+        self.valid.append(is_observation)
+
+        if is_observation:
+            self.nobs = self.nobs + 1
+            while self.candidates and (self.candidates[-1][1] <= val if self.find_max
+                                       else self.candidates[-1][1] >= val):
+                self.candidates.pop()
+            self.candidates.append((self.bar, val))
+        while self.candidates and self.candidates[0][0] <= self.bar - self.n:
+            self.candidates.popleft()
+
+        self.value = self.candidates[0][1] if self.nobs >= self.n else math.nan
+        return self.value
+
+
+class StreamingStochastics:
+    def __init__(self, n):
+        """ stochastic oscillator %K over n bars and %D, the n bar average of %K, as stochastic_oscillator_k and
+            stochastic_oscillator_d """
+        self.highest_high = StreamingExtremum(n, find_max=True)
+        self.lowest_low = StreamingExtremum(n, find_max=False)
+        self.d = StreamingSMA(n)
+        self.k_value = math.nan
+        self.d_value = math.nan
+
+    def update(self, close, high=None, low=None):
+        highest_high = self.highest_high.update(close if high is None else high)
+        lowest_low = self.lowest_low.update(close if low is None else low)
+        self.k_value = divide(close - lowest_low, highest_high - lowest_low) * 100
+        self.d_value = self.d.update(self.k_value)
+        return self.k_value, self.d_value
+
+
+class StreamingWilliamsR:
+    def __init__(self, n):
+        """ Williams %R over the n bars before the current one, as williams_R """
+        self.highest_high = StreamingExtremum(n, find_max=True)
+        self.lowest_low = StreamingExtremum(n, find_max=False)
+        self.value = math.nan
+
+    def update(self, close, high=None, low=None):
+        # the lookback ends on the previous bar, so use the extrema before adding this bar
+        highest_high = self.highest_high.value
+        lowest_low = self.lowest_low.value
+        R = divide(highest_high - close, highest_high - lowest_low)
+        if R != 0.0 and R != -1.0:
+            R = R * (-100)
+            if R < -100:
+                R = -100.0
+            if R > 0:
+                R = 0.0
+        self.value = R
+
+        self.highest_high.update(close if high is None else high)
+        self.lowest_low.update(close if low is None else low)
+        return self.value
+
+
+class StreamingMomentum:
+    def __init__(self, n, rate_of_change=False):
+        """ momentum (or rate of change) over n bars, as momentum (or rate_of_change); 0 for the first n+1 bars """
+        self.n = n
+        self.rate_of_change = rate_of_change
+        self.closes = deque(maxlen=n + 1)
+        self.bar = -1
+        self.value = 0.0
+
+    def update(self, close):
+        self.bar = self.bar + 1
+        self.closes.append(close)
+        if self.bar > self.n:
+            self.value = close - self.closes[0]
+            if self.rate_of_change:
+                self.value = divide(self.value, self.closes[0]) * 100
+        else:
+            self.value = 0.0
+        return self.value
+
+
+class StreamingMACD:
+    def __init__(self, n_fast, n_slow, n_signal=9):
+        """ MACD, MACD signal and MACD difference, as macd """
+        self.ema_fast = StreamingEMA(n_fast, min_periods=n_slow)
+        self.ema_slow = StreamingEMA(n_slow, min_periods=n_slow)
+        self.signal = StreamingEMA(n_signal, min_periods=n_signal)
+        self.macd_value = math.nan
+        self.signal_value = math.nan
+        self.diff_value = math.nan
+
+    def update(self, close):
+        self.macd_value = self.ema_fast.update(close) - self.ema_slow.update(close)
+        self.signal_value = self.signal.update(self.macd_value)
+        self.diff_value = self.macd_value - self.signal_value
+        return self.macd_value, self.signal_value, self.diff_value
+
+
+class StreamingSlope:
+    def __init__(self, n, block_size=1024):
+        """ least-squares slope of the last n values, as rolling_slope; NaN until there are n values or while one
+            of them is NaN, and 0 for windows of 1 value or less
+
+            :param self.window: deque of the last n values
+            :param self.sum_y: float running sum of the values in the window, with NaN counted as 0
+            :param self.sum_ky: float running sum of k * value, k = 0 for the oldest value in the window
+            :param self.nan_count: int number of NaN values in the window
+            :param block_size: int the running sums are summed again from the window every block_size values, so
+                their rounding error stays bounded on long series, as rolling_slopes restarts its prefix sums
+        """
+        self.n = n
+        self.window = deque(maxlen=max(n, 1))
+        self.sum_xx = n * (n * n - 1) / 12.0
+        self.sum_y = 0.0
+        self.sum_ky = 0.0
+        self.nan_count = 0
+        self.block_size = max(block_size, n)
+        self.updates_since_sum = 0
+        self.value = 0.0 if n <= 1 else math.nan
+
+    def update(self, val):
+        if self.n <= 1:
+            self.window.append(val)
+            return self.value
+        y = val if val == val else 0.0
+        if len(self.window) == self.n:
+            removed = self.window[0]
+            if removed != removed:
+                self.nan_count = self.nan_count - 1
+                removed = 0.0
+            # every value moves one place towards the oldest: k * y becomes (k - 1) * y
+            self.sum_ky = self.sum_ky - (self.sum_y - removed) + (self.n - 1) * y
+            self.sum_y = self.sum_y - removed + y
+        else:
+            self.sum_ky = self.sum_ky + len(self.window) * y
+            self.sum_y = self.sum_y + y
+        self.window.append(val)
+        if val != val:
+            self.nan_count = self.nan_count + 1
+
+        self.updates_since_sum = self.updates_since_sum + 1
+        if self.updates_since_sum >= self.block_size:
+            values = [value if value == value else 0.0 for value in self.window]
+            self.sum_y = math.fsum(values)
+            self.sum_ky = math.fsum(k * value for k, value in enumerate(values))
+            self.updates_since_sum = 0
+
+        if len(self.window) < self.n or self.nan_count:
+            self.value = math.nan
+        else:
+            self.value = (self.sum_ky - (self.n - 1) / 2.0 * self.sum_y) / self.sum_xx
+        return self.value
+
+
+class StreamingIndicators:
+    def __init__(self, parameters=INDICATOR_PARAMETERS):
+        """ all indicators StockData calculates, updated together one bar at a time
+
+            :param parameters: dictionary of indicator lookbacks, as StockData.INDICATOR_PARAMETERS
+        """
+        self.parameters = parameters
+        self.moving_averages = {n: StreamingSMA(n) for n in parameters["moving_averages"]}
+        self.stochastics = StreamingStochastics(parameters["stochastics"])
+        self.williams = StreamingWilliamsR(parameters["williams"])
+        self.momentum = StreamingMomentum(parameters["momentum"])
+        self.macd = StreamingMACD(parameters["macd_fast"], parameters["macd_slow"])
+        self.macd_suffix = "_" + str(parameters["macd_fast"]) + "_" + str(parameters["macd_slow"])
+
+    def update(self, close):
+        """ add one bar and return the value of every indicator for it
+
+            :return: dictionary with the same names as the batch outputs: MA_n, %K, %D, %R, momentum, MACD_f_s,
+                MACDsign_f_s and MACDdiff_f_s
+        """
+        values = {}
+        for n, moving_average in self.moving_averages.items():
+            values["MA_" + str(n)] = moving_average.update(close)
+        values["%K"], values["%D"] = self.stochastics.update(close)
+        values["%R"] = self.williams.update(close)
+        values["momentum"] = self.momentum.update(close)
+        macd_values = self.macd.update(close)
+        for name, value in zip(["MACD", "MACDsign", "MACDdiff"], macd_values):
+            values[name + self.macd_suffix] = value
+        return values
@@ -0,0 +1,39 @@
+""" Regression test of the profit, winners and losers of each strategy on the bundled data; the indicators, the
+    signals and the run_short_positions kernel must keep them as the original per-bar strategy loops had them """
+import os
+
+import pytest
+
+from BackTest import BackTest
+from BarReplay import find_csv_files
+from StockData import StockData
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# data files, and the profit, winners and losers of strategy 1 and 2 summed over them
+BASELINES = {
+    "daily SPX": ([os.path.join(REPOSITORY_DIRECTORY, "daily", "SPX_Apr_2006_Sep11_2020.csv")],
+                  {1: (-93748.1084, 39, 111), 2: (-72467.1151, 45, 110)}, 1e-4),
+    "intraday": (find_csv_files([os.path.join(REPOSITORY_DIRECTORY, "StockMarketData", "Intraday", "eachDay")]),
+                 {1: (-256.00, 22, 48), 2: (116.69, 33, 36)}, 5e-3),
+}
+
+
+@pytest.mark.parametrize("name", BASELINES)
+def test_strategy_results_match_baseline(name):
+    files, expected, tolerance = BASELINES[name]
+    stock_data = StockData(files, run_strategies=False)
+    totals = {strategy: [0.0, 0, 0] for strategy in expected}
+    for stock_arrays in stock_data.get_stock_arrays():
+        back_test = BackTest(stock_arrays)
+        back_test.backtest_strategy_1(verbose=False)
+        back_test.backtest_strategy_2(verbose=False)
+        for strategy in expected:
+            result = back_test.strategy_results[strategy]
+            totals[strategy][0] += result["profit"]
+            totals[strategy][1] += result["winners"]
+            totals[strategy][2] += result["losers"]
+
+    for strategy, (profit, winners, losers) in expected.items():
+        assert totals[strategy][0] == pytest.approx(profit, abs=tolerance)
+        assert totals[strategy][1:] == [winners, losers]
@@ -0,0 +1,36 @@
+""" Resuming a parameter sweep from its results file reuses the rows backtested on the same data only """
+import os
+
+import pytest
+
+from ParameterSweep import ParameterSweep, parameter_grid
+from StockData import StockData
+
+REPOSITORY_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_FILES = [os.path.join(REPOSITORY_DIRECTORY, "daily", "SPY.csv"),
+              os.path.join(REPOSITORY_DIRECTORY, "daily", "SPY_09.28.19_to_09.28.20.csv")]
+GRID = {"williams_entry_point": [-80, -75], "trailing_stop_init": [0.45, 0.55]}
+
+
+def test_resume_reuses_results_of_the_same_data(tmp_path):
+    results_file = str(tmp_path / "sweep.csv")
+    stock_data = StockData(DATA_FILES[:1], run_strategies=False)
+    table = ParameterSweep(stock_data, max_workers=1, results_file=results_file, progress=None).run(
+        parameter_grid(GRID))
+
+    completed = []
+    resumed = ParameterSweep(stock_data, max_workers=1, results_file=results_file,
+                             progress=lambda done, total: completed.append((done, total))).run(parameter_grid(GRID))
+    assert completed == [(4, 4)]
+    assert resumed.equals(table)
+
+
+def test_resume_refuses_results_of_different_data(tmp_path):
+    results_file = str(tmp_path / "sweep.csv")
+    ParameterSweep(StockData(DATA_FILES[:1], run_strategies=False), max_workers=1, results_file=results_file,
+                   progress=None).run(parameter_grid(GRID))
+
+    sweep = ParameterSweep(StockData(DATA_FILES[1:], run_strategies=False), max_workers=1,
+                           results_file=results_file, progress=None)
+    with pytest.raises(ValueError, match="different data"):
+        sweep.run(parameter_grid(GRID))